@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Compares two sets of benchmark results produced by :mod:`run`.
+
+For each benchmark present in both files, the throughput and peak RSS of the
+"before" and "after" results are printed along with the relative change. If
+``--threshold`` is given, the script exits with a non-zero status when any
+benchmark's throughput drops by more than that percentage, which makes it
+suitable for use in CI::
+
+    python benchmarks/compare.py --threshold 10 before.json after.json
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import io
+import sys
+import json
+import argparse
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+def load(filename):
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def change(before, after):
+    """
+    Returns the percentage change from *before* to *after*, or None if it
+    cannot be calculated.
+    """
+    if not before or after is None:
+        return None
+    return (after - before) * 100 / before
+
+
+def format_change(value):
+    if value is None:
+        return '?'
+    return '%+.1f%%' % value
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Compare two sets of lars benchmark results')
+    parser.add_argument('before', help='The JSON results to compare against')
+    parser.add_argument('after', help='The JSON results to compare')
+    parser.add_argument(
+        '-t', '--threshold', type=float, default=None,
+        help='Exit with status 1 if the throughput of any benchmark drops '
+        'by more than THRESHOLD percent')
+    options = parser.parse_args(args)
+    before = load(options.before)
+    after = load(options.after)
+    print('before: %s (%s lines)' % (
+        before['meta']['revision'], before['meta']['lines']))
+    print('after:  %s (%s lines)' % (
+        after['meta']['revision'], after['meta']['lines']))
+    if before['meta']['lines'] != after['meta']['lines']:
+        print('warning: the results were produced with different corpus '
+              'sizes', file=sys.stderr)
+    print()
+    print('%-32s %12s %12s %8s %8s' % (
+        'benchmark', 'before/s', 'after/s', 'speed', 'rss'))
+    regressions = []
+    for name, old in before['results'].items():
+        try:
+            new = after['results'][name]
+        except KeyError:
+            continue
+        speed = change(old['rows_per_sec'], new['rows_per_sec'])
+        rss = change(old['peak_rss_kb'], new['peak_rss_kb'])
+        print('%-32s %12.0f %12.0f %8s %8s' % (
+            name, old['rows_per_sec'] or 0, new['rows_per_sec'] or 0,
+            format_change(speed), format_change(rss)))
+        if (
+                options.threshold is not None and speed is not None and
+                -speed > options.threshold):
+            regressions.append(name)
+    for name in sorted(set(before['results']) ^ set(after['results'])):
+        print('%-32s only present in %s' % (
+            name, 'before' if name in before['results'] else 'after'))
+    if regressions:
+        print()
+        print('Throughput of %d benchmark(s) fell by more than %g%%: %s' % (
+            len(regressions), options.threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
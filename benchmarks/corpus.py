@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Generates reproducible synthetic log corpora for the benchmark suite.
+
+Each corpus is produced by a generator function which yields lines of a log
+file (including any header). All randomness is derived from a fixed seed so
+the same corpus is produced on every run (and on every commit), which is what
+makes the results of :mod:`run` comparable. The corpora are written to a
+cache directory on first use so that generating them isn't timed.
+
+Run this script directly to write all corpora to a directory::
+
+    python benchmarks/corpus.py -n 100000 /tmp/lars-corpora
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import io
+import os
+import random
+import argparse
+from datetime import datetime, timedelta
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+SEED = 0x1a75
+
+METHODS = ('GET',) * 16 + ('POST',) * 3 + ('HEAD', 'PUT', 'DELETE', 'OPTIONS')
+STATUSES = (200,) * 20 + (206, 301, 302, 304, 304, 400, 403, 404, 404, 500)
+PATHS = (
+    '/',
+    '/index.html',
+    '/favicon.ico',
+    '/robots.txt',
+    '/static/css/site.css',
+    '/static/js/app.min.js',
+    '/images/logo.png',
+    '/blog/2017/03/an-article-with-a-rather-long-slug.html',
+    '/api/v1/users/%d',
+    '/api/v1/orders/%d/items',
+    '/search',
+    '/download/release-%d.tar.gz',
+    )
+QUERIES = (
+    '', '', '', '',
+    '?q=lars+log+parsing',
+    '?page=%d',
+    '?utm_source=newsletter&utm_medium=email&utm_campaign=spring%%20sale',
+    )
+AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, '
+    'like Gecko) Chrome/58.0.3029.110 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_4) AppleWebKit/603.1.30 '
+    '(KHTML, like Gecko) Version/10.1 Safari/603.1.30',
+    'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:53.0) Gecko/20100101 '
+    'Firefox/53.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 10_3_1 like Mac OS X) '
+    'AppleWebKit/603.1.30 (KHTML, like Gecko) Version/10.0 Mobile/14E304 '
+    'Safari/602.1',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'curl/7.52.1',
+    '-',
+    )
+REFERERS = (
+    '-', '-',
+    'http://www.example.com/',
+    'https://www.google.com/search?q=example&ie=utf-8',
+    'http://www.example.com/blog/2017/03/an-article-with-a-rather-long-slug.html',
+    )
+USERS = ('-',) * 8 + ('frank', 'alice')
+VHOSTS = ('www.example.com', 'example.com', 'static.example.com')
+HOSTNAMES = ('crawl-66-249-66-1.googlebot.com', 'proxy.example.net')
+
+START = datetime(2017, 3, 1, 0, 0, 0)
+
+
+def _address(rand):
+    if rand.random() < 0.1:
+        return rand.choice(HOSTNAMES)
+    return _ip(rand)
+
+
+def _ip(rand):
+    if rand.random() < 0.05:
+        return '2001:db8::%x' % rand.randint(1, 0xffff)
+    return _ipv4(rand)
+
+
+def _ipv4(rand):
+    return '%d.%d.%d.%d' % (
+        rand.randint(1, 223), rand.randint(0, 255),
+        rand.randint(0, 255), rand.randint(1, 254))
+
+
+def _network(rand):
+    octets = _ipv4(rand).split('.')
+    prefix = rand.choice((8, 16, 24, 32))
+    octets[prefix // 8:] = ['0'] * (4 - prefix // 8)
+    return '%s/%d' % ('.'.join(octets), prefix)
+
+
+def _url(rand):
+    path = rand.choice(PATHS)
+    if '%d' in path:
+        path %= rand.randint(1, 100000)
+    query = rand.choice(QUERIES)
+    if '%d' in query:
+        query %= rand.randint(1, 50)
+    else:
+        query = query.replace('%%', '%')
+    return path, query
+
+
+def _size(rand, status):
+    if status in (304, 301, 302) or rand.random() < 0.02:
+        return '-'
+    return str(rand.randint(100, 200000))
+
+
+def apache(log_format, count, seed=SEED):
+    """
+    Yields *count* lines of an Apache log in one of the formats ``'common'``,
+    ``'combined'``, ``'vhost'`` (common with virtual host), or ``'custom'``
+    (which uses a ``%{format}t`` timestamp and a ``%D`` time-taken field).
+    """
+    rand = random.Random(seed)
+    timestamp = START
+    for _ in range(count):
+        timestamp += timedelta(seconds=rand.randint(0, 2))
+        path, query = _url(rand)
+        status = rand.choice(STATUSES)
+        values = {
+            'host': _address(rand),
+            'user': rand.choice(USERS),
+            'time': timestamp.strftime('%d/%b/%Y:%H:%M:%S +0000'),
+            'request': '%s %s%s HTTP/1.1' % (
+                rand.choice(METHODS), path, query),
+            'status': status,
+            'size': _size(rand, status),
+            }
+        if log_format == 'common':
+            line = (
+                '%(host)s - %(user)s [%(time)s] "%(request)s" %(status)d '
+                '%(size)s')
+        elif log_format == 'combined':
+            values['referer'] = rand.choice(REFERERS)
+            values['agent'] = rand.choice(AGENTS)
+            line = (
+                '%(host)s - %(user)s [%(time)s] "%(request)s" %(status)d '
+                '%(size)s "%(referer)s" "%(agent)s"')
+        elif log_format == 'vhost':
+            values['vhost'] = rand.choice(VHOSTS)
+            line = (
+                '%(vhost)s %(host)s - %(user)s [%(time)s] "%(request)s" '
+                '%(status)d %(size)s')
+        elif log_format == 'custom':
+            values['time'] = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+            values['taken'] = rand.randint(50, 5000000)
+            line = (
+                '%(host)s - %(user)s %(time)s "%(request)s" %(status)d '
+                '%(size)s %(taken)d')
+        else:
+            raise ValueError('Unknown Apache corpus format %s' % log_format)
+        yield (line % values) + '\n'
+
+
+# The Apache LogFormat strings corresponding to the corpora above
+APACHE_FORMATS = {
+    'common':   '%h %l %u %t "%r" %>s %b',
+    'combined': '%h %l %u %t "%r" %>s %b "%{Referer}i" "%{User-Agent}i"',
+    'vhost':    '%v %h %l %u %t "%r" %>s %b',
+    'custom':   '%h %l %u %{%Y-%m-%d %H:%M:%S}t "%r" %>s %b %D',
+    }
+
+
+# The #Fields layouts of the IIS corpora
+IIS_LAYOUTS = {
+    'minimal': 'date time c-ip cs-method cs-uri-stem sc-status',
+    'default': (
+        'date time s-ip cs-method cs-uri-stem cs-uri-query s-port '
+        'cs-username c-ip cs(User-Agent) sc-status sc-substatus '
+        'sc-win32-status time-taken'),
+    'full': (
+        'date time s-sitename s-computername s-ip cs-method cs-uri-stem '
+        'cs-uri-query s-port cs-username c-ip cs-version cs(User-Agent) '
+        'cs(Cookie) cs(Referer) cs-host sc-status sc-substatus '
+        'sc-win32-status sc-bytes cs-bytes time-taken'),
+    }
+
+
+def _iis_value(rand, field, timestamp, url):
+    # pylint: disable=too-many-return-statements,too-many-branches
+    if field == 'date':
+        return timestamp.strftime('%Y-%m-%d')
+    elif field == 'time':
+        return timestamp.strftime('%H:%M:%S')
+    elif field == 's-sitename':
+        return 'W3SVC1'
+    elif field == 's-computername':
+        return 'WEB01'
+    elif field == 's-ip':
+        return '10.0.0.%d' % rand.randint(1, 4)
+    elif field == 'c-ip':
+        return _ipv4(rand)
+    elif field == 'cs-method':
+        return rand.choice(METHODS)
+    elif field == 'cs-uri-stem':
+        return url[0]
+    elif field == 'cs-uri-query':
+        return url[1][1:] or '-'
+    elif field == 's-port':
+        return rand.choice(('80', '443'))
+    elif field == 'cs-username':
+        return rand.choice(USERS)
+    elif field == 'cs-version':
+        return 'HTTP/1.1'
+    elif field in ('cs(User-Agent)', 'cs(Referer)'):
+        value = rand.choice(AGENTS if field == 'cs(User-Agent)' else REFERERS)
+        return value.replace(' ', '+')
+    elif field == 'cs(Cookie)':
+        return rand.choice(('-', 'ASPSESSIONID=%08X' % rand.getrandbits(32)))
+    elif field == 'cs-host':
+        return rand.choice(VHOSTS)
+    elif field == 'sc-status':
+        return str(rand.choice(STATUSES))
+    elif field in ('sc-substatus', 'sc-win32-status'):
+        return '0'
+    elif field in ('sc-bytes', 'cs-bytes'):
+        return str(rand.randint(100, 200000))
+    elif field == 'time-taken':
+        return str(rand.randint(0, 5000))
+    raise ValueError('Unknown IIS corpus field %s' % field)
+
+
+def iis(layout, count, seed=SEED):
+    """
+    Yields the header and *count* lines of an IIS W3C extended log with one
+    of the ``#Fields`` layouts in :data:`IIS_LAYOUTS`.
+    """
+    rand = random.Random(seed)
+    fields = IIS_LAYOUTS[layout].split()
+    timestamp = START
+    yield '#Software: Microsoft Internet Information Services 7.5\n'
+    yield '#Version: 1.0\n'
+    yield '#Date: %s\n' % timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    yield '#Fields: %s\n' % ' '.join(fields)
+    for _ in range(count):
+        timestamp += timedelta(seconds=rand.randint(0, 2))
+        url = _url(rand)
+        yield ' '.join(
+            _iis_value(rand, field, timestamp, url) for field in fields) + '\n'
+
+
+def samples(kind, count, seed=SEED):
+    """
+    Returns a list of *count* raw field values of the specified *kind*, for
+    benchmarking the parsing functions and data-type constructors in
+    isolation. Around 5% of the values are missing (usually ``'-'``) except for kinds used with data-type constructors,
+    which don't accept them (``'network'`` and the kinds ending with
+    ``'_strict'``).
+    """
+    rand = random.Random(seed)
+    timestamp = START
+    result = []
+    strict = kind == 'network' or kind.endswith('_strict')
+    if kind.endswith('_strict'):
+        kind = kind[:-len('_strict')]
+    for _ in range(count):
+        timestamp += timedelta(seconds=rand.randint(0, 2))
+        if not strict and rand.random() < 0.05:
+            # Merged IIS date and time fields are missing when both are
+            result.append('- -' if kind == 'datetime' else '-')
+            continue
+        path, query = _url(rand)
+        value = {
+            'request': lambda: '%s %s%s HTTP/1.1' % (
+                rand.choice(METHODS), path, query),
+            'url':      lambda: rand.choice(REFERERS[2:]),
+            'path':     lambda: 'C:\\inetpub\\wwwroot%s' % path.replace(
+                '/', '\\'),
+            'int':      lambda: str(rand.randint(0, 200000)),
+            'fixed':    lambda: '%.3f' % (rand.random() * 100),
+            'date':     lambda: timestamp.strftime('%Y-%m-%d'),
+            'time':     lambda: timestamp.strftime('%H:%M:%S'),
+            'datetime': lambda: timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'hostname': lambda: rand.choice(HOSTNAMES + VHOSTS),
+            'address':  lambda: _ip(rand),
+            'network':  lambda: _network(rand),
+            }[kind]()
+        result.append(value)
+    return result
+
+
+CORPORA = dict(
+    [('apache_%s' % name, (apache, name)) for name in APACHE_FORMATS] +
+    [('iis_%s' % name, (iis, name)) for name in IIS_LAYOUTS]
+    )
+
+
+def corpus(name, count, directory):
+    """
+    Returns the filename of the corpus *name* with *count* lines within
+    *directory*, generating it first if it doesn't already exist.
+    """
+    filename = os.path.join(directory, '%s-%d.log' % (name, count))
+    if not os.path.exists(filename):
+        generator, arg = CORPORA[name]
+        temp = filename + '.tmp'
+        with io.open(temp, 'w', encoding='utf-8') as f:
+            f.writelines(generator(arg, count))
+        os.rename(temp, filename)
+    return filename
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Generate the synthetic log corpora used by the '
+        'benchmark suite')
+    parser.add_argument(
+        '-n', '--lines', type=int, default=100000,
+        help='The number of lines in each corpus (default: %(default)s)')
+    parser.add_argument(
+        'directory', help='The directory to write the corpora to')
+    args = parser.parse_args(args)
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+    for name in sorted(CORPORA):
+        print(corpus(name, args.lines, args.directory))
+
+
+if __name__ == '__main__':
+    main()
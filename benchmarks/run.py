@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Runs the lars benchmark suite, writing the results as JSON.
+
+Each benchmark measures the throughput (in rows, or values, per second) of a
+single component of the parse-to-target pipeline against a synthetic corpus
+from :mod:`corpus`: the sources, the individual parsing functions, the
+data-type constructors, and the targets. Every benchmark is run in a fresh
+child process so that the peak resident set size (RSS) recorded for it isn't
+polluted by prior benchmarks. Typical usage::
+
+    python benchmarks/run.py -o before.json
+    git checkout my-branch
+    python benchmarks/run.py -o after.json
+    python benchmarks/compare.py before.json after.json
+
+Use ``-k`` to run a subset of the benchmarks (any whose name contains the
+given string), and ``--list`` to see their names.
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import io
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import platform
+import warnings
+import subprocess
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from timeit import default_timer as timer
+try:
+    import resource
+except ImportError:
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Ensure the lars in this tree is benchmarked rather than any installed copy
+sys.path.insert(0, os.path.dirname(HERE))
+
+from lars import apache, iis, csv, sql, parsers, datatypes  # noqa: E402
+import corpus  # noqa: E402
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+# Maps benchmark names to (function, args) tuples. Each function is called
+# with the benchmark options and args, performs any (untimed) setup, and
+# returns a callable which executes the benchmark once, returning the number
+# of rows (or values) it processed
+BENCHMARKS = OrderedDict()
+
+
+def register(name, func, *args):
+    BENCHMARKS[name] = (func, args)
+
+
+def apache_source(options, name):
+    filename = corpus.corpus(name, options.lines, options.corpus_dir)
+    log_format = corpus.APACHE_FORMATS[name[len('apache_'):]]
+    def run():
+        with io.open(filename, 'r', encoding='utf-8') as f:
+            with apache.ApacheSource(f, log_format) as source:
+                for _ in source:
+                    pass
+                return source.count
+    return run
+
+
+def iis_source(options, name):
+    filename = corpus.corpus(name, options.lines, options.corpus_dir)
+    def run():
+        with io.open(filename, 'r', encoding='utf-8') as f:
+            with iis.IISSource(f) as source:
+                for _ in source:
+                    pass
+                return source.count
+    return run
+
+
+def convert(options, func, kind):
+    values = corpus.samples(kind, options.lines)
+    def run():
+        for value in values:
+            func(value)
+        return len(values)
+    return run
+
+
+def _rows(options):
+    filename = corpus.corpus('apache_combined', options.lines,
+                             options.corpus_dir)
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        with apache.ApacheSource(f, corpus.APACHE_FORMATS['combined']) as source:
+            return list(source)
+
+
+def csv_target(options):
+    rows = _rows(options)
+    def run():
+        with csv.CSVTarget(io.BytesIO()) as target:
+            for row in rows:
+                target.write(row)
+            return target.count
+    return run
+
+
+def sql_target(options):
+    rows = _rows(options)
+    def run():
+        conn = sqlite3.connect(':memory:')
+        try:
+            with sql.SQLTarget(
+                    sqlite3, conn, 'bench', insert=100, create_table=True
+                    ) as target:
+                for row in rows:
+                    target.write(row)
+                return target.count
+        finally:
+            conn.close()
+    return run
+
+
+for _name in sorted(corpus.CORPORA):
+    register(
+        'source.%s' % _name,
+        apache_source if _name.startswith('apache_') else iis_source, _name)
+for _func, _kind in (
+        (parsers.address_parse,      'address'),
+        (parsers.date_iso_parse,     'date'),
+        (parsers.date_parse,         'date'),
+        (parsers.datetime_iso_parse, 'datetime'),
+        (parsers.fixed_parse,        'fixed'),
+        (parsers.hostname_parse,     'hostname'),
+        (parsers.int_parse,          'int'),
+        (parsers.path_parse,         'path'),
+        (parsers.request_parse,      'request'),
+        (parsers.time_iso_parse,     'time'),
+        (parsers.time_parse,         'time'),
+        (parsers.url_parse,          'url'),
+        ):
+    register('parsers.%s' % _func.__name__, convert, _func, _kind)
+for _func, _kind in (
+        (datatypes.address,  'address_strict'),
+        (datatypes.date,     'date_strict'),
+        (datatypes.datetime, 'datetime_strict'),
+        (datatypes.hostname, 'hostname_strict'),
+        (datatypes.network,  'network'),
+        (datatypes.path,     'path_strict'),
+        (datatypes.request,  'request_strict'),
+        (datatypes.time,     'time_strict'),
+        (datatypes.url,      'url_strict'),
+        ):
+    register('datatypes.%s' % _func.__name__, convert, _func, _kind)
+register('target.csv', csv_target)
+register('target.sql', sql_target)
+
+
+def peak_rss():
+    """
+    Returns the peak RSS of the current process in KiB, or None if it
+    cannot be determined on this platform.
+    """
+    if resource is None:
+        return None
+    result = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # macOS reports bytes rather than KiB
+        result //= 1024
+    return result
+
+
+def run_benchmark(args):
+    """
+    Executes the benchmark *name* *repeat* times, returning a mapping of its
+    results. This is called in a child process.
+    """
+    name, options = args
+    # Warnings (e.g. from SQLTarget guessing column types) would only
+    # clutter the output
+    warnings.simplefilter('ignore')
+    func, func_args = BENCHMARKS[name]
+    run = func(options, *func_args)
+    times = []
+    for _ in range(options.repeat):
+        start = timer()
+        rows = run()
+        times.append(timer() - start)
+    best = min(times)
+    return name, OrderedDict([
+        ('rows', rows),
+        ('best', best),
+        ('mean', sum(times) / len(times)),
+        ('rows_per_sec', rows / best if best else None),
+        ('peak_rss_kb', peak_rss()),
+        ])
+
+
+def git_revision():
+    """
+    Returns a description of the git revision of the tree being benchmarked,
+    or None if it cannot be determined.
+    """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                ['git', 'describe', '--always', '--dirty'],
+                cwd=HERE, stderr=devnull).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Run the lars benchmark suite')
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='Write the results to FILE as JSON (default: stdout)')
+    parser.add_argument(
+        '-n', '--lines', type=int, default=50000,
+        help='The number of lines (or values) in each corpus (default: '
+        '%(default)s)')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help='The number of times to run each benchmark; the best time is '
+        'used (default: %(default)s)')
+    parser.add_argument(
+        '-k', '--keyword', action='append', default=[],
+        help='Only run benchmarks whose names contain KEYWORD (may be '
+        'specified multiple times)')
+    parser.add_argument(
+        '--corpus-dir', default=os.path.join(tempfile.gettempdir(),
+                                             'lars-bench'),
+        help='The directory in which generated corpora are cached (default: '
+        '%(default)s)')
+    parser.add_argument(
+        '-l', '--list', action='store_true',
+        help='List the names of the benchmarks and exit')
+    options = parser.parse_args(args)
+    if options.lines < 1:
+        parser.error('lines must be 1 or more')
+    if options.repeat < 1:
+        parser.error('repeat must be 1 or more')
+    names = [
+        name for name in BENCHMARKS
+        if not options.keyword or any(k in name for k in options.keyword)
+        ]
+    if options.list:
+        for name in names:
+            print(name)
+        return 0
+    if not os.path.isdir(options.corpus_dir):
+        os.makedirs(options.corpus_dir)
+    results = OrderedDict()
+    # A new worker is used for each benchmark so that peak RSS is measured
+    # independently
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        for name, result in pool.imap(
+                run_benchmark, [(name, options) for name in names]):
+            results[name] = result
+            print('%-32s %12.0f rows/s %10s KiB' % (
+                name, result['rows_per_sec'] or 0,
+                result['peak_rss_kb'] or '?'), file=sys.stderr)
+    finally:
+        pool.close()
+        pool.join()
+    output = OrderedDict([
+        ('meta', OrderedDict([
+            ('revision', git_revision()),
+            ('python', platform.python_version()),
+            ('implementation', platform.python_implementation()),
+            ('platform', platform.platform()),
+            ('lines', options.lines),
+            ('repeat', options.repeat),
+            ])),
+        ('results', results),
+        ])
+    if options.output:
+        with io.open(options.output, 'w', encoding='utf-8') as f:
+            f.write(str(json.dumps(output, indent=2)))
+            f.write('\n')
+    else:
+        print(json.dumps(output, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
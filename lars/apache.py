@@ -35,7 +35,7 @@ or otherwise Apache formatted log file and yields rows from it as tuples.
 Classes
 =======
 
-.. autoclass:: ApacheSource(source, log_format=COMMON)
+.. autoclass:: ApacheSource(source, log_format=COMMON, fields=None, lazy=False)
     :members:
 
     .. attribute:: source
@@ -50,6 +50,16 @@ Classes
 
         The Apache LogFormat string that the class will use to decode rows
 
+    .. attribute:: projection
+
+        The sequence of field names that rows will be restricted to, or None if
+        rows include every field in :attr:`log_format`
+
+    .. attribute:: lazy
+
+        If True, the source yields rows which only convert each field when it
+        is first read (see :func:`~lars.datatypes.lazy_row`)
+
 
 Data
 ====
@@ -120,15 +130,20 @@ from __future__ import (
     division,
     )
 
+import os
 import re
+import mmap
 import warnings
 import logging
 import functools
+from itertools import islice
 
-from . import parsers, datatypes as dt
+from . import parsers, columns, timing, datatypes as dt
 from .strptime import TimeRE, _strptime_datetime
 from .timezone import timedelta, timezone
 from .exc import LarsError
+from .cache import lru_cache
+from .stats import Counters, register, timer
 
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
 
@@ -212,6 +227,19 @@ def _string_parse(s):
     return _STRING_PARSE_RE.sub(unescape, s)
 
 
+# Busy servers log many consecutive lines with identical timestamps so the
+# results of the time parsers below are memoized. The resulting DateTime
+# objects are immutable and can therefore be shared between rows. As with the
+# regex cache in the strptime module, the caches are simply cleared when full;
+# this is cheaper than LRU bookkeeping and works well as log timestamps are
+# (roughly) in order
+_TIME_CACHE_SIZE = 1000
+_time_cache = {}
+_time_format_cache = {}
+_time_cache_counters = Counters()
+_time_format_cache_counters = Counters()
+
+
 def _time_parse_format(s, fmt):
     """
     Parse a time value in an Apache log file.
@@ -224,8 +252,24 @@ def _time_parse_format(s, fmt):
     :param str fmt: The strptime format the string must conform to
     :returns: A naive :class:`~lars.datatypes.DateTime` object
     """
+    try:
+        result = _time_format_cache[(s, fmt)]
+    except KeyError:
+        pass
+    else:
+        _time_format_cache_counters.hits += 1
+        return result
+    start = timer()
     tstamp = _strptime_datetime(dt.DateTime, s, fmt)
-    return dt.DateTime(*(tstamp.utctimetuple()[:6] + (tstamp.microsecond,)))
+    result = dt.DateTime(
+        *(tstamp.utctimetuple()[:6] + (tstamp.microsecond,)))
+    _time_format_cache_counters.misses += 1
+    _time_format_cache_counters.miss_time += timer() - start
+    if len(_time_format_cache) >= _TIME_CACHE_SIZE:
+        _time_format_cache_counters.evictions += len(_time_format_cache)
+        _time_format_cache.clear()
+    _time_format_cache[(s, fmt)] = result
+    return result
 
 
 def _time_parse_common(s):
@@ -238,6 +282,26 @@ def _time_parse_common(s):
     :param str s: The string containing the time to parse
     :returns: A naive :class:`~lars.datatypes.DateTime` object
     """
+    try:
+        result = _time_cache[s]
+    except KeyError:
+        pass
+    else:
+        _time_cache_counters.hits += 1
+        return result
+    start = timer()
+    result = _time_parse_common_uncached(s)
+    _time_cache_counters.misses += 1
+    _time_cache_counters.miss_time += timer() - start
+    if len(_time_cache) >= _TIME_CACHE_SIZE:
+        _time_cache_counters.evictions += len(_time_cache)
+        _time_cache.clear()
+    _time_cache[s] = result
+    return result
+
+
+def _time_parse_common_uncached(s):
+    # The implementation of _time_parse_common
     # pylint: disable=too-many-branches,too-many-statements
     if not 24 <= len(s) <= 28:
         raise ValueError('Invalid length')
@@ -345,6 +409,152 @@ def _generate_name(template, data, suffix):
         return template
 
 
+@lru_cache(maxsize=100)
+def _compile_log_format(
+        cls, log_format, projection, lazy, intern, url_cache, compact):
+    # A thread-safe cache of the compiled row regex, parsers, and row types
+    # for each combination of ApacheSource class, LogFormat string, and
+    # options; this makes constructing many sources with the same format (as
+    # when processing lots of small rotated log files) cheap
+    # pylint: disable=protected-access
+    return cls._compile(
+        log_format, projection, lazy, intern, url_cache, compact)
+
+
+register(
+    'apache.compile', _compile_log_format.cache_stats,
+    _compile_log_format.cache_reset_stats)
+register(
+    'apache.time',
+    lambda: _time_cache_counters.stats(len(_time_cache), _TIME_CACHE_SIZE),
+    _time_cache_counters.reset)
+register(
+    'apache.time_format',
+    lambda: _time_format_cache_counters.stats(
+        len(_time_format_cache), _TIME_CACHE_SIZE),
+    _time_format_cache_counters.reset)
+
+
+# The following functions split lines in the standard LogFormats using plain
+# string operations, which is considerably quicker than matching the row regex
+# (the backtracking required by the request and string patterns dominates the
+# time spent on long lines). They are deliberately conservative: any line
+# containing escapes, extra quotes, or extra (or missing) spaces results in
+# None and the caller falls back to the row regex. Each returns the values of
+# all fields in the format, which the caller must still validate
+
+def _split_time_request(rest):
+    # Splits '[time] "request" tail' into its three parts
+    if rest[:1] != '[':
+        return None
+    i = rest.find('] "')
+    if i == -1:
+        return None
+    j = rest.find('"', i + 3)
+    if j == -1 or rest[j + 1:j + 2] != ' ':
+        return None
+    return rest[:i + 1], rest[i + 3:j], rest[j + 2:]
+
+
+def _split_common(line, count=3):
+    # host ident user [time] "request" status size; count is one more for
+    # COMMON_VHOST as the line is prefixed with the vhost
+    if '\\' in line:
+        return None
+    values = line.split(' ', count)
+    if len(values) <= count or '' in values:
+        return None
+    parts = _split_time_request(values.pop())
+    if parts is None:
+        return None
+    time, request, tail = parts
+    tail = tail.split(' ')
+    if len(tail) != 2:
+        return None
+    values.append(time)
+    values.append(request)
+    values.extend(tail)
+    return values
+
+
+def _split_common_vhost(line):
+    return _split_common(line, 4)
+
+
+def _split_combined(line):
+    # host ident user [time] "request" status size "referer" "user-agent"
+    if '\\' in line:
+        return None
+    values = line.split(' ', 3)
+    if len(values) != 4 or '' in values:
+        return None
+    parts = _split_time_request(values.pop())
+    if parts is None:
+        return None
+    time, request, tail = parts
+    tail = tail.split(' ', 2)
+    if len(tail) != 3:
+        return None
+    status, size, quoted = tail
+    if len(quoted) < 2 or quoted[0] != '"' or quoted[-1] != '"':
+        return None
+    referer, sep, agent = quoted[1:-1].partition('" "')
+    if not sep or '"' in referer or '"' in agent:
+        return None
+    values.extend((time, request, status, size, referer, agent))
+    return values
+
+
+_SPLITTERS = {
+    COMMON:       _split_common,
+    COMMON_VHOST: _split_common_vhost,
+    COMBINED:     _split_combined,
+    }
+
+
+def _row_matcher(row_pattern, fields, split=None, validators=None):
+    # Returns a function which, given a line, returns a tuple of the values of
+    # the named fields, or None if the line doesn't match the row regex. If
+    # split is specified it is attempted first; each value it returns is
+    # checked against the corresponding entry of validators: a sequence of
+    # (anchored regex, wanted) tuples for every field in the format. Values
+    # of fields that aren't wanted (those excluded by the projection) are
+    # validated but omitted from the result
+    single = len(fields) == 1
+    row_match = row_pattern.match
+
+    def match_regex(line):
+        match = row_match(line)
+        if match:
+            values = match.group(*fields)
+            # match.group() returns a bare string rather than a tuple when
+            # only one group is requested
+            return (values,) if single else values
+        return None
+
+    if split is None:
+        return match_regex
+    checks = tuple(
+        (valid.match, wanted) for (valid, wanted) in validators)
+
+    def match_split(line):
+        values = split(line)
+        if values is not None:
+            result = []
+            for value, (valid, wanted) in zip(values, checks):
+                # "-" is valid for all the fields split above except time
+                # which is always bracketed
+                if value != '-' and not valid(value):
+                    break
+                if wanted:
+                    result.append(value)
+            else:
+                return tuple(result)
+        return match_regex(line)
+
+    return match_split
+
+
 class ApacheError(LarsError):
     """
     Base class for :class:`ApacheSource` errors.
@@ -451,19 +661,94 @@ class ApacheSource(object):
         ``%o``.  See Apache's `Custom Log Formats`_ documentation for full
         details.
 
+    If *fields* is specified, it must be a sequence of field names (from the
+    table above) and the rows yielded will contain only those fields (in the
+    order they appear in *log_format*). Fields that are not requested are
+    still matched, but are neither captured nor converted, which saves both
+    time and memory when only a few fields are of interest.
+
+    If *lazy* is True, the rows yielded will only convert a field from its
+    original string the first time the field is read (the result is then
+    cached on the row). This is considerably faster when only a few fields of
+    each row are examined (for example, when filtering on ``status``), but
+    note that lines containing values which cannot be converted will no longer
+    be skipped with an :exc:`ApacheWarning`. Instead, the :exc:`ValueError`
+    will be raised when the offending field is read.
+
+    If *intern* is specified, it must be a sequence of field names (or True
+    for the names in :attr:`INTERN_FIELDS`). Repeated values of these fields
+    will share a single object rather than each row receiving a new (but
+    equal) one, which reduces the memory used by rows that are retained and
+    avoids re-parsing repeated values. Interning is only worthwhile for
+    fields with few distinct values; up to :attr:`INTERN_SIZE` values are
+    retained for each field, and the values are shared between sources with
+    the same format and options. Interned values must not be modified, so
+    address and hostname fields (whose objects have writable attributes) are
+    not included in :attr:`INTERN_FIELDS`.
+
+    If *url_cache* is True, fields containing URLs (such as ``url_stem`` and
+    ``req_Referer``, but not ``request``) are constructed with
+    :func:`~lars.datatypes.cached_url`, which caches the most recently used
+    URLs. This is usually much faster as a few URLs tend to make up the bulk
+    of requests in a log.
+
+    If *compact* is True, address and hostname fields are constructed with
+    :func:`~lars.datatypes.compact_address` and
+    :func:`~lars.datatypes.compact_hostname`, so that addresses (with or
+    without a port number, such as a ``%h`` value of ``127.0.0.1:80``) are
+    constructed as the compact types like
+    :class:`~lars.datatypes.CompactIPv4Address` which use less memory.
+
+    If *profile* is True (or a :class:`~lars.timing.Profile` instance), the
+    time spent matching lines, converting each field, and constructing rows is
+    recorded in the :attr:`profile` attribute, and a summary is logged when
+    the source is closed; see :mod:`lars.timing` for details.
+
     :param source: A file-like object containing the source stream
     :param str format: Defaults to :data:`COMMON` but can be set to any valid
                    Apache LogFormat string
+    :param fields: An optional sequence of the field names to include in rows
+    :param bool lazy: If True, yield rows which convert their fields on demand
+    :param intern: An optional sequence of the field names to intern, or True
+    :param bool url_cache: If True, cache the results of parsing URL fields
+    :param bool compact: If True, use compact representations of addresses
+    :param profile: If True, record the time spent in each stage of parsing
     """
     # pylint: disable=too-few-public-methods
 
-    def __init__(self, source, log_format=COMMON):
+    # The fields interned when intern is True; these typically have few
+    # distinct values in any log
+    INTERN_FIELDS = (
+        'ident', 'remote_user', 'method', 'protocol', 'status', 'keepalive',
+        'connection_status', 'handler', 'req_User_Agent',
+        )
+
+    # The maximum number of distinct values retained for each interned field
+    INTERN_SIZE = 1000
+
+    def __init__(
+            self, source, log_format=COMMON, fields=None, lazy=False,
+            intern=None, url_cache=False, compact=False, profile=False):
+        # pylint: disable=too-many-arguments
         self.source = source
         self.log_format = log_format
+        self.projection = tuple(fields) if fields is not None else None
+        self.lazy = lazy
+        if intern is None or intern is True:
+            self.intern = intern
+        else:
+            self.intern = tuple(intern)
+        self.url_cache = url_cache
+        self.compact = compact
+        self.profile = timing.make_profile(profile)
         self.count = 0
         self._row_pattern = None
+        self._row_match = None
         self._row_funcs = None
         self._row_type = None
+        self._lazy_type = None
+        self._make_row = None
+        self._field_types = None
         self._parse_log_format()
 
     # This regex is used for extracting the format specifications from an
@@ -576,8 +861,49 @@ class ApacheSource(object):
     }
 
     def _parse_log_format(self):
-        self._row_funcs = []
-        self._row_type = None
+        # Compiling the row regex and (particularly) constructing the row
+        # type is relatively expensive, so the results are cached by the
+        # module-level _compile_log_format function for all instances with
+        # the same class, format, and options
+        (
+            self._row_pattern,
+            self._row_match,
+            self._row_funcs,
+            self._field_types,
+            self._row_type,
+            self._lazy_type,
+        ) = _compile_log_format(
+            type(self), self.log_format, self.projection, self.lazy,
+            self.intern, self.url_cache, self.compact)
+        self._make_row = self._lazy_type if self.lazy else self._row_type
+        if self.profile is not None:
+            # The compiled functions are shared with other instances, so the
+            # timed wrappers are only stored on this one
+            self._row_match = self.profile.wrap('match', self._row_match)
+            self._row_funcs = tuple(
+                self.profile.wrap('parse.%s' % name, func)
+                for (name, func) in zip(
+                    self._row_type._fields, self._row_funcs)
+                )
+            self._make_row = self.profile.wrap('row', self._make_row)
+
+    @classmethod
+    def _compile(cls, log_format, projection, lazy, intern, url_cache,
+                 compact):
+        # Returns a tuple of (row regex, row match function, row parsers,
+        # field types, row type, lazy row type) for the specified format and options
+        row_funcs = []
+        field_types = []
+        lazy_type = None
+        if projection is None:
+            wanted = None
+        else:
+            wanted = set(projection)
+        if intern is True:
+            interned = set(cls.INTERN_FIELDS)
+        else:
+            interned = set(intern or ())
+        all_fields = []
         tuple_fields = []
         # re.split() returns (when given a pattern with a matching group) a
         # list composed of [str, sep, str, sep, str, ...]. However, our pattern
@@ -587,36 +913,85 @@ class ApacheSource(object):
         # True below
         separator = True
         row_pattern = ''
-        for s in self.FIELD_RE1.split(self.log_format):
+        validators = []
+        for s in cls.FIELD_RE1.split(log_format):
             if s:
                 if separator:
                     row_pattern += re.escape(s)
                 else:
-                    name, pattern, parser = self._parse_log_field(s)
-                    if name in tuple_fields:
+                    name, pattern, parser, field_type = (
+                        cls._parse_log_field(s))
+                    if name in all_fields:
                         # This can happen if someone's stupid enough to, say,
                         # include %B and %b in a format string. If we actually
                         # encounter this a simple workaround is possible but
                         # this keeps things more user-friendly for the time
                         raise ValueError('Duplicate row field name %s' % name)
-                    tuple_fields.append(name)
-                    row_pattern += pattern
-                    self._row_funcs.append(parser)
+                    all_fields.append(name)
+                    validators.append((
+                        re.compile(r'(?:%s)\Z' % pattern, re.IGNORECASE),
+                        wanted is None or name in wanted))
+                    if wanted is None or name in wanted:
+                        if url_cache and parser is parsers.url_parse:
+                            parser = parsers.cached_url_parse
+                        if compact and parser is parsers.address_parse:
+                            parser = parsers.compact_address_parse
+                        if compact and parser is parsers.hostname_parse:
+                            parser = parsers.compact_hostname_parse
+                        if name in interned:
+                            parser = parsers.interned(parser, cls.INTERN_SIZE)
+                        tuple_fields.append(name)
+                        row_pattern += pattern
+                        row_funcs.append(parser)
+                        field_types.append(field_type)
+                    else:
+                        # Unwanted fields still have to be matched, but
+                        # there's no need to capture them
+                        row_pattern += parsers.non_capturing(pattern)
             separator = not separator
+        if wanted is not None:
+            unknown = wanted - set(all_fields)
+            if unknown:
+                raise ValueError(
+                    'Field(s) %s do not occur in the log format' %
+                    ', '.join(sorted(unknown)))
+            if not tuple_fields:
+                raise ValueError('At least one field must be selected')
+        if intern is not True:
+            unknown = interned - set(all_fields)
+            if unknown:
+                raise ValueError(
+                    'Field(s) %s do not occur in the log format' %
+                    ', '.join(sorted(unknown)))
         # IGNORECASE is required for the time format which needs
         # case-insensitive matching on abbreviated or full weekday or month
         # names
         logging.debug('Constructing row regex: %s', row_pattern)
-        self._row_pattern = re.compile(row_pattern, re.IGNORECASE)
+        row_pattern = re.compile(row_pattern, re.IGNORECASE)
         logging.debug('Constructing row tuple with fields: %s',
                       ','.join(tuple_fields))
-        self._row_type = dt.row(*tuple_fields)
-
-    def _parse_log_field(self, s):
+        row_type = dt.row(*tuple_fields)
+        if lazy:
+            lazy_type = dt.lazy_row(tuple_fields, row_funcs)
+        # The standard formats can (usually) be split without the row regex
+        split = _SPLITTERS.get(log_format)
+        if split is None:
+            row_match = _row_matcher(row_pattern, tuple_fields)
+        else:
+            row_match = _row_matcher(
+                row_pattern, tuple_fields, split, validators)
+        # The results are shared between instances, hence the conversion of
+        # the lists to (immutable) tuples
+        return (
+            row_pattern, row_match, tuple(row_funcs), tuple(field_types),
+            row_type, lazy_type)
+
+    @classmethod
+    def _parse_log_field(cls, s):
         # This function parses a single %{field}s in an Apache LogFormat
         # string; it is called by _parse_log_format which handles splitting up
         # the LogFormat into individual segments
-        match = self.FIELD_RE2.match(s)
+        match = cls.FIELD_RE2.match(s)
         if match:
             data, suffix = match.group('field'), match.group('suffix')
         else:
@@ -627,14 +1002,18 @@ class ApacheSource(object):
             data = data[1:-1]
         try:
             # General case: simple lookup to determine field name
-            template, field_type = self.FIELD_DEFS[suffix]
+            template, field_type = cls.FIELD_DEFS[suffix]
         except KeyError:
             raise ValueError('Invalid format suffix "%s"' % suffix)
-        name, pattern, parser = self._generate_parser(
+        name, pattern, parser = cls._generate_parser(
             data, field_type, _generate_name(template, data, suffix))
-        return name, pattern, parser
+        if field_type == 'string' and parser is parsers.url_parse:
+            # The referer special case in _generate_parser
+            field_type = 'url'
+        return name, pattern, parser, field_type
 
-    def _generate_parser(self, data, field_type, field_name):
+    @classmethod
+    def _generate_parser(cls, data, field_type, field_name):
         if field_type == 'time':
             # Special case: time
             if data:
@@ -688,7 +1067,7 @@ class ApacheSource(object):
             # General case: just lookup the parser and pattern in the class'
             # TYPES dictionary and construct an identity function if there's
             # no parser
-            parser, pattern = self.TYPES[field_type]
+            parser, pattern = cls.TYPES[field_type]
             if parser is None:
                 def parser(s):
                     # pylint: disable=missing-docstring
@@ -709,6 +1088,8 @@ class ApacheSource(object):
         after this method is called.
         """
         logging.debug('Closing Apache source')
+        if self.profile is not None:
+            logging.info('Apache source profile:\n%s', self.profile.summary())
         self.source = None
 
     def __iter__(self):
@@ -721,11 +1102,14 @@ class ApacheSource(object):
         performed by the regular expressions and tuple class set up in the
         initializer above.
         """
+        if self.lazy:
+            for row in self._iter_lazy():
+                yield row
+            return
         for num, line in enumerate(self.source):
             try:
-                match = self._row_pattern.match(line.rstrip())
-                if match:
-                    values = match.group(*self._row_type._fields)
+                values = self._row_match(line.rstrip())
+                if values is not None:
                     try:
                         values = [
                             f(v) for (f, v) in zip(self._row_funcs, values)
@@ -733,7 +1117,7 @@ class ApacheSource(object):
                     except ValueError as exc:
                         raise ApacheWarning(str(exc))
                     self.count += 1
-                    yield self._row_type(*values)
+                    yield self._make_row(*values)
                 else:
                     raise ApacheWarning('Line contains invalid data')
             except ApacheWarning as exc:
@@ -746,3 +1130,195 @@ class ApacheSource(object):
                     raise type(exc)(exc.args[0], line_number=num + 1,
                                     line=line)
                 raise  # pragma: no cover
+
+    def _iter_lazy(self):
+        # A variant of __iter__ for lazy rows; as no conversion is performed
+        # here the only warnings that can occur are for lines that fail to
+        # match the row regex
+        lazy_type = self._make_row
+        for num, line in enumerate(self.source):
+            values = self._row_match(line.rstrip())
+            if values is not None:
+                self.count += 1
+                yield lazy_type(*values)
+            else:
+                warnings.warn(
+                    ApacheWarning('Line %d: Line contains invalid data' %
+                                  (num + 1)))
+
+    def iter_batches(self, size=10000):
+        """
+        Yields lists of up to *size* row tuples from the file-like source
+        object.
+
+        This produces exactly the same rows (and warnings) as iterating over
+        the source, but lines are read from the source *size* at a time and
+        converted in a single tight loop, which avoids a generator step for
+        every row. This is best combined with the ``write_many`` method of
+        targets like :class:`~lars.csv.CSVTarget` and
+        :class:`~lars.sql.SQLTarget`::
+
+            with apache.ApacheSource(infile) as source:
+                with csv.CSVTarget(outfile) as target:
+                    for rows in source.iter_batches():
+                        target.write_many(rows)
+
+        :param int size: The maximum number of lines to read for each batch
+        """
+        make_row = self._make_row
+        for values in self._iter_values(size, convert=not self.lazy):
+            yield [make_row(*row) for row in values]
+
+    def iter_column_batches(self, size=10000):
+        """
+        Yields mappings of field names to NumPy arrays, each containing the
+        values of up to *size* rows from the file-like source object.
+
+        This requires NumPy to be installed. Fields are converted to arrays
+        according to their type; see :func:`~lars.columns.iter_column_batches`
+        for details. Addresses and times are converted straight from the
+        matched strings to the integers stored in their arrays, rather than to
+        objects. Warnings are emitted for invalid lines just as when iterating
+        over the source.
+
+        :param int size: The maximum number of lines to read for each batch
+        """
+        return columns.iter_column_batches(self, size)
+
+    def to_columns(self, size=10000):
+        """
+        Returns a mapping of field names to NumPy arrays containing the values
+        of all rows in the file-like source object.
+
+        This is equivalent to concatenating the arrays from
+        :meth:`iter_column_batches`; *size* determines the number of lines
+        that are read and converted at a time.
+
+        :param int size: The maximum number of lines to read for each batch
+        """
+        return columns.to_columns(self, size)
+
+    def iter_mmap(self, encoding='utf-8', errors='strict'):
+        """
+        Yields a row tuple for each line in the source, which must be a real
+        file (with a :meth:`fileno` method).
+
+        Instead of reading and decoding each line of the source, this method
+        memory-maps the entire file and matches a bytes version of the row
+        regex against each line in place. Only the captured fields are
+        decoded (with *encoding* and *errors*) before conversion. This is
+        considerably faster for large, uncompressed log files. The rows and
+        warnings produced are the same as iterating over the source, but note
+        that the whole file is read (from the start) regardless of the current
+        position of the source. The *encoding* must be ASCII compatible (e.g.
+        UTF-8, or Latin-1).
+
+        :param str encoding: The encoding of the source file
+        :param str errors: The error handling scheme used for decoding errors
+        """
+        # pylint: disable=too-many-locals,too-many-branches
+        fields = self._row_type._fields
+        single = len(fields) == 1
+        match_line = timing.instrument(
+            self.profile, 'match',
+            parsers.bytes_pattern(self._row_pattern, encoding).match)
+        funcs = self._row_funcs
+        lazy = self.lazy
+        make_row = self._make_row
+        fileno = self.source.fileno()
+        size = os.fstat(fileno).st_size
+        if not size:
+            # Zero-length files can't be mapped
+            return
+        buf = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        try:
+            find = buf.find
+            pos = 0
+            num = 0
+            while pos < size:
+                num += 1
+                end = find(b'\n', pos)
+                if end == -1:
+                    end = next_pos = size
+                else:
+                    next_pos = end + 1
+                # Equivalent to line.rstrip() in __iter__
+                while end > pos and buf[end - 1:end] in b' \t\r\x0b\x0c':
+                    end -= 1
+                match = match_line(buf, pos, end)
+                if match:
+                    values = match.group(*fields)
+                    if single:
+                        values = (values,)
+                    try:
+                        values = [v.decode(encoding, errors) for v in values]
+                        if not lazy:
+                            values = [f(v) for (f, v) in zip(funcs, values)]
+                    except ValueError as exc:
+                        # UnicodeDecodeError is a sub-class of ValueError
+                        warnings.warn(
+                            ApacheWarning('Line %d: %s' % (num, str(exc))))
+                    except ApacheError as exc:
+                        raise type(exc)(
+                            exc.args[0], line_number=num,
+                            line=buf[pos:next_pos].decode(encoding, 'replace'))
+                    else:
+                        self.count += 1
+                        yield make_row(*values)
+                else:
+                    warnings.warn(
+                        ApacheWarning(
+                            'Line %d: Line contains invalid data' % num))
+                pos = next_pos
+        finally:
+            buf.close()
+
+    def _iter_values(self, size, convert=True, converters=None):
+        # Yields lists of row values (as sequences) for each block of size
+        # lines read from the source; if convert is False, values are the
+        # raw strings matched by the row regex. If converters is given, it is
+        # called with the source to obtain the conversion functions used in
+        # place of _row_funcs
+        if size < 1:
+            raise ValueError('size must be 1 or more')
+        lines = iter(self.source)
+        num = 0
+        while True:
+            block = list(islice(lines, size))
+            if not block:
+                break
+            values = self._parse_block(block, num, convert, converters)
+            num += len(block)
+            if values:
+                yield values
+
+    def _parse_block(self, block, num, convert=True, converters=None):
+        # Convert a list of lines (the first of which is line num + 1 of the
+        # source) into a list of row values. This is essentially __iter__
+        # (and _iter_lazy) with all attribute lookups hoisted out of the loop
+        match_line = self._row_match
+        if converters is None:
+            funcs = self._row_funcs
+        else:
+            funcs = converters(self)
+        result = []
+        append = result.append
+        for num, line in enumerate(block, start=num + 1):
+            values = match_line(line.rstrip())
+            if values is not None:
+                if convert:
+                    try:
+                        values = [f(v) for (f, v) in zip(funcs, values)]
+                    except ValueError as exc:
+                        warnings.warn(
+                            ApacheWarning('Line %d: %s' % (num, str(exc))))
+                        continue
+                    except ApacheError as exc:
+                        raise type(exc)(exc.args[0], line_number=num,
+                                        line=line)
+                append(values)
+            else:
+                warnings.warn(
+                    ApacheWarning('Line %d: Line contains invalid data' % num))
+        self.count += len(result)
+        return result
@@ -22,8 +22,20 @@
 
 """
 This module provides a backport of the Python 3.3 LRU caching decorator. Users
-should never need to access this module directly; its contents are solely
-present to ensure DNS lookups can be cached under a Python 2.7 environment.
+should never need to access this module directly; its contents are present to
+ensure DNS lookups (and compiled log formats) can be cached under a Python 2.7
+environment.
+
+The module also provides the :class:`LRUCache` class and the :func:`cached`
+decorator, which allow a cache to be shared between several functions (for
+example, the synchronous and asynchronous DNS lookups in :mod:`lars.dns` and
+:mod:`lars.dns.aio`). The :class:`ShardedLRUCache` class (and the
+:func:`sharded_lru_cache` decorator) divide a cache into independently locked
+segments, which reduces contention when a cache is used by many threads, and
+the :class:`TTLCache` class expires entries after a period of time (with a
+separate period for negative results). Finally, the :class:`PersistentCache`
+class stores entries in an SQLite database so that they survive between
+processes.
 
 Source adapted from `Raymond Hettinger's recipe`_ licensed under the `MIT
 license`_.
@@ -46,14 +58,25 @@ from __future__ import (
     )
 
 
-from collections import namedtuple
+import re
+import time
+import pickle
+import sqlite3
+from collections import namedtuple, OrderedDict
 from functools import update_wrapper
 from threading import RLock
 
+from .stats import CacheStats, Counters, timer
+
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
 
 _CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
 
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    _monotonic = time.time
+
 
 class _HashedSeq(list):
     __slots__ = 'hashvalue'
@@ -107,6 +130,11 @@ def lru_cache(maxsize=100, typed=False):
     View the cache statistics named tuple (hits, misses, maxsize, currsize)
     with f.cache_info().  Clear the cache and statistics with f.cache_clear().
     Access the underlying function with f.__wrapped__.
+
+    The extended statistics used by :mod:`lars.stats` (which also include the
+    number of evictions and the time spent calling the function) can be
+    viewed with f.cache_stats() and reset (without clearing the cache) with
+    f.cache_reset_stats().
     """
 
     # Users should only access the lru_cache through its public API:
@@ -117,8 +145,8 @@ def lru_cache(maxsize=100, typed=False):
     def decorating_function(user_function):
         # pylint: disable=missing-docstring,too-many-locals,invalid-name
         cache = dict()
-        stats = [0, 0]           # make statistics updateable non-locally
-        HITS, MISSES = 0, 1      # names for the stats fields
+        stats = [0, 0, 0, 0.0]   # make statistics updateable non-locally
+        HITS, MISSES, EVICTIONS, MISS_TIME = 0, 1, 2, 3  # stats field names
         make_key = _make_key
         cache_get = cache.get    # bound method to lookup key or return None
         _len = len               # localize the global len() function
@@ -133,7 +161,9 @@ def lru_cache(maxsize=100, typed=False):
             def wrapper(*args, **kwds):
                 # no caching, just do a statistics update after a successful
                 # call
+                start = timer()
                 result = user_function(*args, **kwds)
+                stats[MISS_TIME] += timer() - start
                 stats[MISSES] += 1
                 return result
 
@@ -147,7 +177,9 @@ def lru_cache(maxsize=100, typed=False):
                 if result is not root:
                     stats[HITS] += 1
                     return result
+                start = timer()
                 result = user_function(*args, **kwds)
+                stats[MISS_TIME] += timer() - start
                 cache[key] = result
                 stats[MISSES] += 1
                 return result
@@ -172,7 +204,9 @@ def lru_cache(maxsize=100, typed=False):
                         link[NEXT] = root
                         stats[HITS] += 1
                         return result
+                start = timer()
                 result = user_function(*args, **kwds)
+                elapsed = timer() - start
                 with lock:
                     root, = nonlocal_root
                     if key in cache:
@@ -193,12 +227,14 @@ def lru_cache(maxsize=100, typed=False):
                         # now update the cache dictionary for the new links
                         del cache[oldkey]
                         cache[key] = oldroot
+                        stats[EVICTIONS] += 1
                     else:
                         # put result in a new link at the front of the list
                         last = root[PREV]
                         link = [last, root, key, result]
                         last[NEXT] = root[PREV] = cache[key] = link
                     stats[MISSES] += 1
+                    stats[MISS_TIME] += elapsed
                 return result
 
         def cache_info():
@@ -217,11 +253,814 @@ def lru_cache(maxsize=100, typed=False):
                 cache.clear()
                 root = nonlocal_root[0]
                 root[:] = [root, root, None, None]
-                stats[:] = [0, 0]
+                stats[:] = [0, 0, 0, 0.0]
+
+        def cache_stats():
+            """
+            Report extended cache statistics
+            """
+            with lock:
+                return CacheStats(
+                    stats[HITS], stats[MISSES], stats[EVICTIONS], len(cache),
+                    maxsize, stats[MISS_TIME])
+
+        def cache_reset_stats():
+            """
+            Reset the statistics
+            """
+            with lock:
+                stats[:] = [0, 0, 0, 0.0]
 
         wrapper.__wrapped__ = user_function
         wrapper.cache_info = cache_info
         wrapper.cache_clear = cache_clear
+        wrapper.cache_stats = cache_stats
+        wrapper.cache_reset_stats = cache_reset_stats
         return update_wrapper(wrapper, user_function)
 
     return decorating_function
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping of at most *maxsize* entries, which discards the
+    least recently used entry when full.
+
+    Unlike :func:`lru_cache`, the cache is an object in its own right, so it
+    can be shared by several functions (see :func:`cached`), or accessed
+    directly with :meth:`get` and :meth:`put`.
+
+    :param int maxsize: The maximum number of entries in the cache
+    """
+
+    def __init__(self, maxsize=100):
+        if maxsize < 1:
+            raise ValueError('maxsize must be 1 or more')
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = RLock()
+        self.counters = Counters()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Returns the value of *key* in the cache (marking it as the most
+        recently used), or *default* if *key* is not present.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.counters.misses += 1
+                return default
+            self._data[key] = value
+            self.counters.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores *value* as the value of *key* in the cache, discarding the
+        least recently used entry if the cache is full.
+        """
+        with self._lock:
+            if self._data.pop(key, self) is self:
+                if len(self._data) >= self.maxsize:
+                    self._data.popitem(last=False)
+                    self.counters.evictions += 1
+            self._data[key] = value
+
+    def clear(self):
+        """
+        Clears the cache and its statistics.
+        """
+        with self._lock:
+            self._data.clear()
+            self.counters.reset()
+
+    def info(self):
+        """
+        Returns the cache statistics as a named tuple of (hits, misses,
+        maxsize, currsize).
+        """
+        with self._lock:
+            return _CacheInfo(
+                self.counters.hits, self.counters.misses, self.maxsize,
+                len(self._data))
+
+    def stats(self):
+        """
+        Returns the extended statistics of the cache as a
+        :class:`~lars.stats.CacheStats` tuple.
+        """
+        with self._lock:
+            return self.counters.stats(len(self._data), self.maxsize)
+
+    def reset_stats(self):
+        """
+        Resets the statistics of the cache without clearing it.
+        """
+        self.counters.reset()
+
+
+def cached(cache, key=None):
+    """
+    Decorator which caches the results of a function in *cache*.
+
+    The *cache* must be an object with ``get``, ``put``, ``clear`` and
+    ``info`` methods, like :class:`LRUCache`. If *key* is specified, it is
+    called with the arguments of each call and must return the key under
+    which the result is cached (this allows other code to share the cache).
+    Otherwise, the key is derived from the arguments in the same manner as
+    :func:`lru_cache`.
+
+    As with :func:`lru_cache`, the statistics of the cache can be viewed with
+    f.cache_info(), the cache can be cleared with f.cache_clear(), and the
+    underlying function can be accessed with f.__wrapped__. The cache itself
+    is available as f.cache, and can be replaced (e.g. with a
+    :class:`ShardedLRUCache`) by assigning to this attribute.
+
+    If the cache also has ``stats`` and ``reset_stats`` methods and a
+    ``counters`` attribute (as all the caches in this module do), the time
+    spent calling the function is added to the cache's counters, and the
+    cache's extended statistics can be viewed with f.cache_stats() and reset
+    with f.cache_reset_stats().
+    """
+
+    def decorating_function(user_function):
+        # pylint: disable=missing-docstring
+        missing = object()
+
+        def wrapper(*args, **kwds):
+            if key is None:
+                cache_key = _make_key(args, kwds, False)
+            else:
+                cache_key = key(*args, **kwds)
+            current = wrapper.cache
+            result = current.get(cache_key, missing)
+            if result is missing:
+                start = timer()
+                result = user_function(*args, **kwds)
+                counters = getattr(current, 'counters', None)
+                if counters is not None:
+                    counters.miss_time += timer() - start
+                current.put(cache_key, result)
+            return result
+
+        def cache_info():
+            """
+            Report cache statistics
+            """
+            return wrapper.cache.info()
+
+        def cache_clear():
+            """
+            Clear the cache and statistics
+            """
+            wrapper.cache.clear()
+
+        def cache_stats():
+            """
+            Report extended cache statistics
+            """
+            return wrapper.cache.stats()
+
+        def cache_reset_stats():
+            """
+            Reset the statistics
+            """
+            wrapper.cache.reset_stats()
+
+        wrapper.__wrapped__ = user_function
+        wrapper.cache = cache
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_stats = cache_stats
+        wrapper.cache_reset_stats = cache_reset_stats
+        return update_wrapper(wrapper, user_function)
+
+    return decorating_function
+
+
+class _ClockCache(object):
+    # A mapping of at most maxsize entries which approximates LRU eviction
+    # with the CLOCK algorithm. Entries are held in a fixed ring of slots,
+    # each with a reference bit which is set when the entry is read. When the
+    # cache is full, the "hand" sweeps the ring clearing reference bits until
+    # it finds an unreferenced entry to evict. Reads take no lock (they only
+    # set a reference bit), and check the slot still holds the requested key
+    # in case it was replaced concurrently; the slot may also have been
+    # removed by a concurrent clear (IndexError) or not yet filled by a
+    # concurrent put (TypeError). Statistics are updated without a lock and
+    # hence are approximate under concurrent access
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._index = {}
+        self._entries = []
+        self._referenced = []
+        self._hand = 0
+        self._lock = RLock()
+        self.counters = Counters()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, default=None):
+        slot = self._index.get(key)
+        if slot is not None:
+            try:
+                entry_key, value = self._entries[slot]
+                if entry_key is key or entry_key == key:
+                    self._referenced[slot] = True
+                    self.counters.hits += 1
+                    return value
+            except (IndexError, TypeError):
+                pass
+        self.counters.misses += 1
+        return default
+
+    def put(self, key, value):
+        with self._lock:
+            slot = self._index.get(key)
+            if slot is None:
+                if len(self._entries) < self.maxsize:
+                    slot = len(self._entries)
+                    self._entries.append(None)
+                    self._referenced.append(False)
+                else:
+                    while self._referenced[self._hand]:
+                        self._referenced[self._hand] = False
+                        self._hand = (self._hand + 1) % self.maxsize
+                    slot = self._hand
+                    self._hand = (self._hand + 1) % self.maxsize
+                    del self._index[self._entries[slot][0]]
+                    self.counters.evictions += 1
+                self._index[key] = slot
+            self._entries[slot] = (key, value)
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
+            del self._entries[:]
+            del self._referenced[:]
+            self._hand = 0
+            self.counters.reset()
+
+    def info(self):
+        return _CacheInfo(
+            self.counters.hits, self.counters.misses, self.maxsize,
+            len(self._index))
+
+    def stats(self):
+        return self.counters.stats(len(self._index), self.maxsize)
+
+    def reset_stats(self):
+        self.counters.reset()
+
+
+class ShardedLRUCache(object):
+    """
+    A thread-safe mapping of at most *maxsize* entries, divided into *shards*
+    independent segments by the hash of each key.
+
+    Each shard has its own lock, so threads accessing the cache concurrently
+    rarely contend with each other. Each shard discards its own least
+    recently used entry when full (so eviction is only LRU within a shard).
+    If *clock* is True, each shard uses the CLOCK algorithm which
+    approximates LRU eviction, but requires no lock and no re-ordering of
+    entries when reading an entry from the cache.
+
+    If *shard_factory* is specified, it is called with the maximum size of
+    each shard and must return the cache to use for that shard (e.g. a
+    :class:`TTLCache`); *clock* is ignored in this case.
+
+    The methods are the same as those of :class:`LRUCache`, so instances can
+    be used with :func:`cached`.
+
+    :param int maxsize: The maximum number of entries in the cache
+    :param int shards: The number of segments to divide the cache into (at
+        most *maxsize*)
+    :param bool clock: If True, use CLOCK eviction instead of LRU
+    :param shard_factory: An optional callable which constructs each shard
+    """
+
+    def __init__(
+            self, maxsize=100, shards=16, clock=False, shard_factory=None):
+        if maxsize < 1:
+            raise ValueError('maxsize must be 1 or more')
+        if shards < 1:
+            raise ValueError('shards must be 1 or more')
+        self.maxsize = maxsize
+        self.clock = clock
+        # Never create empty shards, and share the remainder of maxsize among
+        # the first shards so that their capacities total exactly maxsize
+        shards = min(shards, maxsize)
+        shard_size, remainder = divmod(maxsize, shards)
+        if shard_factory is None:
+            shard_factory = _ClockCache if clock else LRUCache
+        self._shards = [
+            shard_factory(shard_size + (1 if i < remainder else 0))
+            for i in range(shards)
+            ]
+        # Only miss_time is recorded here; the other counters are those of
+        # the shards
+        self.counters = Counters()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, key):
+        return key in self._shards[hash(key) % len(self._shards)]
+
+    def get(self, key, default=None):
+        """
+        Returns the value of *key* in the cache (marking it as recently
+        used), or *default* if *key* is not present.
+        """
+        return self._shards[hash(key) % len(self._shards)].get(key, default)
+
+    def put(self, key, value):
+        """
+        Stores *value* as the value of *key* in the cache, discarding an
+        entry from the key's shard if it is full.
+        """
+        self._shards[hash(key) % len(self._shards)].put(key, value)
+
+    def clear(self):
+        """
+        Clears the cache and its statistics.
+        """
+        for shard in self._shards:
+            shard.clear()
+        self.counters.reset()
+
+    def info(self):
+        """
+        Returns the cache statistics as a named tuple of (hits, misses,
+        maxsize, currsize).
+        """
+        hits = misses = currsize = 0
+        for shard in self._shards:
+            info = shard.info()
+            hits += info.hits
+            misses += info.misses
+            currsize += info.currsize
+        return _CacheInfo(hits, misses, self.maxsize, currsize)
+
+    def stats(self):
+        """
+        Returns the extended statistics of the cache as a
+        :class:`~lars.stats.CacheStats` tuple.
+        """
+        hits = misses = evictions = currsize = 0
+        miss_time = self.counters.miss_time
+        for shard in self._shards:
+            stats = shard.stats()
+            hits += stats.hits
+            misses += stats.misses
+            evictions += stats.evictions
+            currsize += stats.currsize
+            miss_time += stats.miss_time
+        return CacheStats(
+            hits, misses, evictions, currsize, self.maxsize, miss_time)
+
+    def reset_stats(self):
+        """
+        Resets the statistics of the cache without clearing it.
+        """
+        for shard in self._shards:
+            shard.reset_stats()
+        self.counters.reset()
+
+
+def sharded_lru_cache(maxsize=100, shards=16, clock=False):
+    """
+    Least-recently-used cache decorator backed by a :class:`ShardedLRUCache`.
+
+    This is equivalent to :func:`lru_cache` (without the *typed* option), but
+    is better suited to functions called from many threads concurrently.
+    Statistics and clearing are available via f.cache_info() and
+    f.cache_clear() as with :func:`lru_cache`.
+
+    :param int maxsize: The maximum number of results to cache
+    :param int shards: The number of segments to divide the cache into (at
+        most *maxsize*)
+    :param bool clock: If True, use CLOCK eviction instead of LRU
+    """
+    return cached(ShardedLRUCache(maxsize, shards, clock))
+
+
+class TTLCache(object):
+    """
+    A thread-safe mapping of at most *maxsize* entries, in which each entry
+    expires *ttl* seconds after it was stored. The least recently used entry
+    is discarded when the cache is full.
+
+    Negative results (for which the *negative* callable, given the key and
+    the value, returns True) expire after *negative_ttl* seconds instead,
+    which defaults to *ttl*. By default, only None values are considered
+    negative. Expired entries are treated as absent, and are discarded when
+    next accessed or when they become the least recently used entry.
+
+    The methods are the same as those of :class:`LRUCache`, so instances can
+    be used with :func:`cached`.
+
+    :param int maxsize: The maximum number of entries in the cache
+    :param float ttl: The number of seconds before entries expire
+    :param float negative_ttl: The number of seconds before negative entries
+                               expire
+    :param negative: An optional callable which determines whether an entry
+                     is negative
+    :param timer: An optional callable returning the current time in seconds
+                  (defaults to :func:`time.monotonic`)
+    """
+
+    def __init__(
+            self, maxsize=100, ttl=3600, negative_ttl=None, negative=None,
+            timer=None):
+        # pylint: disable=too-many-arguments
+        if maxsize < 1:
+            raise ValueError('maxsize must be 1 or more')
+        if negative_ttl is None:
+            negative_ttl = ttl
+        if ttl <= 0 or negative_ttl <= 0:
+            raise ValueError('ttl and negative_ttl must be greater than 0')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._negative = negative or (lambda key, value: value is None)
+        self._timer = timer or _monotonic
+        self._data = OrderedDict()
+        self._lock = RLock()
+        self.counters = Counters()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            try:
+                expires, _ = self._data[key]
+            except KeyError:
+                return False
+            return expires > self._timer()
+
+    def get(self, key, default=None):
+        """
+        Returns the value of *key* in the cache (marking it as the most
+        recently used), or *default* if *key* is not present or has expired.
+        """
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                self.counters.misses += 1
+                return default
+            if expires <= self._timer():
+                self.counters.misses += 1
+                return default
+            self._data[key] = (expires, value)
+            self.counters.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores *value* as the value of *key* in the cache, discarding the
+        least recently used entry if the cache is full.
+        """
+        if self._negative(key, value):
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+        with self._lock:
+            if self._data.pop(key, self) is self:
+                if len(self._data) >= self.maxsize:
+                    self._data.popitem(last=False)
+                    self.counters.evictions += 1
+            self._data[key] = (self._timer() + ttl, value)
+
+    def clear(self):
+        """
+        Clears the cache and its statistics.
+        """
+        with self._lock:
+            self._data.clear()
+            self.counters.reset()
+
+    def info(self):
+        """
+        Returns the cache statistics as a named tuple of (hits, misses,
+        maxsize, currsize).
+        """
+        with self._lock:
+            return _CacheInfo(
+                self.counters.hits, self.counters.misses, self.maxsize,
+                len(self._data))
+
+    def stats(self):
+        """
+        Returns the extended statistics of the cache as a
+        :class:`~lars.stats.CacheStats` tuple.
+        """
+        with self._lock:
+            return self.counters.stats(len(self._data), self.maxsize)
+
+    def reset_stats(self):
+        """
+        Resets the statistics of the cache without clearing it.
+        """
+        self.counters.reset()
+
+
+# A sentinel distinguishing missing entries from cached None values
+_MISSING = object()
+
+# The number of reads a PersistentCache records before writing their recency
+# to the database (if no write occurs first)
+_PERSISTENT_USED_LIMIT = 10000
+
+
+class PersistentCache(object):
+    """
+    A thread-safe mapping of at most *maxsize* entries stored in the table
+    *table* of the SQLite database *filename* (which is created if it does
+    not exist), so that cached results survive between processes. The least
+    recently used entry is discarded when the cache is full.
+
+    If *front* is specified, it must be another cache (e.g. an
+    :class:`LRUCache`) which is read before the database, and which receives
+    every entry read from or written to the database; this avoids querying the
+    database for frequently used entries. Several caches may share a database
+    provided each uses a separate *table*.
+
+    If *ttl* is specified, entries expire *ttl* seconds after they were
+    stored, and negative entries (as determined by *negative*, see
+    :class:`TTLCache`) after *negative_ttl* seconds. Expiry is measured in
+    wall-clock time as it must be consistent between processes. Entries
+    never expire if *ttl* is None.
+
+    Keys and values must be picklable (and keys must pickle identically when
+    equal, as is the case for strings, numbers, and tuples of those). As
+    values are unpickled when read, never use a database from an untrusted
+    source.
+
+    Reading an entry doesn't write to the database. Instead, the recency of
+    entries read is recorded in memory and written to the database with the
+    next change (or when the cache is closed, or after 10000 reads), so a
+    warm cache costs no more than a query per lookup. The number of entries
+    is maintained in the database (by triggers), so that eviction is correct
+    when several processes share a table.
+
+    The methods are the same as those of :class:`LRUCache`, so instances can
+    be used with :func:`cached`; the statistics returned by :meth:`info`
+    count queries of the database (not of *front*).
+
+    :param str filename: The filename of the SQLite database
+    :param str table: The name of the table to store entries in
+    :param int maxsize: The maximum number of entries in the table
+    :param front: An optional cache to read before the database
+    :param float ttl: The number of seconds before entries expire
+    :param float negative_ttl: The number of seconds before negative entries
+                               expire
+    :param negative: An optional callable which determines whether an entry
+                     is negative
+    :param timer: An optional callable returning the current time in seconds
+                  (defaults to :func:`time.time`)
+    """
+
+    def __init__(
+            self, filename, table='cache', maxsize=1000000, front=None,
+            ttl=None, negative_ttl=None, negative=None, timer=None):
+        # pylint: disable=too-many-arguments
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', table):
+            raise ValueError('invalid table name %r' % table)
+        if maxsize < 1:
+            raise ValueError('maxsize must be 1 or more')
+        if negative_ttl is None:
+            negative_ttl = ttl
+        elif ttl is None:
+            raise ValueError('negative_ttl cannot be specified without ttl')
+        if ttl is not None and (ttl <= 0 or negative_ttl <= 0):
+            raise ValueError('ttl and negative_ttl must be greater than 0')
+        self.filename = filename
+        self.table = table
+        self.maxsize = maxsize
+        self.front = front
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._negative = negative or (lambda key, value: value is None)
+        self._timer = timer or time.time
+        self._lock = RLock()
+        self.counters = Counters()
+        # Maps the keys of entries read since the last write to their recency
+        self._read = {}
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        try:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS %s ('
+                'key BLOB PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+                'used INTEGER NOT NULL)' % table)
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS %s_used ON %s(used)' %
+                (table, table))
+            # The number of entries is kept in a separate single-row table
+            # so that it can be read cheaply (and accurately, when several
+            # processes share the database) within each transaction
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS %s_size (size INTEGER NOT NULL)' %
+                table)
+            self._conn.execute(
+                'INSERT INTO %s_size SELECT COUNT(*) FROM %s '
+                'WHERE NOT EXISTS (SELECT 1 FROM %s_size)' %
+                (table, table, table))
+            self._conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS %s_insert AFTER INSERT ON %s '
+                'BEGIN UPDATE %s_size SET size = size + 1; END' %
+                (table, table, table))
+            self._conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS %s_delete AFTER DELETE ON %s '
+                'BEGIN UPDATE %s_size SET size = size - 1; END' %
+                (table, table, table))
+            self._conn.commit()
+            self._used = self._max_used()
+        except Exception:
+            self._conn.close()
+            raise
+
+    @staticmethod
+    def _key(key):
+        return sqlite3.Binary(pickle.dumps(key, 2))
+
+    def _select(self, key):
+        # Returns the value of *key* in the database (discarding it if it has
+        # expired), or _MISSING; must be called with the lock held
+        row = self._conn.execute(
+            'SELECT value, expires FROM %s WHERE key = ?' % self.table,
+            (key,)).fetchone()
+        if row is None:
+            return _MISSING
+        value, expires = row
+        if expires is not None and expires <= self._timer():
+            self._write_read()
+            self._read.pop(key, None)
+            self._conn.execute(
+                'DELETE FROM %s WHERE key = ?' % self.table, (key,))
+            self._conn.commit()
+            return _MISSING
+        return pickle.loads(bytes(value))
+
+    def _write_read(self):
+        # Writes the recency of the entries read since the last write to the
+        # database; must be called with the lock held, and the caller must
+        # commit
+        if self._read:
+            self._conn.executemany(
+                'UPDATE %s SET used = ? WHERE key = ?' % self.table,
+                [(used, key) for (key, used) in self._read.items()])
+            self._read.clear()
+
+    def _size(self):
+        # Returns the number of entries in the table; must be called with the
+        # lock held
+        return self._conn.execute(
+            'SELECT size FROM %s_size' % self.table).fetchone()[0]
+
+    def _max_used(self):
+        # Returns the most recent use of any entry in the table (which other
+        # processes may have updated); must be called with the lock held
+        return self._conn.execute(
+            'SELECT COALESCE(MAX(used), 0) FROM %s' % self.table).fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._size()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._select(self._key(key)) is not _MISSING
+
+    def get(self, key, default=None):
+        """
+        Returns the value of *key* in the cache (marking it as the most
+        recently used), or *default* if *key* is not present or has expired.
+        """
+        if self.front is not None:
+            value = self.front.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        db_key = self._key(key)
+        with self._lock:
+            value = self._select(db_key)
+            if value is _MISSING:
+                self.counters.misses += 1
+                return default
+            self.counters.hits += 1
+            self._used += 1
+            self._read[db_key] = self._used
+            if len(self._read) >= _PERSISTENT_USED_LIMIT:
+                self._write_read()
+                self._conn.commit()
+        if self.front is not None:
+            self.front.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """
+        Stores *value* as the value of *key* in the cache, discarding the
+        least recently used entry if the cache is full.
+        """
+        if self.front is not None:
+            self.front.put(key, value)
+        if self.ttl is None:
+            expires = None
+        elif self._negative(key, value):
+            expires = self._timer() + self.negative_ttl
+        else:
+            expires = self._timer() + self.ttl
+        db_key = self._key(key)
+        db_value = sqlite3.Binary(pickle.dumps(value, 2))
+        with self._lock:
+            # The pending recency of entries read is written first so that it
+            # is accounted for by any eviction (and superseded by this entry)
+            self._write_read()
+            self._used += 1
+            cursor = self._conn.execute(
+                'UPDATE %s SET value = ?, expires = ?, used = ? '
+                'WHERE key = ?' % self.table,
+                (db_value, expires, self._used, db_key))
+            if not cursor.rowcount:
+                # The UPDATE above began a write transaction, so the size
+                # includes any entries added by other processes
+                size = self._size()
+                if size >= self.maxsize:
+                    cursor = self._conn.execute(
+                        'DELETE FROM %s WHERE key IN ('
+                        'SELECT key FROM %s ORDER BY used LIMIT ?)' %
+                        (self.table, self.table),
+                        (size - self.maxsize + 1,))
+                    self.counters.evictions += cursor.rowcount
+                    # Keep this process's uses ordered after those of others
+                    self._used = max(self._used, self._max_used() + 1)
+                self._conn.execute(
+                    'INSERT INTO %s (key, value, expires, used) '
+                    'VALUES (?, ?, ?, ?)' % self.table,
+                    (db_key, db_value, expires, self._used))
+            self._conn.commit()
+
+    def clear(self):
+        """
+        Removes all entries from the cache (and its *front*) and clears its
+        statistics.
+        """
+        if self.front is not None:
+            self.front.clear()
+        with self._lock:
+            self._read.clear()
+            self._conn.execute('DELETE FROM %s' % self.table)
+            self._conn.commit()
+            self.counters.reset()
+
+    def info(self):
+        """
+        Returns the cache statistics as a named tuple of (hits, misses,
+        maxsize, currsize).
+        """
+        with self._lock:
+            return _CacheInfo(
+                self.counters.hits, self.counters.misses, self.maxsize,
+                self._size())
+
+    def stats(self):
+        """
+        Returns the extended statistics of the cache as a
+        :class:`~lars.stats.CacheStats` tuple.
+        """
+        with self._lock:
+            return self.counters.stats(self._size(), self.maxsize)
+
+    def reset_stats(self):
+        """
+        Resets the statistics of the cache without clearing it.
+        """
+        self.counters.reset()
+
+    def close(self):
+        """
+        Closes the database, first writing the recency of any entries read
+        since the last change. The cache cannot be used after this is called.
+        """
+        with self._lock:
+            if self._read:
+                self._write_read()
+                self._conn.commit()
+            self._conn.close()
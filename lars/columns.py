@@ -0,0 +1,425 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+This module provides columnar (`NumPy`_ array) output for the sources in
+:mod:`lars.apache` and :mod:`lars.iis`. Rather than constructing a row tuple
+for every line in a log file, the values of each batch of lines are written
+into pre-allocated arrays (one per field), which is both faster and far more
+compact. Once loaded, aggregations over the columns can be performed with
+vectorized NumPy operations.
+
+Addresses, dates, and times are converted straight from the strings matched
+in the log to the integers stored in their arrays. Each distinct string is
+parsed once (by the source's usual parser, so invalid values still produce
+warnings) and the resulting integer is re-used for every subsequent
+occurrence, so no address or time objects are kept per row. Other fields are
+converted by the source's parsers as usual.
+
+NumPy is an optional dependency of lars; it must be installed to use the
+functions in this module (or the ``iter_column_batches`` and ``to_columns``
+methods of the sources, which simply call them).
+
+The type of array used for each field is determined by the field's type in
+the source (see :attr:`~lars.apache.ApacheSource.TYPES` and
+:attr:`~lars.iis.IISSource.FIELD_TYPES`):
+
+============================ ============================= ====================
+Field type                   Array dtype                   Missing value
+============================ ============================= ====================
+integer                      ``int64``                     -1
+fixed                        ``float64``                   NaN
+time (Apache), timestamp     ``datetime64[us]``            NaT
+date (IIS)                   ``datetime64[D]``             NaT
+time (IIS)                   ``timedelta64[us]`` (1)       NaT
+address                      ``uint32`` (2)                0
+method, protocol, keepalive  :class:`Categorical` (3)      -1
+anything else                ``object``                    None
+============================ ============================= ====================
+
+Notes:
+
+(1)
+    IIS time fields are stored as the offset from midnight.
+
+(2)
+    IPv4 addresses are stored as integers, in the same manner as
+    ``int(address)``; port numbers are discarded. Any IPv6 address
+    encountered is stored as 0 and a :exc:`ColumnWarning` is raised.
+
+(3)
+    Categorical columns are dictionary-encoded. The codes refer to the same
+    categories in every batch produced by the same call (the categories list
+    in each batch includes those of all prior batches).
+
+
+Functions
+=========
+
+.. autofunction:: iter_column_batches
+
+.. autofunction:: to_columns
+
+
+Classes
+=======
+
+.. autoclass:: Categorical
+
+
+Exceptions
+==========
+
+.. autoexception:: ColumnWarning
+
+
+Examples
+========
+
+To count requests by status code in an Apache log::
+
+    import io
+    import numpy as np
+    from lars import apache
+
+    with io.open('/var/log/apache2/access.log', 'r') as infile:
+        with apache.ApacheSource(infile, fields=['status']) as source:
+            status = source.to_columns()['status']
+    codes, counts = np.unique(status, return_counts=True)
+
+
+.. _NumPy: http://www.numpy.org/
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import warnings
+from datetime import datetime
+from collections import namedtuple, OrderedDict
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .exc import LarsWarning
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+class ColumnWarning(LarsWarning):
+    """
+    Raised when a value cannot be represented in its column.
+    """
+
+
+class Categorical(namedtuple('Categorical', ('codes', 'categories'))):
+    """
+    Represents a dictionary-encoded column.
+
+    .. attribute:: codes
+
+        An ``int32`` array containing the index of each row's value within
+        :attr:`categories`, or -1 where the value is missing
+
+    .. attribute:: categories
+
+        A list of the distinct values encountered
+    """
+    __slots__ = ()
+
+    def values(self):
+        """
+        Returns an ``object`` array of the decoded values.
+        """
+        lookup = np.empty(len(self.categories) + 1, dtype=object)
+        lookup[:-1] = self.categories
+        lookup[-1] = None
+        return lookup[self.codes]
+
+
+# Maps the field types used by the sources to column kinds
+KINDS = {
+    'integer':      'int',
+    'fixed':        'float',
+    'time':         'datetime',
+    'date_iso':     'date',
+    'time_iso':     'time',
+    'datetime_iso': 'datetime',
+    'address':      'ipv4',
+    'address_port': 'ipv4',
+    'method':       'category',
+    'protocol':     'category',
+    'keepalive':    'category',
+    }
+
+
+# The maximum number of distinct strings remembered by each of the converters
+# below; when exceeded, the converter's cache is simply cleared
+_CONVERTER_CACHE_SIZE = 10000
+
+# The integer representation of NaT in datetime64 and timedelta64 arrays
+_NAT = -2 ** 63
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def _datetime_value(value):
+    delta = value - _EPOCH
+    return (
+        (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _date_value(value):
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def _time_value(value):
+    return (
+        ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 +
+        value.microsecond)
+
+
+def _ipv4_value(value):
+    # Returns None for non-IPv4 addresses so that the converter can warn about
+    # each occurrence
+    return int(value) if value.version == 4 else None
+
+
+def _cached_converter(parse, convert, missing):
+    # Returns a function which converts a matched string to the integer
+    # stored in a column, by passing it to the field's parser and the result
+    # to convert (or returning missing if the parser returns None). Results
+    # are cached by string; parsing errors propagate to the source (which
+    # skips the line with a warning) and aren't cached
+    cache = {}
+
+    def converter(s):
+        try:
+            return cache[s]
+        except KeyError:
+            pass
+        value = parse(s)
+        result = missing if value is None else convert(value)
+        if len(cache) >= _CONVERTER_CACHE_SIZE:
+            cache.clear()
+        cache[s] = result
+        return result
+    return converter
+
+
+def _ipv4_converter(parse):
+    converter = _cached_converter(parse, _ipv4_value, 0)
+
+    def ipv4_converter(s):
+        result = converter(s)
+        if result is None:
+            warnings.warn(ColumnWarning('Non-IPv4 address %s stored as 0' % s))
+            return 0
+        return result
+    return ipv4_converter
+
+
+def _int_column(values, count):
+    return np.fromiter(
+        (-1 if v is None else v for v in values), dtype=np.int64, count=count)
+
+
+def _float_column(values, count):
+    return np.fromiter(
+        (np.nan if v is None else v for v in values), dtype=np.float64,
+        count=count)
+
+
+# The following take values produced by the converters above
+
+def _datetime_column(values, count):
+    return np.fromiter(
+        values, dtype=np.int64, count=count).view('datetime64[us]')
+
+
+def _date_column(values, count):
+    return np.fromiter(
+        values, dtype=np.int64, count=count).view('datetime64[D]')
+
+
+def _time_column(values, count):
+    return np.fromiter(
+        values, dtype=np.int64, count=count).view('timedelta64[us]')
+
+
+def _ipv4_column(values, count):
+    return np.fromiter(values, dtype=np.uint32, count=count)
+
+
+def _object_column(values, count):
+    # Don't pass values to np.array as it will attempt to treat row values
+    # that are tuples (like Request and Url) as sequences
+    result = np.empty(count, dtype=object)
+    for i, v in enumerate(values):
+        result[i] = v
+    return result
+
+
+_COLUMNS = {
+    'int':      _int_column,
+    'float':    _float_column,
+    'datetime': _datetime_column,
+    'date':     _date_column,
+    'time':     _time_column,
+    'ipv4':     _ipv4_column,
+    'object':   _object_column,
+    }
+
+
+# Maps column kinds to functions which construct the converter for a field
+# from the source's parser for it (kinds not listed use the parser as is)
+_CONVERTERS = {
+    'datetime': lambda parse: _cached_converter(parse, _datetime_value, _NAT),
+    'date':     lambda parse: _cached_converter(parse, _date_value, _NAT),
+    'time':     lambda parse: _cached_converter(parse, _time_value, _NAT),
+    'ipv4':     _ipv4_converter,
+    }
+
+
+class _ColumnBuilder(object):
+    # Converts lists of row values into ordered mappings of field names to
+    # arrays. The builder is passed to the source's _iter_values method as
+    # the converters callable, which initializes it from the source's fields
+    # when they are first known. The builder retains the categories of
+    # categorical columns so that codes are consistent between batches
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        if np is None:
+            raise ImportError('NumPy is required for columnar output')
+        self.fields = None
+        self.kinds = None
+        self.categories = None
+        self._converters = None
+
+    def __call__(self, source):
+        # pylint: disable=protected-access
+        if self._converters is None:
+            self.fields = source._row_type._fields
+            self.kinds = [
+                KINDS.get(field_type, 'object')
+                for field_type in source._field_types
+                ]
+            self.categories = [
+                ([], {}) if kind == 'category' else None
+                for kind in self.kinds
+                ]
+            self._converters = tuple(
+                _CONVERTERS[kind](func) if kind in _CONVERTERS else func
+                for (kind, func) in zip(self.kinds, source._row_funcs)
+                )
+        return self._converters
+
+    def _category_column(self, index, values, count):
+        categories, lookup = self.categories[index]
+        codes = np.empty(count, dtype=np.int32)
+        for i, v in enumerate(values):
+            if v is None:
+                codes[i] = -1
+            else:
+                try:
+                    codes[i] = lookup[v]
+                except KeyError:
+                    codes[i] = lookup[v] = len(categories)
+                    categories.append(v)
+        return Categorical(codes, list(categories))
+
+    def build(self, rows):
+        count = len(rows)
+        if count:
+            columns = zip(*rows)
+        else:
+            columns = [()] * len(self.fields)
+        result = OrderedDict()
+        for index, (name, kind, values) in enumerate(
+                zip(self.fields, self.kinds, columns)):
+            if kind == 'category':
+                result[name] = self._category_column(index, values, count)
+            else:
+                result[name] = _COLUMNS[kind](values, count)
+        return result
+
+
+def iter_column_batches(source, size=10000):
+    """
+    Yields mappings of field names to NumPy arrays, each containing the values
+    of up to *size* rows from *source*.
+
+    The *source* must be an :class:`~lars.apache.ApacheSource` or
+    :class:`~lars.iis.IISSource` instance (the ``iter_column_batches`` method
+    of those classes simply calls this function). Each mapping is an
+    :class:`~collections.OrderedDict` with the same keys (in the same order)
+    as the row tuples the source would otherwise produce. Lazy Apache sources
+    are treated as ordinary sources (all fields are converted).
+
+    :param source: The source to read rows from
+    :param int size: The maximum number of lines to read for each batch
+    """
+    # pylint: disable=protected-access
+    builder = _ColumnBuilder()
+    for rows in source._iter_values(size, converters=builder):
+        yield builder.build(rows)
+
+
+def to_columns(source, size=10000):
+    """
+    Returns a mapping of field names to NumPy arrays containing the values of
+    all rows in *source*.
+
+    This is equivalent to concatenating the arrays from
+    :func:`iter_column_batches`. If the source contains no rows, the arrays
+    will be empty (in the case of an :class:`~lars.iis.IISSource` without a
+    ``#Fields`` directive the mapping itself will be empty).
+
+    :param source: The source to read rows from
+    :param int size: The maximum number of lines to read for each batch
+    """
+    # pylint: disable=protected-access
+    batches = list(iter_column_batches(source, size))
+    if not batches:
+        if source._row_type is None:
+            return OrderedDict()
+        builder = _ColumnBuilder()
+        builder(source)
+        return builder.build([])
+    result = OrderedDict()
+    for name, column in batches[-1].items():
+        if isinstance(column, Categorical):
+            result[name] = Categorical(
+                np.concatenate([batch[name].codes for batch in batches]),
+                column.categories)
+        else:
+            result[name] = np.concatenate([batch[name] for batch in batches])
+    return result
@@ -136,6 +136,8 @@ try:
 except ImportError:
     import csv as csv_
 
+from . import timing
+
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
 try:
     long
@@ -187,18 +189,24 @@ class CSVTarget(object):
         terminator that is used, and partly because the class handles its own
         character encoding.
 
+    If *profile* is True (or a :class:`~lars.timing.Profile` instance), the
+    time spent writing rows is recorded in the :attr:`profile` attribute, and
+    a summary is logged when the target is closed; see :mod:`lars.timing` for
+    details.
+
     .. _Python standard encodings: http://docs.python.org/2/library/codecs.html#standard-encodings
     """
     # pylint: disable=too-few-public-methods,too-many-instance-attributes
 
     def __init__(
             self, fileobj, header=False, dialect=CSV_DIALECT, encoding='utf-8',
-            **kwargs):
+            profile=False, **kwargs):
         self.fileobj = fileobj
         self.header = header
         self.dialect = dialect
         self.encoding = encoding
         self.keywords = kwargs
+        self.profile = timing.make_profile(profile)
         self.count = 0
         self._first_row = None
         # The csv writer outputs strings so we stick a transcoding shim between
@@ -206,6 +214,10 @@ class CSVTarget(object):
         self._writer = csv_.writer(
             codecs.getwriter(self.encoding)(self.fileobj),
             dialect=self.dialect, **self.keywords)
+        self._writerow = timing.instrument(
+            self.profile, 'write', self._writer.writerow)
+        self._writerows = timing.instrument(
+            self.profile, 'write', self._writer.writerows)
 
     def __enter__(self):
         logging.debug('Entering CSVTarget context')
@@ -221,7 +233,11 @@ class CSVTarget(object):
         after calling this method.
         """
         logging.debug('Closing CSV target')
+        if self.profile is not None:
+            logging.info('CSV target profile:\n%s', self.profile.summary())
         self._writer = None
+        self._writerow = None
+        self._writerows = None
         self._first_row = None
 
     def write(self, row):
@@ -240,6 +256,25 @@ class CSVTarget(object):
             if self.header and hasattr(row, '_fields'):
                 # XXX What if it doesn't have any _fields?
                 logging.debug('Writing header row')
-                self._writer.writerow(row._fields)
-        self._writer.writerow(row)
+                self._writerow(row._fields)
+        self._writerow(row)
         self.count += 1
+
+    def write_many(self, rows):
+        """
+        Write each of the tuples in the sequence *rows* to the wrapped output.
+        This is equivalent to calling :meth:`write` for each row, but is
+        rather faster as the rows are handed to the underlying writer in a
+        single call. The same restrictions as :meth:`write` apply.
+        """
+        if not rows:
+            return
+        if not self._first_row:
+            self.write(rows[0])
+            rows = rows[1:]
+        length = len(self._first_row)
+        for row in rows:
+            if len(row) != length:
+                raise TypeError('Rows must have the same number of elements')
+        self._writerows(rows)
+        self.count += len(rows)
@@ -37,6 +37,18 @@ transforming log data for output.
 Classes
 =======
 
+.. autoclass:: CompactIPv4Address
+   :members:
+
+.. autoclass:: CompactIPv4Port
+   :members:
+
+.. autoclass:: CompactIPv6Address
+   :members:
+
+.. autoclass:: CompactIPv6Port
+   :members:
+
 .. autoclass:: DateTime
    :members:
 
@@ -79,6 +91,16 @@ Functions
 
 .. autofunction:: address
 
+.. autofunction:: cached_address
+
+.. autofunction:: cached_hostname
+
+.. autofunction:: cached_url
+
+.. autofunction:: compact_address
+
+.. autofunction:: compact_hostname
+
 .. autofunction:: date
 
 .. autofunction:: datetime
@@ -91,6 +113,8 @@ Functions
 
 .. autofunction:: row
 
+.. autofunction:: lazy_row
+
 .. autofunction:: time
 
 .. autofunction:: url
@@ -120,18 +144,22 @@ from __future__ import (
 import re
 import datetime as dt
 import sqlite3
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 
 # This module collects various sub-modules together; don't warn about unused
 # imports (F401)
 from .datetime import date, time, datetime, Date, Time, DateTime  # noqa: F401
 from .ipaddress import (  # noqa: F401
-    hostname, address, network,
+    hostname, address, network, cached_hostname, cached_address,
+    compact_address, compact_hostname,
     Hostname,
     IPv4Address, IPv6Address,
     IPv4Network, IPv6Network,
-    IPv4Port, IPv6Port)
-from .url import path, url, request, Path, Url, Request  # noqa: F401
+    IPv4Port, IPv6Port,
+    CompactIPv4Address, CompactIPv6Address, CompactIPv4Port, CompactIPv6Port)
+from .url import (  # noqa: F401
+    path, url, cached_url, request,
+    Path, Url, Request)
 
 native_str = str  # pylint: disable=invalid-name
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
@@ -167,6 +195,126 @@ def row(*args):
     return namedtuple('Row', args)
 
 
+# Sentinel used by LazyRow to mark fields which have not been converted yet
+# (None is a perfectly valid converted value so can't be used for this)
+_UNSET = object()
+
+
+class LazyRow(object):
+    """
+    Base class for the row types returned by :func:`lazy_row`.
+
+    Instances hold the raw (unconverted) strings for each field and only call
+    the field's parser the first time that field is read, caching the result
+    for subsequent reads. Otherwise instances behave like read-only tuples:
+    they can be iterated, indexed, compared, and have a :attr:`_fields`
+    attribute (reading a row in any of these ways converts all fields).
+    """
+
+    __slots__ = ('_raw', '_values')
+    _fields = ()
+    _parsers = ()
+
+    def __init__(self, *raw):
+        if len(raw) != len(self._fields):
+            raise TypeError(
+                'Expected %d values, got %d' % (len(self._fields), len(raw)))
+        self._raw = raw
+        self._values = [_UNSET] * len(raw)
+
+    def _get(self, index):
+        value = self._values[index]
+        if value is _UNSET:
+            value = self._values[index] = self._parsers[index](self._raw[index])
+        return value
+
+    def _asdict(self):
+        """
+        Returns a new :class:`~collections.OrderedDict` mapping field names to
+        their (converted) values.
+        """
+        return OrderedDict(zip(self._fields, self))
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __iter__(self):
+        for index in range(len(self._fields)):
+            yield self._get(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        if index < 0:
+            index += len(self._fields)
+        if not 0 <= index < len(self._fields):
+            raise IndexError('row index out of range')
+        return self._get(index)
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return '%s(%s)' % (
+            self.__class__.__name__,
+            ', '.join(
+                '%s=%r' % (name, value)
+                for (name, value) in zip(self._fields, self)
+            ))
+
+
+def lazy_row(fields, parsers):
+    """
+    Returns a new row type with the specified *fields* whose values are
+    converted on demand. For example::
+
+        NewRow = lazy_row(('foo', 'bar'), (int, float))
+        a_row = NewRow('1', '2.5')
+        print(a_row.foo)  # only converts "foo"
+
+    Instances are constructed from the raw strings of each field; the
+    corresponding function in *parsers* is only called when a field is first
+    read, after which the result is cached on the row. This is useful when
+    only a handful of the fields in a row are ever examined, but note that
+    any errors in conversion will only be raised when the offending field is
+    read.
+
+    :param fields: The sequence of field names to include in the row
+    :param parsers: A sequence of functions (one for each field) which
+                    convert the raw string of a field into its value
+    :returns: A :class:`LazyRow` sub-class with the specified fields
+    """
+    fields = tuple(fields)
+    parsers = tuple(parsers)
+    if len(fields) != len(parsers):
+        raise ValueError('There must be a parser for every field')
+    namespace = {
+        '__slots__': (),
+        '_fields': fields,
+        '_parsers': parsers,
+        }
+    for index, name in enumerate(fields):
+        if name.startswith('_') or name in namespace:
+            raise ValueError('Invalid or duplicate field name %s' % name)
+
+        def getter(self, index=index, parser=parsers[index]):
+            # pylint: disable=missing-docstring
+            values = self._values
+            value = values[index]
+            if value is _UNSET:
+                value = values[index] = parser(self._raw[index])
+            return value
+
+        namespace[name] = property(getter)
+    return type(native_str('Row'), (LazyRow,), namespace)
+
+
 # Here we register our derivative Date, Time and DateTime classes with
 # sqlite3's adapter registry. This is necessary as the register doesn't handle
 # derivative types. While we're at it, we register adapters and convertors for
@@ -51,6 +51,8 @@ except ImportError:
 
 from lars import dns
 from lars import geoip
+from lars.cache import lru_cache
+from lars.stats import register
 
 native_str = str  # pylint: disable=invalid-name
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
@@ -60,25 +62,83 @@ def hostname(s):
     """
     Returns a :class:`Hostname`, :class:`IPv4Address`, or :class:`IPv6Address`
     object for the given string depending on whether it represents an IP
-    address or a hostname.
+    address or a hostname. An IPv4 address followed by a port number (e.g.
+    ``127.0.0.1:80``) is returned as an :class:`IPv4Port` instance.
 
     :param str s: The string containing the hostname to parse
-    :returns: A :class:`Hostname`, :class:`IPv4Address`, or
+    :returns: A :class:`Hostname`, :class:`IPv4Address`, :class:`IPv4Port`, or
               :class:`IPv6Address` instance
     """
+    return _hostname(s, _TYPES)
+
+
+def compact_hostname(s):
+    """
+    Returns a :class:`Hostname`, :class:`CompactIPv4Address`,
+    :class:`CompactIPv4Port`, or :class:`CompactIPv6Address` object for the
+    given string.
+
+    This is equivalent to :func:`hostname`, but addresses are returned as
+    the compact types, which use less memory than :class:`IPv4Address`,
+    :class:`IPv4Port`, and :class:`IPv6Address` instances.
+
+    :param str s: The string containing the hostname to parse
+    :returns: A :class:`Hostname`, :class:`CompactIPv4Address`,
+              :class:`CompactIPv4Port`, or :class:`CompactIPv6Address`
+              instance
+    """
+    return _hostname(s, _COMPACT_TYPES)
+
+
+def _hostname(s, types):
+    ipv4_type, ipv4_port_type, ipv6_type, _ = types
     if isinstance(s, bytes):
         s = s.decode('utf-8')
-    try:
-        return IPv4Address(s)
-    except ValueError:
-        pass
-    try:
-        return IPv6Address(s)
-    except ValueError:
-        pass
+    # Rather than attempting each type in turn (which is slow as exceptions
+    # are costly), only attempt an address if the string looks like one;
+    # hostnames never contain colons, an IPv4 address must be composed of 4
+    # dot-separated numbers, and a single colon can only be an IPv4 address
+    # with a port (an IPv6 address always contains at least two colons)
+    if ':' in s:
+        try:
+            if s.count(':') == 1:
+                return ipv4_port_type(s)
+            return ipv6_type(s)
+        except ValueError:
+            pass
+    elif s.count('.') == 3 and s.replace('.', '').isdigit():
+        try:
+            return ipv4_type(s)
+        except ValueError:
+            pass
     return Hostname(s)
 
 
+@lru_cache(maxsize=10000)
+def cached_hostname(s):
+    """
+    Returns a :class:`Hostname`, :class:`IPv4Address`, :class:`IPv4Port`, or
+    :class:`IPv6Address` object for the given string, caching the result.
+
+    This is equivalent to :func:`hostname`, but the results for the 10000 most
+    recently used strings are cached. Statistics on the effectiveness of the
+    cache can be obtained by calling ``cached_hostname.cache_info()``. Note
+    that the objects returned are shared, so the result (including the
+    :attr:`~IPv4Port.port` of an :class:`IPv4Port` result) must not be
+    modified.
+
+    :param str s: The string containing the hostname to parse
+    :returns: A :class:`Hostname`, :class:`IPv4Address`, :class:`IPv4Port`, or
+              :class:`IPv6Address` instance
+    """
+    return hostname(s)
+
+
+register(
+    'datatypes.hostname', cached_hostname.cache_stats,
+    cached_hostname.cache_reset_stats)
+
+
 def network(s):
     """
     Returns an :class:`IPv4Network` or :class:`IPv6Network` instance for the
@@ -110,26 +170,75 @@ def address(s):
     :returns: An :class:`IPv4Address`, :class:`IPv4Port`, :class:`IPv6Address`,
               or :class:`IPv6Port` instance
     """
+    return _address(s, _TYPES)
+
+
+def compact_address(s):
+    """
+    Returns a :class:`CompactIPv4Address`, :class:`CompactIPv6Address`,
+    :class:`CompactIPv4Port`, or :class:`CompactIPv6Port` instance for the
+    given string.
+
+    This is equivalent to :func:`address`, but the compact types are
+    returned, which use less memory than :class:`IPv4Address`,
+    :class:`IPv6Address`, :class:`IPv4Port`, and :class:`IPv6Port` instances.
+
+    :param str s: The string containing the IP address to parse
+    :returns: A :class:`CompactIPv4Address`, :class:`CompactIPv4Port`,
+              :class:`CompactIPv6Address`, or :class:`CompactIPv6Port`
+              instance
+    """
+    return _address(s, _COMPACT_TYPES)
+
+
+def _address(s, types):
+    ipv4_type, ipv4_port_type, ipv6_type, ipv6_port_type = types
     if isinstance(s, bytes):
         s = s.decode('utf-8')
+    # Select the type from the punctuation in the string rather than
+    # attempting each type in turn (exceptions are costly). A leading bracket
+    # can only be an IPv6 address (optionally with a port), a single colon
+    # can only be an IPv4 address with a port, while an IPv6 address always
+    # contains at least two colons
+    if s.startswith('['):
+        cls = ipv6_port_type
+    else:
+        colons = s.count(':')
+        if not colons:
+            cls = ipv4_type
+        elif colons == 1:
+            cls = ipv4_port_type
+        else:
+            cls = ipv6_type
     try:
-        return IPv4Address(s)
-    except ValueError:
-        pass
-    try:
-        return IPv6Address(s)
-    except ValueError:
-        pass
-    try:
-        return IPv4Port(s)
-    except ValueError:
-        pass
-    try:
-        return IPv6Port(s)
+        return cls(s)
     except ValueError:
-        pass
-    raise ValueError(
-        '%s does not appear to be a valid IPv4 or IPv6 address' % s)
+        raise ValueError(
+            '%s does not appear to be a valid IPv4 or IPv6 address' % s)
+
+
+@lru_cache(maxsize=10000)
+def cached_address(s):
+    """
+    Returns an :class:`IPv4Address`, :class:`IPv6Address`, :class:`IPv4Port`,
+    or :class:`IPv6Port` instance for the given string, caching the result.
+
+    This is equivalent to :func:`address`, but the results for the 10000 most
+    recently used strings are cached. Statistics on the effectiveness of the
+    cache can be obtained by calling ``cached_address.cache_info()``. Note
+    that the objects returned are shared, so the result (including the
+    :attr:`~IPv4Port.port` of a port result) must not be modified.
+
+    :param str s: The string containing the IP address to parse
+    :returns: An :class:`IPv4Address`, :class:`IPv4Port`, :class:`IPv6Address`,
+              or :class:`IPv6Port` instance
+    """
+    return address(s)
+
+
+register(
+    'datatypes.address', cached_address.cache_stats,
+    cached_address.cache_reset_stats)
 
 
 @total_ordering
@@ -298,7 +407,7 @@ class IPv4Address(ipaddress.IPv4Address):
         repeated lookups are extremely quick. Returns a :class:`Hostname`
         object if the lookup is successful, or None.
         """
-        s = self.compressed
+        s = dns._address_str(self)  # pylint: disable=protected-access
         result = dns.from_address(s)
         if result == s:
             return None
@@ -458,7 +567,7 @@ class IPv6Address(ipaddress.IPv6Address):
         repeated lookups are extremely quick. Returns a :class:`Hostname`
         object if the lookup is successful, or None.
         """
-        s = self.compressed
+        s = dns._address_str(self)  # pylint: disable=protected-access
         result = dns.from_address(s)
         if result == s:
             return None
@@ -581,6 +690,38 @@ class IPv4Network(ipaddress.IPv4Network):
     pass
 
 
+def _split_ipv4_port(address):
+    # Splits "addr:port" into the address string and the port number (or None
+    # if there is no port)
+    # pylint: disable=redefined-outer-name
+    port = None
+    if ':' in address:
+        address, port = address.rsplit(':', 1)
+        port = int(port)
+        if not 0 <= port <= 65535:
+            raise ValueError('Invalid port %d' % port)
+    return address, port
+
+
+def _split_ipv6_port(address):
+    # Splits "[addr]:port", "[addr]", or "addr" into the address string and
+    # the port number (or None if there is no port)
+    # pylint: disable=redefined-outer-name,unused-variable
+    addr, sep, port = address.rpartition(':')
+    if port.endswith(']'):  # [IPv6addr]
+        addr = '%s:%s' % (addr[1:], port[:-1])
+        port = None
+    elif addr.endswith(']'):  # [IPv6addr]:port
+        addr = addr[1:-1]
+        port = int(port)
+        if not 0 <= port <= 65535:
+            raise ValueError('Invalid port %d' % port)
+    else:  # IPv6addr
+        addr = '%s:%s' % (addr, port)
+        port = None
+    return addr, port
+
+
 class IPv4Port(IPv4Address):
     # pylint: disable=too-many-ancestors
     """
@@ -597,15 +738,15 @@ class IPv4Port(IPv4Address):
 
     def __init__(self, address):
         # pylint: disable=redefined-outer-name
-        port = None
-        if ':' in address:
-            address, port = address.rsplit(':', 1)
-            port = int(port)
-            if not 0 <= port <= 65535:
-                raise ValueError('Invalid port %d' % port)
+        address, port = _split_ipv4_port(address)
         super(IPv4Port, self).__init__(address)
         self.port = port
 
+    def __reduce__(self):
+        # The base class pickles the address as an integer which would lose
+        # the port (and which our initializer doesn't accept)
+        return (self.__class__, (str(self),))
+
     def __str__(self):
         result = super(IPv4Port, self).__str__()
         if self.port is not None:
@@ -630,22 +771,15 @@ class IPv6Port(IPv6Address):
     """
 
     def __init__(self, address):
-        # pylint: disable=redefined-outer-name,unused-variable
-        addr, sep, port = address.rpartition(':')
-        if port.endswith(']'):  # [IPv6addr]
-            addr = '%s:%s' % (addr[1:], port[:-1])
-            port = None
-        elif addr.endswith(']'):  # [IPv6addr]:port
-            addr = addr[1:-1]
-            port = int(port)
-            if not 0 <= port <= 65535:
-                raise ValueError('Invalid port %d' % port)
-        else:  # IPv6addr
-            addr = '%s:%s' % (addr, port)
-            port = None
-        super(IPv6Port, self).__init__(addr)
+        # pylint: disable=redefined-outer-name
+        address, port = _split_ipv6_port(address)
+        super(IPv6Port, self).__init__(address)
         self.port = port
 
+    def __reduce__(self):
+        # See IPv4Port.__reduce__
+        return (self.__class__, (str(self),))
+
     def __str__(self):
         result = super(IPv6Port, self).__str__()
         if self.port is not None:
@@ -653,6 +787,189 @@ class IPv6Port(IPv6Address):
         return result
 
 
+def _packed_accessors(cls):
+    # Returns functions which get and set the slot that *cls* uses to store
+    # the address, bypassing the _ip property defined by _CompactPort. The
+    # ipaddr backport doesn't use slots, in which case the instance dict is
+    # used instead
+    try:
+        slot = cls.__dict__['_ip']
+    except KeyError:
+        def get_packed(obj):
+            try:
+                return obj.__dict__['_ip']
+            except KeyError:
+                raise AttributeError('_ip')
+
+        def set_packed(obj, value):
+            obj.__dict__['_ip'] = value
+
+        return get_packed, set_packed
+    return slot.__get__, slot.__set__
+
+
+class CompactIPv4Address(ipaddress.IPv4Address):
+    # pylint: disable=too-many-ancestors
+    """
+    Represents an IPv4 address compactly.
+
+    This type is returned by the :func:`compact_address` and
+    :func:`compact_hostname` functions and provides the same attributes as
+    :class:`IPv4Address`. However, instances have no instance dictionary (so
+    arbitrary attributes cannot be assigned to them), which makes them
+    smaller; this is useful when large numbers of rows are retained in
+    memory. Note that this is a sub-class of :class:`ipaddress.IPv4Address`,
+    but not of :class:`IPv4Address`.
+    """
+    __slots__ = ()
+
+    # Sub-classing IPv4Address would give instances a __dict__, so share its
+    # attributes instead
+    country = IPv4Address.country
+    region = IPv4Address.region
+    city = IPv4Address.city
+    coords = IPv4Address.coords
+    isp = IPv4Address.isp
+    org = IPv4Address.org
+    hostname = IPv4Address.hostname
+
+
+class CompactIPv6Address(ipaddress.IPv6Address):
+    # pylint: disable=too-many-ancestors
+    """
+    Represents an IPv6 address compactly.
+
+    This type is returned by the :func:`compact_address` and
+    :func:`compact_hostname` functions and provides the same attributes as
+    :class:`IPv6Address`, but (like :class:`CompactIPv4Address`) instances
+    have no instance dictionary. Note that this is a sub-class of
+    :class:`ipaddress.IPv6Address`, but not of :class:`IPv6Address`.
+    """
+    __slots__ = ()
+
+    # See CompactIPv4Address
+    country = IPv6Address.country
+    region = IPv6Address.region
+    city = IPv6Address.city
+    coords = IPv6Address.coords
+    isp = IPv6Address.isp
+    org = IPv6Address.org
+    hostname = IPv6Address.hostname
+
+
+class _CompactPort(object):
+    # Stores the port number in the same slot as the address; the low 17 bits
+    # of the packed value hold the port number plus one (or zero when there
+    # is no port), and the remaining bits hold the address. Sub-classes must
+    # define _get_packed and _set_packed with _packed_accessors
+    __slots__ = ()
+
+    @property
+    def _ip(self):
+        return self._get_packed(self) >> 17
+
+    @_ip.setter
+    def _ip(self, value):
+        try:
+            port = self._get_packed(self) & 0x1ffff
+        except AttributeError:
+            port = 0
+        self._set_packed(self, (value << 17) | port)
+
+    @property
+    def port(self):
+        # pylint: disable=missing-docstring
+        port = self._get_packed(self) & 0x1ffff
+        if port:
+            return port - 1
+        return None
+
+    @port.setter
+    def port(self, value):
+        if value is None:
+            port = 0
+        elif 0 <= value <= 65535:
+            port = value + 1
+        else:
+            raise ValueError('Invalid port %d' % value)
+        self._set_packed(self, (self._get_packed(self) & ~0x1ffff) | port)
+
+    def __reduce__(self):
+        # See IPv4Port.__reduce__
+        return (self.__class__, (str(self),))
+
+
+class CompactIPv4Port(_CompactPort, CompactIPv4Address):
+    # pylint: disable=too-many-ancestors
+    """
+    Represents an IPv4 address and port number compactly.
+
+    This type is returned by the :func:`compact_address` and
+    :func:`compact_hostname` functions and is equivalent to
+    :class:`IPv4Port`, except that the address and port number are packed
+    into a single integer, and (like :class:`CompactIPv4Address`) instances
+    have no instance dictionary.
+
+    .. attribute:: port
+
+       An integer representing the network port for a connection
+    """
+    __slots__ = ()
+    _get_packed, _set_packed = (
+        staticmethod(f) for f in _packed_accessors(ipaddress.IPv4Address))
+
+    def __init__(self, address):
+        # pylint: disable=redefined-outer-name
+        address, port = _split_ipv4_port(address)
+        super(CompactIPv4Port, self).__init__(address)
+        self.port = port
+
+    def __str__(self):
+        result = super(CompactIPv4Port, self).__str__()
+        if self.port is not None:
+            return '%s:%d' % (result, self.port)
+        return result
+
+
+class CompactIPv6Port(_CompactPort, CompactIPv6Address):
+    # pylint: disable=too-many-ancestors
+    """
+    Represents an IPv6 address and port number compactly.
+
+    This type is returned by the :func:`compact_address` function and is
+    equivalent to :class:`IPv6Port`, except that the address and port number
+    are packed into a single integer, and (like :class:`CompactIPv6Address`)
+    instances have no instance dictionary.
+
+    .. attribute:: port
+
+       An integer representing the network port for a connection
+    """
+    __slots__ = ()
+    _get_packed, _set_packed = (
+        staticmethod(f) for f in _packed_accessors(ipaddress.IPv6Address))
+
+    def __init__(self, address):
+        # pylint: disable=redefined-outer-name
+        address, port = _split_ipv6_port(address)
+        super(CompactIPv6Port, self).__init__(address)
+        self.port = port
+
+    def __str__(self):
+        result = super(CompactIPv6Port, self).__str__()
+        if self.port is not None:
+            return '[%s]:%d' % (result, self.port)
+        return result
+
+
+# The types constructed by address and hostname, and by their compact
+# variants: an IPv4 address, an IPv4 address with a port, an IPv6 address,
+# and an IPv6 address with a port
+_TYPES = (IPv4Address, IPv4Port, IPv6Address, IPv6Port)
+_COMPACT_TYPES = (
+    CompactIPv4Address, CompactIPv4Port, CompactIPv6Address, CompactIPv6Port)
+
+
 class IPv6Network(ipaddress.IPv6Network):
     # pylint: disable=too-many-ancestors
     """
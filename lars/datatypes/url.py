@@ -40,6 +40,8 @@ except ImportError:
     import urlparse as parse
 
 from .ipaddress import hostname
+from ..cache import lru_cache
+from ..stats import register
 
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
 
@@ -73,6 +75,28 @@ def url(s):
     return Url(*parse.urlparse(s))
 
 
+@lru_cache(maxsize=10000)
+def cached_url(s):
+    """
+    Returns a :class:`Url` object for the given string, caching the result.
+
+    This is equivalent to :func:`url`, but the results for the 10000 most
+    recently used strings are cached (:class:`Url` tuples are immutable so
+    they can be safely shared). As in most logs a relatively small number of
+    URLs make up the majority of requests this is usually considerably faster
+    than :func:`url`. Statistics on the effectiveness of the cache can be
+    obtained by calling ``cached_url.cache_info()``, and the cache can be
+    emptied with ``cached_url.cache_clear()``.
+
+    :param str s: The string containing the URL to parse
+    :returns: A :class:`Url` tuple representing the URL
+    """
+    return url(s)
+
+
+register('datatypes.url', cached_url.cache_stats, cached_url.cache_reset_stats)
+
+
 def request(s):
     """
     Returns a :class:`Request` object for the given string.
@@ -0,0 +1,400 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+This module provides a couple of trivial DNS resolution functions, enhanced
+with LRU caches. Most users should never need to access these functions
+directly.  Instead, use the :attr:`~lars.datatypes.Hostname.address` and
+:attr:`~lars.datatypes.IPv4Address.hostname` properties of relevant objects.
+
+Reverse resolution of large numbers of addresses one at a time is extremely
+slow as each lookup blocks until the DNS server responds. The
+:func:`resolve_many` function resolves many addresses concurrently with a pool
+of threads, while :func:`prefetch` wraps a stream of rows, resolving the
+addresses in rows ahead of the consumer so that by the time a row is read, the
+:attr:`~lars.datatypes.IPv4Address.hostname` of its addresses is already
+cached.
+
+The caches of :func:`from_address` and :func:`to_address` are shared with the
+coroutines of the same name in :mod:`lars.dns.aio`, which perform lookups
+with :mod:`asyncio` (that module requires Python 3.5 or later, and cannot be
+imported on earlier versions). When lookups are performed by many threads, the
+:func:`init_caches` function can be used to replace the caches with sharded
+caches, which reduce contention between threads.
+
+By default, results (including negative results, where an address has no
+hostname or a hostname has no address) are cached until they are evicted to
+make room for others. Long-running processes should use :func:`init_caches`
+to give results a time-to-live, after which they are looked up again.
+Negative results can be given a separate (typically shorter) time-to-live.
+Batch jobs which repeatedly resolve the same addresses can also use
+:func:`init_caches` to store results in a file, so that each run starts with
+the results of prior runs.
+
+
+Examples
+========
+
+To write the hostnames of the clients in an Apache log to a CSV file::
+
+    import io
+    from lars import apache, csv, dns
+
+    with io.open('/var/log/apache2/access.log', 'r') as infile:
+        with io.open('hosts.csv', 'wb') as outfile:
+            with apache.ApacheSource(
+                    infile, '%a %l %u %t "%r" %>s %b') as source:
+                with csv.CSVTarget(outfile) as target:
+                    for row in dns.prefetch(source, ['remote_ip']):
+                        target.write((row.remote_ip.hostname,))
+
+
+Functions
+=========
+
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import socket
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+try:
+    import ipaddress
+except ImportError:
+    import ipaddr as ipaddress
+
+from lars.cache import (
+    LRUCache,
+    ShardedLRUCache,
+    TTLCache,
+    PersistentCache,
+    cached,
+    )
+from lars.stats import register
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+# The caches of from_address and to_address; these are shared with the
+# coroutines in lars.dns.aio so the keys must be constructed identically
+FROM_ADDRESS_CACHE = LRUCache(maxsize=10000)
+TO_ADDRESS_CACHE = LRUCache(maxsize=10000)
+
+
+def init_caches(
+        maxsize=10000, shards=None, clock=False, ttl=None, negative_ttl=None,
+        filename=None):
+    """
+    Replaces the caches used by :func:`from_address` and :func:`to_address`
+    (and the coroutines in :mod:`lars.dns.aio`), discarding all cached
+    results.
+
+    Each cache holds at most *maxsize* results. By default, each is a
+    :class:`~lars.cache.LRUCache` which is protected by a single lock. If
+    *shards* is specified, each is a :class:`~lars.cache.ShardedLRUCache`
+    with the specified number of shards, using CLOCK eviction if *clock* is
+    True.
+
+    If *ttl* is specified, results expire after *ttl* seconds, and negative
+    results (an address which could not be reverse resolved, or a hostname
+    which could not be resolved) after *negative_ttl* seconds (which defaults
+    to *ttl*). In this case each cache (or each shard) is a
+    :class:`~lars.cache.TTLCache` and *clock* is ignored.
+
+    If *filename* is specified, results are also stored in the SQLite
+    database *filename* (which is created if it does not exist) by a
+    :class:`~lars.cache.PersistentCache`, which is read when a result is not
+    found in the in-memory cache described above. Results in the database
+    expire according to *ttl* and *negative_ttl* as above.
+
+    :param int maxsize: The maximum number of results in each cache
+    :param int shards: The number of segments to divide each cache into
+    :param bool clock: If True, use CLOCK eviction in sharded caches
+    :param float ttl: The number of seconds before results expire
+    :param float negative_ttl: The number of seconds before negative results
+                               expire
+    :param str filename: The filename of a database to store results in
+    """
+    # pylint: disable=global-statement
+    global FROM_ADDRESS_CACHE, TO_ADDRESS_CACHE
+    if ttl is None and negative_ttl is not None:
+        raise ValueError('negative_ttl cannot be specified without ttl')
+    for old_cache in (FROM_ADDRESS_CACHE, TO_ADDRESS_CACHE):
+        if isinstance(old_cache, PersistentCache):
+            old_cache.close()
+    if ttl is None:
+        if shards is None:
+            FROM_ADDRESS_CACHE = LRUCache(maxsize)
+            TO_ADDRESS_CACHE = LRUCache(maxsize)
+        else:
+            FROM_ADDRESS_CACHE = ShardedLRUCache(maxsize, shards, clock)
+            TO_ADDRESS_CACHE = ShardedLRUCache(maxsize, shards, clock)
+    else:
+        def from_factory(size):
+            return TTLCache(size, ttl, negative_ttl, _from_address_negative)
+
+        def to_factory(size):
+            return TTLCache(size, ttl, negative_ttl, _to_address_negative)
+        if shards is None:
+            FROM_ADDRESS_CACHE = from_factory(maxsize)
+            TO_ADDRESS_CACHE = to_factory(maxsize)
+        else:
+            FROM_ADDRESS_CACHE = ShardedLRUCache(
+                maxsize, shards, shard_factory=from_factory)
+            TO_ADDRESS_CACHE = ShardedLRUCache(
+                maxsize, shards, shard_factory=to_factory)
+    if filename is not None:
+        FROM_ADDRESS_CACHE = PersistentCache(
+            filename, 'from_address', front=FROM_ADDRESS_CACHE, ttl=ttl,
+            negative_ttl=negative_ttl, negative=_from_address_negative)
+        TO_ADDRESS_CACHE = PersistentCache(
+            filename, 'to_address', front=TO_ADDRESS_CACHE, ttl=ttl,
+            negative_ttl=negative_ttl, negative=_to_address_negative)
+    from_address.cache = FROM_ADDRESS_CACHE
+    to_address.cache = TO_ADDRESS_CACHE
+
+
+def _from_address_negative(address, hostname):
+    # getnameinfo returns the address itself when it has no hostname
+    return hostname == address
+
+
+def _to_address_negative(key, address):
+    return address is None
+
+
+def _to_address_key(
+        hostname, family=socket.AF_UNSPEC, socktype=socket.SOCK_STREAM):
+    # The family and socktype are converted from enums so the key is stored
+    # identically in persistent caches
+    return (hostname, int(family), int(socktype))
+
+
+def _sockaddr(address):
+    # Returns the socket address passed to getnameinfo for the address string
+    if ':' in address:
+        # XXX Need to consider what (if anything) we should be doing with the
+        # scope-id field here
+        return (address, 0, 0, 0)
+    return (address, 0)
+
+
+def _first_address(infos):
+    # Returns the first IPv4 address from a getaddrinfo result, or the first
+    # IPv6 address if there are no IPv4 addresses
+    result = None
+    for (family, _, _, _, sockaddr) in infos:
+        if family == socket.AF_INET:
+            return sockaddr[0]
+        elif family == socket.AF_INET6 and not result:
+            result = sockaddr[0]
+    return result
+
+
+@cached(FROM_ADDRESS_CACHE, key=lambda address: address)
+def from_address(address):
+    """
+    Reverse resolve an address to a hostname.
+
+    Given a string containing an IPv4 or IPv6 address, this functions returns
+    a hostname associated with the address, using an LRU cache to speed up
+    repeat queries. If the address does not reverse, the function returns
+    the original address.
+
+    :param str address: The address to resolve to a hostname
+    :returns: The resolved hostname
+    """
+    return socket.getnameinfo(_sockaddr(address), 0)[0]
+
+
+@cached(TO_ADDRESS_CACHE, key=_to_address_key)
+def to_address(hostname, family=socket.AF_UNSPEC, socktype=socket.SOCK_STREAM):
+    """
+    Resolve a hostname to an address, preferring IPv4 addresses.
+
+    Given a string containing a DNS hostname, this function resolves the
+    hostname to an address, using an LRU cache to speed up repeat queries. The
+    function prefers IPv4 addresses, but will return IPv6 addresses if no IPv4
+    addresses are present in the result from getaddrinfo. If the hostname does
+    not resolve, the function returns None rather than raise an exception (this
+    is preferable as it provides a negative lookup cache).
+
+    :param str hostname: The hostname to resolve to an address
+    :returns: The resolved address
+    """
+    try:
+        return _first_address(
+            socket.getaddrinfo(hostname, None, family, socktype))
+    # XXX Workaround LP #1154599
+    # This should be socket.gaierror instead of socket.error
+    except socket.error:
+        return None
+
+
+register(
+    'dns.from_address', from_address.cache_stats,
+    from_address.cache_reset_stats)
+register(
+    'dns.to_address', to_address.cache_stats, to_address.cache_reset_stats)
+
+
+def _address_str(address):
+    # Returns the string form of an address object (without any port) as
+    # passed to from_address by the hostname attribute, or None if address
+    # is not an address object
+    # pylint: disable=protected-access
+    if isinstance(address, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        if getattr(address, 'port', None) is not None:
+            # The string form of the port types (including compressed)
+            # includes the port
+            return address._string_from_ip_int(address._ip)
+        return address.compressed
+    return None
+
+
+def resolve_many(addresses, workers=10, timeout=None):
+    """
+    Reverse resolve many addresses to hostnames concurrently.
+
+    Given a sequence of addresses (as strings or as address objects like
+    :class:`~lars.datatypes.IPv4Address`), this function resolves each unique
+    address with :func:`from_address` in a pool of *workers* threads. It
+    returns a dictionary mapping each address string to its hostname (or the
+    original address if it does not reverse), and the results are cached in
+    the same manner as :func:`from_address`. None values in *addresses* are
+    ignored.
+
+    If *timeout* is specified, the function returns after at most *timeout*
+    seconds, omitting any addresses which have not been resolved in that time
+    (their lookups continue in the background, and will be cached when they
+    complete). Addresses that cannot be resolved due to an error are also
+    omitted.
+
+    :param addresses: The addresses to resolve to hostnames
+    :param int workers: The number of lookups to perform concurrently
+    :param float timeout: The maximum number of seconds to wait for lookups
+    :returns: A dictionary mapping addresses to hostnames
+    """
+    if workers < 1:
+        raise ValueError('workers must be 1 or more')
+    addresses = OrderedDict.fromkeys(
+        a if isinstance(a, str) else _address_str(a)
+        for a in addresses if a is not None)
+    addresses.pop(None, None)
+    executor = ThreadPoolExecutor(workers)
+    try:
+        futures = {
+            executor.submit(from_address, address): address
+            for address in addresses
+            }
+        done, _ = wait(futures, timeout)
+    finally:
+        executor.shutdown(wait=False)
+    return {
+        futures[future]: future.result()
+        for future in done
+        if future.exception() is None
+        }
+
+
+def prefetch(rows, fields=None, workers=10, lookahead=1000, timeout=None):
+    """
+    Wraps the iterable *rows*, reverse resolving the addresses in rows before
+    they are yielded.
+
+    The function reads up to *lookahead* rows ahead of the caller and submits
+    the addresses found in them to a pool of *workers* threads for resolution
+    with :func:`from_address`. Each row is only yielded once the lookups of
+    its addresses have finished, so reading the
+    :attr:`~lars.datatypes.IPv4Address.hostname` attribute of its addresses
+    will return the cached result immediately. If *timeout* is specified, a
+    row is yielded after waiting at most *timeout* seconds for its lookups
+    (which continue in the background).
+
+    If *fields* is specified, only the values of the named fields are
+    resolved; otherwise all address objects in each row are resolved. Rows
+    are yielded unchanged and in their original order.
+
+    :param rows: An iterable of rows, e.g. a source
+    :param fields: An optional sequence of the names of fields to resolve
+    :param int workers: The number of lookups to perform concurrently
+    :param int lookahead: The maximum number of rows to read ahead
+    :param float timeout: The maximum number of seconds to wait for each row
+    """
+    if workers < 1:
+        raise ValueError('workers must be 1 or more')
+    if lookahead < 1:
+        raise ValueError('lookahead must be 1 or more')
+    # pending maps addresses to the future of their lookup; addresses which
+    # are already in the cache of from_address aren't looked up again
+    pending = {}
+    buffered = deque()
+    executor = ThreadPoolExecutor(workers)
+
+    def submit(row):
+        # pylint: disable=missing-docstring
+        if fields is None:
+            values = row
+        else:
+            values = (getattr(row, name) for name in fields)
+        lookups = []
+        for value in values:
+            address = _address_str(value)
+            if address is not None:
+                if address in from_address.cache:
+                    pending.pop(address, None)
+                    continue
+                try:
+                    future = pending[address]
+                except KeyError:
+                    future = pending[address] = executor.submit(
+                        from_address, address)
+                lookups.append((address, future))
+        buffered.append((row, lookups))
+
+    def finish():
+        # pylint: disable=missing-docstring
+        row, lookups = buffered.popleft()
+        if lookups:
+            done, _ = wait([future for (_, future) in lookups], timeout)
+            for address, future in lookups:
+                if future in done:
+                    pending.pop(address, None)
+        return row
+
+    try:
+        for row in rows:
+            submit(row)
+            if len(buffered) > lookahead:
+                yield finish()
+        while buffered:
+            yield finish()
+    finally:
+        executor.shutdown(wait=False)
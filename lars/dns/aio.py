@@ -0,0 +1,285 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+This module provides :mod:`asyncio` equivalents of the DNS resolution
+functions in :mod:`lars.dns`, for use when lars is embedded in an asyncio
+application. It requires Python 3.5 or later.
+
+The :func:`from_address` and :func:`to_address` coroutines perform lookups
+with the event loop's :meth:`~asyncio.AbstractEventLoop.getnameinfo` and
+:meth:`~asyncio.AbstractEventLoop.getaddrinfo` methods, and share their
+caches with the functions of the same name in :mod:`lars.dns` (so a lookup
+performed by one is never repeated by the other, and the
+:attr:`~lars.datatypes.IPv4Address.hostname` attribute of an address returns
+the result of a prior asynchronous lookup immediately). The results,
+including negative results, are identical to those of the synchronous
+functions. When :func:`~lars.dns.init_caches` has been called with a
+*filename*, the persistent caches are accessed in the event loop's default
+executor so that their disk I/O does not block the loop.
+
+The number of lookups outstanding at once is limited by a :class:`Resolver`.
+The module level coroutines use a default resolver which permits
+:data:`DEFAULT_LIMIT` concurrent lookups; construct your own
+:class:`Resolver` to use a different limit.
+
+
+Classes
+=======
+
+.. autoclass:: Resolver
+    :members:
+
+
+Functions
+=========
+
+.. autofunction:: from_address
+
+.. autofunction:: to_address
+
+.. autofunction:: resolve_many
+
+
+Examples
+========
+
+To resolve the addresses of rows as they are ingested::
+
+    from lars.dns import aio
+
+    async def ingest(rows):
+        for row in rows:
+            hostname = await aio.from_address(row.remote_ip.compressed)
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import socket
+import asyncio
+import weakref
+
+from lars import dns
+from lars.cache import PersistentCache
+from lars.stats import timer
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+# The number of concurrent lookups permitted by the default resolver
+DEFAULT_LIMIT = 10
+
+# A sentinel distinguishing cache misses from cached None values
+_MISSING = object()
+
+# get_event_loop is deprecated within coroutines, but get_running_loop is
+# only available from Python 3.7
+try:
+    _running_loop = asyncio.get_running_loop
+except AttributeError:
+    _running_loop = asyncio.get_event_loop
+
+
+def _add_miss_time(cache, start):
+    # Adds the time since *start* to the miss_time counter of *cache* (if it
+    # has one), as the cached decorator does for the synchronous functions
+    counters = getattr(cache, 'counters', None)
+    if counters is not None:
+        counters.miss_time += timer() - start
+
+
+async def _cache_call(cache, method, *args):
+    # Calls the get or put *method* of *cache*. A PersistentCache (installed
+    # by init_caches with a filename) queries SQLite, which would block the
+    # event loop, so it is called in the loop's default executor instead
+    method = getattr(cache, method)
+    if isinstance(cache, PersistentCache):
+        return await _running_loop().run_in_executor(None, method, *args)
+    return method(*args)
+
+
+class Resolver(object):
+    """
+    Performs DNS lookups with at most *limit* outstanding at once.
+
+    Each resolver maintains a separate limit for each event loop it is used
+    with. All resolvers share the caches of :mod:`lars.dns`. Concurrent
+    requests for the same uncached lookup (within a resolver and event loop)
+    share a single query.
+
+    :param int limit: The maximum number of concurrent lookups
+    """
+
+    def __init__(self, limit=DEFAULT_LIMIT):
+        if limit < 1:
+            raise ValueError('limit must be 1 or more')
+        self.limit = limit
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._pending = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = _running_loop()
+        try:
+            return self._semaphores[loop]
+        except KeyError:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+            return semaphore
+
+    async def _lookup(self, cache, key, query):
+        # Returns the value of *key* in *cache*, or awaits the coroutine
+        # function *query* to obtain it (and stores it in *cache*). Queries
+        # for a key already being looked up wait for the same task
+        result = await _cache_call(cache, 'get', key, _MISSING)
+        if result is _MISSING:
+            loop = _running_loop()
+            pending = self._pending.setdefault(loop, {})
+            try:
+                task = pending[(cache, key)]
+            except KeyError:
+                task = pending[(cache, key)] = loop.create_task(
+                    self._query(cache, key, query))
+                task.add_done_callback(
+                    lambda _: pending.pop((cache, key), None))
+            # Shield the shared task so that cancelling one waiter doesn't
+            # cancel the lookup for the others
+            result = await asyncio.shield(task)
+        return result
+
+    async def _query(self, cache, key, query):
+        # pylint: disable=missing-docstring
+        start = timer()
+        async with self._semaphore():
+            result = await query()
+        _add_miss_time(cache, start)
+        await _cache_call(cache, 'put', key, result)
+        return result
+
+    async def from_address(self, address):
+        """
+        Reverse resolve an address to a hostname. This is the asynchronous
+        equivalent of :func:`lars.dns.from_address`.
+
+        :param str address: The address to resolve to a hostname
+        :returns: The resolved hostname
+        """
+        # pylint: disable=protected-access
+        async def query():
+            # pylint: disable=missing-docstring
+            return (await _running_loop().getnameinfo(
+                dns._sockaddr(address), 0))[0]
+
+        return await self._lookup(dns.FROM_ADDRESS_CACHE, address, query)
+
+    async def to_address(
+            self, hostname, family=socket.AF_UNSPEC,
+            socktype=socket.SOCK_STREAM):
+        """
+        Resolve a hostname to an address, preferring IPv4 addresses. This is
+        the asynchronous equivalent of :func:`lars.dns.to_address`.
+
+        :param str hostname: The hostname to resolve to an address
+        :returns: The resolved address, or None
+        """
+        # pylint: disable=protected-access
+        async def query():
+            # pylint: disable=missing-docstring
+            try:
+                return dns._first_address(
+                    await _running_loop().getaddrinfo(
+                        hostname, None, family=family, type=socktype))
+            except socket.error:
+                return None
+
+        return await self._lookup(
+            dns.TO_ADDRESS_CACHE,
+            dns._to_address_key(hostname, family, socktype), query)
+
+    async def resolve_many(self, addresses):
+        """
+        Reverse resolve many addresses to hostnames concurrently. This is the
+        asynchronous equivalent of :func:`lars.dns.resolve_many` (without the
+        *timeout*; use :func:`asyncio.wait_for` instead).
+
+        :param addresses: The addresses to resolve to hostnames
+        :returns: A dictionary mapping addresses to hostnames
+        """
+        # pylint: disable=protected-access
+        # Non-address objects are converted to None, so the filter must
+        # follow the conversion
+        addresses = list(dict.fromkeys(
+            address
+            for address in (
+                a if isinstance(a, str) else dns._address_str(a)
+                for a in addresses)
+            if address is not None))
+        results = await asyncio.gather(
+            *(self.from_address(address) for address in addresses),
+            return_exceptions=True)
+        return {
+            address: result
+            for (address, result) in zip(addresses, results)
+            if not isinstance(result, Exception)
+            }
+
+
+_DEFAULT_RESOLVER = Resolver()
+
+
+async def from_address(address):
+    """
+    Reverse resolve an address to a hostname with the default
+    :class:`Resolver`. See :meth:`Resolver.from_address`.
+
+    :param str address: The address to resolve to a hostname
+    :returns: The resolved hostname
+    """
+    return await _DEFAULT_RESOLVER.from_address(address)
+
+
+async def to_address(
+        hostname, family=socket.AF_UNSPEC, socktype=socket.SOCK_STREAM):
+    """
+    Resolve a hostname to an address with the default :class:`Resolver`. See
+    :meth:`Resolver.to_address`.
+
+    :param str hostname: The hostname to resolve to an address
+    :returns: The resolved address, or None
+    """
+    return await _DEFAULT_RESOLVER.to_address(hostname, family, socktype)
+
+
+async def resolve_many(addresses):
+    """
+    Reverse resolve many addresses concurrently with the default
+    :class:`Resolver`. See :meth:`Resolver.resolve_many`.
+
+    :param addresses: The addresses to resolve to hostnames
+    :returns: A dictionary mapping addresses to hostnames
+    """
+    return await _DEFAULT_RESOLVER.resolve_many(addresses)
@@ -34,12 +34,23 @@ be ignored; instead, users should use the
 :class:`~lars.datatypes.IPv4Address` and
 :class:`~lars.datatypes.IPv6Address` classes.
 
+When geo-tagging large numbers of IPv4 addresses, call :func:`build_index`
+after :func:`init_databases`. This loads the ranges of the IPv4 geographical
+database into sorted `NumPy`_ arrays which are then used by the attributes
+above (caching the result for each range), and by :func:`lookup_many` which
+resolves an entire batch of addresses at once. NumPy is an optional
+dependency of lars; it must be installed to build an index.
+
 
 Functions
 =========
 
 .. autofunction:: init_databases
 
+.. autofunction:: build_index
+
+.. autofunction:: lookup_many
+
 .. autofunction:: country_code_by_addr
 
 .. autofunction:: city_by_addr
@@ -53,9 +64,33 @@ Functions
 .. autofunction:: org_by_addr
 
 
+Classes
+=======
+
+.. autoclass:: GeoIPIndex
+   :members:
+
+
 Examples
 ========
 
+To count the requests from each country in an Apache log (which records the
+remote address rather than the remote hostname)::
+
+    import io
+    from collections import Counter
+    from lars import apache, geoip
+
+    geoip.init_databases('/usr/share/GeoIP/GeoIP.dat')
+    geoip.build_index()
+    with io.open('/var/log/apache2/access.log', 'r') as infile:
+        with apache.ApacheSource(
+                infile, '%a %l %u %t "%r" %>s %b',
+                fields=['remote_ip']) as source:
+            columns = source.to_columns()
+    counts = Counter(geoip.lookup_many(columns['remote_ip']))
+
+.. _NumPy: http://www.numpy.org/
 """
 
 from __future__ import (
@@ -65,13 +100,23 @@ from __future__ import (
     division,
     )
 
+import os
 from collections import namedtuple
 try:
     import ipaddress
 except ImportError:
     import ipaddr as ipaddress
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 import pygeoip
+from pygeoip import const
+
+from .cache import PersistentCache
+from .dns import _address_str
+from .stats import Counters, register, timer
 
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
 
@@ -83,6 +128,16 @@ _GEOIP_IPV4_ORG = None
 _GEOIP_IPV6_GEO = None
 _GEOIP_IPV6_ISP = None
 _GEOIP_IPV6_ORG = None
+_GEOIP_IPV4_INDEX = None
+_GEOIP_CACHE = {}
+_GEOIP_CACHE_SIZE = 10000
+_GEOIP_CACHE_COUNTERS = Counters()
+_GEOIP_STORE = None
+_GEOIP_FILENAMES = {}
+_GEOIP_STORE_KEYS = {}
+
+# A sentinel distinguishing persistent cache misses from cached None values
+_MISSING = object()
 
 
 GeoCoord = namedtuple('GeoCoord', ('longitude', 'latitude'))
@@ -91,7 +146,7 @@ GeoCoord = namedtuple('GeoCoord', ('longitude', 'latitude'))
 def init_databases(
         v4_geo_filename=None, v4_isp_filename=None, v4_org_filename=None,
         v6_geo_filename=None, v6_isp_filename=None, v6_org_filename=None,
-        memcache=True):
+        memcache=True, cache_size=10000, cache_filename=None):
     # pylint: disable=too-many-arguments,global-statement
     """
     Initializes the global GeoIP database instances in a thread-safe manner.
@@ -117,6 +172,23 @@ def init_databases(
     sufficient RAM for this), but this behaviour can be overridden with the
     *memcache* parameter.
 
+    The results of database queries for the most recently used *cache_size*
+    addresses are cached, and shared by all the GeoIP-related attributes of
+    the address classes (e.g. reading both the
+    :attr:`~lars.datatypes.IPv4Address.city` and
+    :attr:`~lars.datatypes.IPv4Address.coords` attributes of an address only
+    queries a city database once). The cache is emptied whenever this function is called; set
+    *cache_size* to 0 to disable it.
+
+    If *cache_filename* is specified, query results are also stored in the
+    SQLite database *cache_filename* (which is created if it does not exist)
+    by a :class:`~lars.cache.PersistentCache`, which is read before querying
+    a GeoIP database. This permits batch jobs which repeatedly look up the
+    same addresses to begin with the results of prior runs. Results are
+    stored against the filename, size, and modification time of the GeoIP
+    database they came from, so results from a replaced database are never
+    used.
+
     .. warning::
 
         At the time of writing, the free GeoLite IPv6 city-level database does
@@ -144,10 +216,17 @@ def init_databases(
 
     :param bool memcache:
         Set to False if you don't wish to cache the db in RAM (optional)
+
+    :param int cache_size:
+        The maximum number of query results to cache (optional)
+
+    :param str cache_filename:
+        The filename of a database to store query results in (optional)
     """
     global \
         _GEOIP_IPV4_GEO, _GEOIP_IPV4_ISP, _GEOIP_IPV4_ORG, \
-        _GEOIP_IPV6_GEO, _GEOIP_IPV6_ISP, _GEOIP_IPV6_ORG
+        _GEOIP_IPV6_GEO, _GEOIP_IPV6_ISP, _GEOIP_IPV6_ORG, \
+        _GEOIP_IPV4_INDEX, _GEOIP_CACHE_SIZE, _GEOIP_STORE
     if not (
             v4_geo_filename or
             v4_isp_filename or
@@ -156,24 +235,132 @@ def init_databases(
             v6_isp_filename or
             v6_org_filename):
         raise ValueError('You must call init_database with a database to load')
+    if cache_size < 0:
+        raise ValueError('cache_size must be 0 or more')
+    _GEOIP_CACHE.clear()
+    _GEOIP_CACHE_SIZE = cache_size
+    if _GEOIP_STORE is not None:
+        _GEOIP_STORE.close()
+    if cache_filename:
+        _GEOIP_STORE = PersistentCache(cache_filename, 'geoip')
+    else:
+        _GEOIP_STORE = None
     if v4_geo_filename:
-        _GEOIP_IPV4_GEO = pygeoip.GeoIP(
-            v4_geo_filename, pygeoip.MEMORY_CACHE if memcache else 0)
+        _GEOIP_IPV4_GEO = _open_database(v4_geo_filename, memcache)
+        # Any index of the prior database is now obsolete
+        _GEOIP_IPV4_INDEX = None
     if v4_isp_filename:
-        _GEOIP_IPV4_ISP = pygeoip.GeoIP(
-            v4_isp_filename, pygeoip.MEMORY_CACHE if memcache else 0)
+        _GEOIP_IPV4_ISP = _open_database(v4_isp_filename, memcache)
     if v4_org_filename:
-        _GEOIP_IPV4_ORG = pygeoip.GeoIP(
-            v4_org_filename, pygeoip.MEMORY_CACHE if memcache else 0)
+        _GEOIP_IPV4_ORG = _open_database(v4_org_filename, memcache)
     if v6_geo_filename:
-        _GEOIP_IPV6_GEO = pygeoip.GeoIP(
-            v6_geo_filename, pygeoip.MEMORY_CACHE if memcache else 0)
+        _GEOIP_IPV6_GEO = _open_database(v6_geo_filename, memcache)
     if v6_isp_filename:
-        _GEOIP_IPV6_ISP = pygeoip.GeoIP(
-            v6_isp_filename, pygeoip.MEMORY_CACHE if memcache else 0)
+        _GEOIP_IPV6_ISP = _open_database(v6_isp_filename, memcache)
     if v6_org_filename:
-        _GEOIP_IPV6_ORG = pygeoip.GeoIP(
-            v6_org_filename, pygeoip.MEMORY_CACHE if memcache else 0)
+        _GEOIP_IPV6_ORG = _open_database(v6_org_filename, memcache)
+    # Forget the databases that have been replaced so that they (and, with
+    # memcache, their entire content) can be freed
+    active = {
+        _GEOIP_IPV4_GEO, _GEOIP_IPV4_ISP, _GEOIP_IPV4_ORG,
+        _GEOIP_IPV6_GEO, _GEOIP_IPV6_ISP, _GEOIP_IPV6_ORG,
+        }
+    for databases in (_GEOIP_FILENAMES, _GEOIP_STORE_KEYS):
+        for db in list(databases):
+            if db not in active:
+                del databases[db]
+
+
+def _open_database(filename, memcache):
+    # Opens the GeoIP database *filename*, recording its filename for
+    # _store_key
+    db = pygeoip.GeoIP(filename, pygeoip.MEMORY_CACHE if memcache else 0)
+    _GEOIP_FILENAMES[db] = filename
+    return db
+
+
+def _store_key(db):
+    # Returns the key identifying the results of *db* in the persistent
+    # cache, or None if *db* wasn't opened by init_databases
+    try:
+        return _GEOIP_STORE_KEYS[db]
+    except KeyError:
+        try:
+            filename = _GEOIP_FILENAMES[db]
+        except KeyError:
+            return None
+        stat = os.stat(filename)
+        key = _GEOIP_STORE_KEYS[db] = (
+            os.path.abspath(filename), stat.st_size, int(stat.st_mtime))
+        return key
+
+
+# City databases contain a full record for every address, from which the
+# results of the country and region queries can be derived (as pygeoip does
+# internally); this ensures all geographical attributes are served from a
+# single cached record
+_RECORD_QUERIES = {
+    'country_code_by_addr': lambda rec: rec.get('country_code'),
+    'region_by_addr': lambda rec: {
+        'country_code': rec.get('country_code'),
+        'region_code': rec.get('region_code'),
+        },
+    }
+
+
+def _query(db, method, address):
+    # Returns the result of the pygeoip query *method* of *db* for *address*,
+    # caching the result in the shared cache (which is simply cleared when
+    # full) and the persistent cache (if any); raises AttributeError if *db*
+    # is None
+    # pylint: disable=protected-access
+    key = (db, method, address.packed)
+    try:
+        result = _GEOIP_CACHE[key]
+    except KeyError:
+        pass
+    else:
+        _GEOIP_CACHE_COUNTERS.hits += 1
+        return result
+    start = timer()
+    store_key = result = None
+    if _GEOIP_STORE is not None:
+        db_key = _store_key(db)
+        if db_key is not None:
+            store_key = (db_key, method, address.packed)
+            result = _GEOIP_STORE.get(store_key, _MISSING)
+    if store_key is None or result is _MISSING:
+        if (
+                method in _RECORD_QUERIES and
+                db._databaseType in const.CITY_EDITIONS):
+            # Exclude the time spent in the nested query, which records its
+            # own miss (if any)
+            elapsed = timer() - start
+            record = _query(db, 'record_by_addr', address)
+            start = timer() - elapsed
+            result = _RECORD_QUERIES[method](record or {})
+        else:
+            result = getattr(db, method)(_address_str(address))
+        if store_key is not None:
+            _GEOIP_STORE.put(store_key, result)
+    _GEOIP_CACHE_COUNTERS.misses += 1
+    _GEOIP_CACHE_COUNTERS.miss_time += timer() - start
+    if _GEOIP_CACHE_SIZE:
+        if len(_GEOIP_CACHE) >= _GEOIP_CACHE_SIZE:
+            _GEOIP_CACHE_COUNTERS.evictions += len(_GEOIP_CACHE)
+            _GEOIP_CACHE.clear()
+        _GEOIP_CACHE[key] = result
+    return result
+
+
+register(
+    'geoip.query',
+    lambda: _GEOIP_CACHE_COUNTERS.stats(len(_GEOIP_CACHE), _GEOIP_CACHE_SIZE),
+    _GEOIP_CACHE_COUNTERS.reset)
+register(
+    'geoip.store',
+    lambda: None if _GEOIP_STORE is None else _GEOIP_STORE.stats(),
+    lambda: None if _GEOIP_STORE is None else _GEOIP_STORE.reset_stats())
 
 
 def country_code_by_addr(address):
@@ -190,18 +377,27 @@ def country_code_by_addr(address):
     :param address: The address to lookup the country for
     :returns str: The country code associated with the address
     """
+    if _GEOIP_IPV4_INDEX is not None and isinstance(
+            address, ipaddress.IPv4Address):
+        return _GEOIP_IPV4_INDEX.lookup(address, 'country')
+    return _country_code_by_addr(address)
+
+
+def _country_code_by_addr(address):
     # pygeoip returns '' instead of None in case a match isn't found. For
     # consistency with the GeoIP API, we convert this to None
     try:
         if isinstance(address, ipaddress.IPv4Address):
-            result = _GEOIP_IPV4_GEO.country_code_by_addr(address.compressed)
+            result = _query(_GEOIP_IPV4_GEO, 'country_code_by_addr', address)
         else:
-            result = _GEOIP_IPV6_GEO.country_code_by_addr(address.compressed)
+            result = _query(_GEOIP_IPV6_GEO, 'country_code_by_addr', address)
     except AttributeError:
         raise ValueError(
             'Uninitialized geo database while looking up country '
             'for address %s' % address)
     else:
+        if not result:
+            return None
         if isinstance(result, str):
             return result
         return result.decode(_MAXMIND_ENCODING)
@@ -226,13 +422,20 @@ def region_by_addr(address):
     :param address: The address to lookup the region for
     :returns str: The region associated with the address, or None
     """
+    if _GEOIP_IPV4_INDEX is not None and isinstance(
+            address, ipaddress.IPv4Address):
+        return _GEOIP_IPV4_INDEX.lookup(address, 'region')
+    return _region_by_addr(address)
+
+
+def _region_by_addr(address):
     # This is safe as pygeoip returns a dictionary with blank values in the
     # case of no match
     try:
         if isinstance(address, ipaddress.IPv4Address):
-            rec = _GEOIP_IPV4_GEO.region_by_addr(address.compressed)
+            rec = _query(_GEOIP_IPV4_GEO, 'region_by_addr', address)
         else:
-            rec = _GEOIP_IPV6_GEO.region_by_addr(address.compressed)
+            rec = _query(_GEOIP_IPV6_GEO, 'region_by_addr', address)
     except AttributeError:
         raise ValueError(
             'Uninitialized geo database while looking up country '
@@ -261,11 +464,18 @@ def city_by_addr(address):
     :param address: The address to lookup the city for
     :returns str: The city associated with the address, or None
     """
+    if _GEOIP_IPV4_INDEX is not None and isinstance(
+            address, ipaddress.IPv4Address):
+        return _GEOIP_IPV4_INDEX.lookup(address, 'city')
+    return _city_by_addr(address)
+
+
+def _city_by_addr(address):
     try:
         if isinstance(address, ipaddress.IPv4Address):
-            rec = _GEOIP_IPV4_GEO.record_by_addr(address.compressed)
+            rec = _query(_GEOIP_IPV4_GEO, 'record_by_addr', address)
         else:
-            rec = _GEOIP_IPV6_GEO.record_by_addr(address.compressed)
+            rec = _query(_GEOIP_IPV6_GEO, 'record_by_addr', address)
     except AttributeError:
         raise ValueError(
             'Uninitialized geo database while looking up country '
@@ -296,11 +506,18 @@ def coords_by_addr(address):
     :param address: The address to locate
     :returns str: The coordinates associated with the address, or None
     """
+    if _GEOIP_IPV4_INDEX is not None and isinstance(
+            address, ipaddress.IPv4Address):
+        return _GEOIP_IPV4_INDEX.lookup(address, 'coords')
+    return _coords_by_addr(address)
+
+
+def _coords_by_addr(address):
     try:
         if isinstance(address, ipaddress.IPv4Address):
-            rec = _GEOIP_IPV4_GEO.record_by_addr(address.compressed)
+            rec = _query(_GEOIP_IPV4_GEO, 'record_by_addr', address)
         else:
-            rec = _GEOIP_IPV6_GEO.record_by_addr(address.compressed)
+            rec = _query(_GEOIP_IPV6_GEO, 'record_by_addr', address)
     except AttributeError:
         raise ValueError(
             'Uninitialized geo database while looking up country '
@@ -324,15 +541,15 @@ def isp_by_addr(address):
     """
     try:
         if isinstance(address, ipaddress.IPv4Address):
-            result = _GEOIP_IPV4_ISP.org_by_addr(address.compressed)
+            result = _query(_GEOIP_IPV4_ISP, 'org_by_addr', address)
         else:
-            result = _GEOIP_IPV6_ISP.org_by_addr(address.compressed)
+            result = _query(_GEOIP_IPV6_ISP, 'org_by_addr', address)
     except AttributeError:
         raise ValueError(
             'Uninitialized ISP database while looking up ISP '
             'for address %s' % address)
     else:
-        if isinstance(result, str):
+        if result is None or isinstance(result, str):
             return result
         return result.decode(_MAXMIND_ENCODING)
 
@@ -346,14 +563,287 @@ def org_by_addr(address):
     """
     try:
         if isinstance(address, ipaddress.IPv4Address):
-            result = _GEOIP_IPV4_ORG.org_by_addr(address.compressed)
+            result = _query(_GEOIP_IPV4_ORG, 'org_by_addr', address)
         else:
-            result = _GEOIP_IPV6_ORG.org_by_addr(address.compressed)
+            result = _query(_GEOIP_IPV6_ORG, 'org_by_addr', address)
     except AttributeError:
         raise ValueError(
             'Uninitialized organisation database while looking up org '
             'for address %s' % address)
     else:
-        if isinstance(result, str):
+        if result is None or isinstance(result, str):
             return result
         return result.decode(_MAXMIND_ENCODING)
+
+
+# The functions used to look up each attribute of an address in the
+# database. The indexed public functions must not be used here as the index
+# itself calls these to resolve each range
+_LOOKUPS = {
+    'country': _country_code_by_addr,
+    'region':  _region_by_addr,
+    'city':    _city_by_addr,
+    'coords':  _coords_by_addr,
+    }
+
+
+# The database types containing IPv4 geographical information
+_IPV4_GEO_EDITIONS = (
+    const.COUNTRY_EDITION,
+    const.REGION_EDITION_REV0,
+    const.REGION_EDITION_REV1,
+    const.CITY_EDITION_REV0,
+    const.CITY_EDITION_REV1,
+    )
+
+
+class GeoIPIndex(object):
+    """
+    Represents the ranges of an IPv4 geographical database.
+
+    Instances of this class are constructed by :func:`build_index`; there is
+    usually no need to use them directly. The values of attributes looked up
+    via the index (``'country'``, ``'region'``, ``'city'``, or ``'coords'``)
+    are cached for each record, so only the first lookup of an address in each
+    range queries the database. As there are only four attributes, the cache
+    can never hold more than four values for each range of the index.
+
+    .. attribute:: starts
+
+        A ``uint32`` array containing the first address of each range, in
+        ascending order
+
+    .. attribute:: ends
+
+        A ``uint32`` array containing the last address of each range
+
+    .. attribute:: records
+
+        An ``int64`` array containing the position of each range's record in
+        the database
+    """
+
+    def __init__(self, starts, ends, records):
+        self.starts = starts
+        self.ends = ends
+        self.records = records
+        # Keyed by (attribute, record) so this is bounded by the size of the
+        # index; no eviction is required
+        self._values = {}
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _value(self, position, attribute):
+        record = int(self.records[position])
+        try:
+            return self._values[(attribute, record)]
+        except KeyError:
+            value = _LOOKUPS[attribute](
+                ipaddress.IPv4Address(int(self.starts[position])))
+            self._values[(attribute, record)] = value
+            return value
+
+    def find(self, addresses):
+        """
+        Returns an array of the positions of the ranges containing
+        *addresses*, which must be an array of IPv4 addresses as integers.
+        The position of addresses which are not in any range is -1.
+
+        :param addresses: An array of addresses to find
+        :returns: An ``int64`` array of range positions
+        """
+        addresses = np.asarray(addresses, dtype=np.int64)
+        positions = np.searchsorted(self.starts, addresses, 'right') - 1
+        found = positions >= 0
+        found[found] = addresses[found] <= self.ends[positions[found]]
+        positions[~found] = -1
+        return positions
+
+    def lookup(self, address, attribute='country'):
+        """
+        Returns the value of *attribute* for the IPv4 *address*, or None if
+        the address is not in the database.
+
+        :param address: The address (or integer) to look up
+        :param str attribute: The attribute to return
+        """
+        address = int(address)
+        position = int(np.searchsorted(self.starts, address, 'right')) - 1
+        if position < 0 or address > self.ends[position]:
+            return None
+        return self._value(position, attribute)
+
+    def lookup_many(self, addresses, attribute='country'):
+        """
+        Returns an ``object`` array of the values of *attribute* for
+        *addresses*, which must be an array of IPv4 addresses as integers.
+        Values are None for addresses which are not in the database.
+
+        :param addresses: An array of addresses to look up
+        :param str attribute: The attribute to return
+        """
+        positions = self.find(addresses)
+        result = np.empty(len(positions), dtype=object)
+        found = positions >= 0
+        unique, inverse = np.unique(positions[found], return_inverse=True)
+        values = np.empty(len(unique), dtype=object)
+        for i, position in enumerate(unique):
+            values[i] = self._value(position, attribute)
+        result[found] = values[inverse.ravel()]
+        return result
+
+
+def _read_database(db):
+    # Returns the content of the pygeoip database *db* as a uint8 array. This
+    # relies upon the internals of pygeoip 0.3 (see the pin in setup.py)
+    # pylint: disable=protected-access
+    with db._lock:
+        pos = db._fp.tell()
+        try:
+            db._fp.seek(0)
+            data = db._fp.read()
+        finally:
+            db._fp.seek(pos)
+    if isinstance(data, str):
+        data = data.encode(_MAXMIND_ENCODING)
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def _walk_tree(data, record_length, segments):
+    # Walks the binary tree at the start of a GeoIP database one level at a
+    # time (all nodes at a level are handled together), returning arrays of
+    # the start, end, and record of every leaf. Each node consists of two
+    # little-endian pointers (for a 0 and a 1 bit respectively) which refer
+    # to another node, or to a record if they are >= segments
+    weights = 1 << (8 * np.arange(record_length, dtype=np.int64))
+    node_size = 2 * record_length
+    nodes = np.zeros(1, dtype=np.int64)
+    prefixes = np.zeros(1, dtype=np.int64)
+    starts, ends, records = [], [], []
+    for depth in range(31, -1, -1):
+        # Each node of a valid tree is referred to once, so a level cannot
+        # contain more nodes than the database
+        if (
+                len(nodes) * node_size > len(data) or
+                (nodes.max() + 1) * node_size > len(data)):
+            raise ValueError('Corrupt GeoIP database')
+        next_nodes, next_prefixes = [], []
+        for bit in (0, 1):
+            offsets = nodes * node_size + bit * record_length
+            pointers = data[
+                offsets[:, np.newaxis] + np.arange(record_length)
+            ].astype(np.int64).dot(weights)
+            bit_prefixes = prefixes | (bit << depth)
+            leaf = pointers >= segments
+            starts.append(bit_prefixes[leaf])
+            ends.append(bit_prefixes[leaf] + ((1 << depth) - 1))
+            records.append(pointers[leaf])
+            next_nodes.append(pointers[~leaf])
+            next_prefixes.append(bit_prefixes[~leaf])
+        nodes = np.concatenate(next_nodes)
+        prefixes = np.concatenate(next_prefixes)
+        if not len(nodes):
+            break
+    else:
+        raise ValueError('Corrupt GeoIP database')
+    return np.concatenate(starts), np.concatenate(ends), np.concatenate(records)
+
+
+def build_index():
+    """
+    Builds an index of the IPv4 geographical database initialized by
+    :func:`init_databases`, returning a :class:`GeoIPIndex`.
+
+    The index is used by :func:`lookup_many` and by the geographical
+    attributes of :class:`~lars.datatypes.IPv4Address` until
+    :func:`init_databases` is next called with an IPv4 geographical database.
+    If the IPv4 geographical database has not been initialized, or is not a
+    country, region, or city database, the function raises a ValueError.
+    NumPy must be installed to build an index.
+
+    :returns: The :class:`GeoIPIndex` constructed
+    """
+    # pylint: disable=global-statement,protected-access
+    global _GEOIP_IPV4_INDEX
+    if np is None:
+        raise ImportError('NumPy is required to build a GeoIP index')
+    db = _GEOIP_IPV4_GEO
+    if db is None:
+        raise ValueError('Uninitialized geo database while building index')
+    if db._databaseType not in _IPV4_GEO_EDITIONS:
+        raise ValueError(
+            'An IPv4 country, region, or city database is required to build '
+            'an index')
+    segments = db._databaseSegments
+    starts, ends, records = _walk_tree(
+        _read_database(db), db._recordLength, segments)
+    # Sort the ranges, exclude those which aren't in the database, and merge
+    # adjacent ranges which refer to the same record
+    order = np.argsort(starts, kind='mergesort')
+    starts, ends, records = starts[order], ends[order], records[order]
+    keep = records != segments
+    starts, ends, records = starts[keep], ends[keep], records[keep]
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = (starts[1:] != ends[:-1] + 1) | (records[1:] != records[:-1])
+    last = np.append(first[1:], True)
+    _GEOIP_IPV4_INDEX = GeoIPIndex(
+        starts[first].astype(np.uint32),
+        ends[last].astype(np.uint32),
+        records[first])
+    return _GEOIP_IPV4_INDEX
+
+
+def lookup_many(addresses, attribute='country'):
+    """
+    Returns an ``object`` array of the *attribute* of each of *addresses*.
+
+    The *addresses* may be a sequence of :class:`~lars.datatypes.IPv4Address`
+    and :class:`~lars.datatypes.IPv6Address` objects (or None), or an integer
+    array of IPv4 addresses, such as an address column produced by
+    :mod:`lars.columns`. The *attribute* must be one of ``'country'``,
+    ``'region'``, ``'city'``, or ``'coords'``, and the values are those that
+    the attribute of the same name of each address would return (None for
+    None addresses).
+
+    If :func:`build_index` has been called, all IPv4 addresses are resolved
+    together with the index. Otherwise (and for IPv6 addresses) each address
+    is looked up individually. NumPy must be installed to use this function.
+
+    :param addresses: The addresses to look up
+    :param str attribute: The attribute to return for each address
+    :returns: An ``object`` array of values
+    """
+    if np is None:
+        raise ImportError('NumPy is required for bulk GeoIP lookups')
+    try:
+        lookup = {
+            'country': country_code_by_addr,
+            'region':  region_by_addr,
+            'city':    city_by_addr,
+            'coords':  coords_by_addr,
+            }[attribute]
+    except KeyError:
+        raise ValueError('Invalid GeoIP attribute %s' % attribute)
+    index = _GEOIP_IPV4_INDEX
+    if isinstance(addresses, np.ndarray) and addresses.dtype.kind in 'iu':
+        if index is not None:
+            return index.lookup_many(addresses, attribute)
+        addresses = [ipaddress.IPv4Address(int(a)) for a in addresses]
+    result = np.empty(len(addresses), dtype=object)
+    ipv4 = []
+    for i, address in enumerate(addresses):
+        if address is not None:
+            if index is not None and isinstance(
+                    address, ipaddress.IPv4Address):
+                ipv4.append(i)
+            else:
+                result[i] = lookup(address)
+    if ipv4:
+        ipv4 = np.array(ipv4)
+        result[ipv4] = index.lookup_many(
+            np.fromiter(
+                (int(addresses[i]) for i in ipv4), dtype=np.int64,
+                count=len(ipv4)),
+            attribute)
+    return result
@@ -34,7 +34,7 @@ file and yields rows from it as tuples.
 Classes
 =======
 
-.. autoclass:: IISSource
+.. autoclass:: IISSource(source, fields=None, timestamp=False)
     :members:
 
     .. attribute:: count
@@ -51,6 +51,11 @@ Classes
         A sequence of fields names found in the ``#Fields`` directive in the
         file header
 
+    .. attribute:: projection
+
+        The sequence of field names that rows will be restricted to, or None if
+        rows include every field in the ``#Fields`` directive
+
     .. attribute:: finish
 
         The timestamp found in the ``#End-Date`` directive (if any, as a
@@ -65,6 +70,11 @@ Classes
         The name of the software which produced the source file as given by
         the ``#Software`` directive (if any)
 
+    .. attribute:: timestamp
+
+        If True, the ``date`` and ``time`` fields are combined into a single
+        ``timestamp`` field in rows
+
     .. attribute:: start
 
         The timestamp found in the ``#Start-Date`` directive (if any), as a
@@ -134,16 +144,21 @@ from __future__ import (
     division,
     )
 
+import os
 import re
+import mmap
 import warnings
 import logging
+from itertools import islice
 try:
     from urllib.parse import unquote_plus
 except ImportError:
     from urllib import unquote_plus  # pylint: disable=wrong-import-order
 
-from . import parsers, datatypes as dt
+from . import parsers, columns, timing, datatypes as dt
 from .exc import LarsError, LarsWarning
+from .cache import lru_cache
+from .stats import register
 
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
 
@@ -166,6 +181,23 @@ def _string_parse(s):
     return unquote_plus(s)
 
 
+@lru_cache(maxsize=100)
+def _compile_fields(
+        cls, line, projection, timestamp, intern, url_cache, compact):
+    # A thread-safe cache of the field names, compiled row regex, parsers, and
+    # row type for each combination of IISSource class, #Fields directive,
+    # and options; this makes processing many files with the same fields (as
+    # when processing lots of small rotated log files) cheap
+    # pylint: disable=protected-access
+    return cls._compile(
+        line, projection, timestamp, intern, url_cache, compact)
+
+
+register(
+    'iis.compile', _compile_fields.cache_stats,
+    _compile_fields.cache_reset_stats)
+
+
 class IISError(LarsError):
     """
     Base class for IISSource errors.
@@ -229,12 +261,83 @@ class IISSource(object):
     ``#Date`` directive, are being used) in which case the attribute will be
     the lower-cased version of the directive name without the ``#`` prefix.
 
+    If *fields* is specified, it must be a sequence of field names and the
+    rows yielded will contain only those fields (in the order they appear in
+    the ``#Fields`` directive). Names may be given either in their original
+    form (e.g. ``"c-ip"``) or their sanitized form (e.g. ``"c_ip"``). Fields
+    that are not requested are still matched, but are neither captured nor
+    converted. If a requested field does not appear in the ``#Fields``
+    directive, :exc:`IISFieldsError` is raised.
+
+    If *timestamp* is True, the ``date`` and ``time`` fields (which must be
+    adjacent in the ``#Fields`` directive, in that order) are combined into a
+    single ``timestamp`` field containing a :class:`~lars.datatypes.DateTime`
+    value. If these fields cannot be found, :exc:`IISFieldsError` is raised.
+    When combined with *fields*, the name ``timestamp`` must be used to
+    select the combined field.
+
+    If *intern* is specified, it must be a sequence of field names (in either
+    form, or True for the names in :attr:`INTERN_FIELDS`). Repeated values of
+    these fields will share a single object rather than each row receiving a
+    new (but equal) one, which reduces the memory used by rows that are
+    retained. Up to :attr:`INTERN_SIZE` values are retained for each field.
+    Interned values must not be modified, so address and hostname fields
+    (whose objects have writable attributes) are not included in
+    :attr:`INTERN_FIELDS`. If a field named in *intern* does not appear in
+    the ``#Fields`` directive, :exc:`IISFieldsError` is raised.
+
+    If *url_cache* is True, fields containing URLs (such as ``cs_uri_stem``)
+    are constructed with :func:`~lars.datatypes.cached_url`, which caches the
+    most recently used URLs. This is usually much faster as a few URLs tend
+    to make up the bulk of requests in a log.
+
+    If *compact* is True, address fields (such as ``c_ip``) and hostname
+    fields are constructed with :func:`~lars.datatypes.compact_address` and
+    :func:`~lars.datatypes.compact_hostname`, so that addresses are
+    constructed as the compact types like
+    :class:`~lars.datatypes.CompactIPv4Address` which use less memory.
+
+    If *profile* is True (or a :class:`~lars.timing.Profile` instance), the
+    time spent matching lines, converting each field, and constructing rows is
+    recorded in the :attr:`profile` attribute, and a summary is logged when
+    the source is closed; see :mod:`lars.timing` for details.
+
     :param source: A file-like object containing the source stream
+    :param fields: An optional sequence of the field names to include in rows
+    :param bool timestamp: If True, combine the date and time fields into a
+                           single timestamp field
+    :param intern: An optional sequence of the field names to intern, or True
+    :param bool url_cache: If True, cache the results of parsing URL fields
+    :param bool compact: If True, use compact representations of addresses
+    :param profile: If True, record the time spent in each stage of parsing
     """
     # pylint: disable=too-many-instance-attributes,too-few-public-methods
 
-    def __init__(self, source):
+    # The fields interned when intern is True; these typically have few
+    # distinct values in any log
+    INTERN_FIELDS = (
+        's_sitename', 's_computername', 's_port', 'cs_method', 'cs_username',
+        'cs_version', 'cs_User_Agent', 'sc_status', 'sc_substatus',
+        'sc_win32_status',
+        )
+
+    # The maximum number of distinct values retained for each interned field
+    INTERN_SIZE = 1000
+
+    def __init__(
+            self, source, fields=None, timestamp=False, intern=None,
+            url_cache=False, compact=False, profile=False):
+        # pylint: disable=too-many-arguments
         self.source = source
+        self.projection = tuple(fields) if fields is not None else None
+        self.timestamp = timestamp
+        if intern is None or intern is True:
+            self.intern = intern
+        else:
+            self.intern = tuple(intern)
+        self.url_cache = url_cache
+        self.compact = compact
+        self.profile = timing.make_profile(profile)
         self.version = None
         self.software = None
         self.remark = None
@@ -244,8 +347,11 @@ class IISSource(object):
         self.fields = []
         self.count = 0
         self._row_pattern = None
+        self._row_match = None
         self._row_funcs = None
         self._row_type = None
+        self._make_row = None
+        self._field_types = None
 
     # The following regexes are used to identify directives within IIS log
     # files. Contrary to popular opinion these can occur anywhere within the
@@ -281,6 +387,12 @@ class IISSource(object):
 
     DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
+    def _parse_datetime(self, s):
+        # Use the fast ISO parser unless DATETIME_FORMAT has been overridden
+        if self.DATETIME_FORMAT == IISSource.DATETIME_FORMAT:
+            return parsers.datetime_iso_parse(s)
+        return dt.datetime(s, self.DATETIME_FORMAT)
+
     def _process_directive(self, line):
         """
         Processes a ``#Directive`` in a IIS log file.
@@ -327,20 +439,14 @@ class IISSource(object):
         elif directive == 'Fields':
             self._process_fields(match.group('text'))
         elif directive == 'Start-Date':
-            self.start = dt.datetime(
-                '%s %s' % (match.group('date'), match.group('time')),
-                self.DATETIME_FORMAT
-                )
+            self.start = self._parse_datetime(
+                '%s %s' % (match.group('date'), match.group('time')))
         elif directive == 'End-Date':
-            self.finish = dt.datetime(
-                '%s %s' % (match.group('date'), match.group('time')),
-                self.DATETIME_FORMAT
-                )
+            self.finish = self._parse_datetime(
+                '%s %s' % (match.group('date'), match.group('time')))
         elif directive == 'Date':
-            self.date = dt.datetime(
-                '%s %s' % (match.group('date'), match.group('time')),
-                self.DATETIME_FORMAT
-                )
+            self.date = self._parse_datetime(
+                '%s %s' % (match.group('date'), match.group('time')))
 
     # The FIELD_RE regex is intended to match a single header name within the
     # #Fields specification of a IIS log file. Basically headers come in one of
@@ -407,8 +513,9 @@ class IISSource(object):
     TYPES = {
         'integer':      (parsers.int_parse, parsers.INTEGER),
         'fixed':        (parsers.fixed_parse, parsers.FIXED),
-        'date_iso':     (parsers.date_parse, parsers.DATE_ISO),
-        'time_iso':     (parsers.time_parse, parsers.TIME_ISO),
+        'date_iso':     (parsers.date_iso_parse, parsers.DATE_ISO),
+        'time_iso':     (parsers.time_iso_parse, parsers.TIME_ISO),
+        'datetime_iso': (parsers.datetime_iso_parse, parsers.DATETIME_ISO),
         'url':          (parsers.url_parse, parsers.URL),
         # This regex deviates from the draft's specifications; in practice IIS
         # always URI encodes the content of prefix(header) fields but the draft
@@ -448,14 +555,76 @@ class IISSource(object):
         logging.debug('Parsing #Fields: %s', line)
         if self.fields:
             raise IISFieldsError('Second #Fields directive found')
-        fields = self.FIELD_RE.findall(line)
+        # Compiling the row regex and (particularly) constructing the row
+        # type is relatively expensive, so the results are cached by the
+        # module-level _compile_fields function for all instances with the
+        # same class, #Fields directive, and options
+        (
+            fields,
+            self._row_pattern,
+            self._row_funcs,
+            self._field_types,
+            self._row_type,
+        ) = _compile_fields(
+            type(self), line, self.projection, self.timestamp, self.intern,
+            self.url_cache, self.compact)
+        self.fields = list(fields)
+        self._row_match = self._row_pattern.match
+        self._make_row = self._row_type
+        if self.profile is not None:
+            # The compiled functions are shared with other instances, so the
+            # timed wrappers are only stored on this one
+            self._row_match = self.profile.wrap('match', self._row_match)
+            self._row_funcs = tuple(
+                self.profile.wrap('parse.%s' % name, func)
+                for (name, func) in zip(
+                    self._row_type._fields, self._row_funcs)
+                )
+            self._make_row = self.profile.wrap('row', self._make_row)
+
+    @classmethod
+    def _compile(cls, line, projection, timestamp, intern, url_cache,
+                 compact):
+        # Returns a tuple of (original field names, row regex, row parsers,
+        # field types, row type) for the specified #Fields directive and
+        # options
+        fields = cls.FIELD_RE.findall(line)
+        if projection is None:
+            wanted = None
+        else:
+            wanted = set(projection)
+            found = set()
+        if intern is True:
+            interned = set(cls.INTERN_FIELDS)
+        else:
+            interned = set(intern or ())
+        names = set()
+        if timestamp:
+            try:
+                stamp_index = fields.index(('', '', 'date'))
+                if fields[stamp_index + 1] != ('', '', 'time'):
+                    raise ValueError('time does not follow date')
+            except (ValueError, IndexError):
+                raise IISFieldsError(
+                    'A timestamp requires a date field immediately followed '
+                    'by a time field')
+        else:
+            stamp_index = None
+        all_fields = []
         pattern = ''
         tuple_fields = []
         tuple_funcs = []
-        for prefix, header, identifier in fields:
+        tuple_types = []
+        for index, (prefix, header, identifier) in enumerate(fields):
             # Figure out the original field name, a Python-ified version of
             # this name, and what type the field has
-            if header:
+            if stamp_index is not None and index == stamp_index + 1:
+                # The time field has already been merged into the timestamp
+                continue
+            elif index == stamp_index:
+                original_name = python_name = 'timestamp'
+                field_type = 'datetime_iso'
+            elif header:
                 original_name = '%s(%s)' % (prefix, identifier)
                 python_name = dt.sanitize_name('%s_%s' % (prefix, identifier))
                 # According to the draft, all header fields are type <string>
@@ -468,28 +637,70 @@ class IISSource(object):
                 original_name = '%s-%s' % (prefix, identifier)
                 python_name = dt.sanitize_name('%s_%s' % (prefix, identifier))
                 # Default to <string> if we don't know the field identifier
-                field_type = self.FIELD_TYPES.get(identifier, 'string')
+                field_type = cls.FIELD_TYPES.get(identifier, 'string')
             else:
                 original_name = identifier
                 python_name = dt.sanitize_name(identifier)
-                field_type = self.FIELD_TYPES.get(identifier, 'string')
+                field_type = cls.FIELD_TYPES.get(identifier, 'string')
             if pattern:
                 pattern += r'\s+'
             logging.debug('Field %s has type %s', original_name, field_type)
-            field_fn, field_re = self.TYPES[field_type]
-            pattern += field_re % {'name': python_name}
-            tuple_funcs.append(field_fn)
-            if original_name in self.fields:
-                raise IISFieldsError('Duplicate field name %s' % original_name)
-            self.fields.append(original_name)
-            tuple_fields.append(python_name)
+            field_fn, field_re = cls.TYPES[field_type]
+            if index == stamp_index:
+                original_names = ['date', 'time']
+            else:
+                original_names = [original_name]
+            for name in original_names:
+                if name in all_fields:
+                    raise IISFieldsError('Duplicate field name %s' % name)
+                all_fields.append(name)
+            names |= {original_name, python_name}
+            if wanted is None or wanted & {original_name, python_name}:
+                if url_cache and field_fn is parsers.url_parse:
+                    field_fn = parsers.cached_url_parse
+                if compact and field_fn is parsers.address_parse:
+                    field_fn = parsers.compact_address_parse
+                if compact and field_fn is parsers.hostname_parse:
+                    field_fn = parsers.compact_hostname_parse
+                if interned & {original_name, python_name}:
+                    field_fn = parsers.interned(field_fn, cls.INTERN_SIZE)
+                pattern += field_re % {'name': python_name}
+                tuple_funcs.append(field_fn)
+                tuple_fields.append(python_name)
+                # The draft types method as <name> (see FIELD_TYPES) but
+                # for columnar output it's far more useful to know that it's
+                # an HTTP method
+                tuple_types.append(
+                    'method' if identifier == 'method' else field_type)
+                if wanted is not None:
+                    found |= {original_name, python_name}
+            else:
+                # Unwanted fields still have to be matched, but there's no
+                # need to capture them
+                pattern += parsers.non_capturing(
+                    field_re % {'name': python_name})
+        if wanted is not None:
+            unknown = wanted - found
+            if unknown:
+                raise IISFieldsError(
+                    'Field(s) %s do not occur in the #Fields directive' %
+                    ', '.join(sorted(unknown)))
+        if intern is not True:
+            unknown = interned - names
+            if unknown:
+                raise IISFieldsError(
+                    'Field(s) %s do not occur in the #Fields directive' %
+                    ', '.join(sorted(unknown)))
         logging.debug('Constructing row regex: %s', pattern)
-        self._row_pattern = re.compile('^' + pattern + '$')
+        pattern = re.compile('^' + pattern + '$')
         logging.debug('Constructing row tuple with fields: %s',
                       ','.join(tuple_fields))
-        self._row_type = dt.row(*tuple_fields)
-        logging.debug('Constructing row parser functions')
-        self._row_funcs = tuple_funcs
+        row_type = dt.row(*tuple_fields)
+        # The results are shared between instances, hence the conversion of
+        # the lists to (immutable) tuples
+        return (
+            tuple(all_fields), pattern, tuple(tuple_funcs), tuple(tuple_types),
+            row_type)
 
     def __enter__(self):
         logging.debug('Entering IIS context')
@@ -498,6 +709,16 @@ class IISSource(object):
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         logging.debug('Exiting IIS context')
+        self.close()
+
+    def close(self):
+        """
+        Close the source, logging a summary of its profile if profiling is
+        enabled.
+        """
+        logging.debug('Closing IIS source')
+        if self.profile is not None:
+            logging.info('IIS source profile:\n%s', self.profile.summary())
 
     def __iter__(self):
         """
@@ -521,16 +742,20 @@ class IISSource(object):
                     raise IISFieldsError(
                         'Missing #Fields directive before data')
                 else:
-                    match = self._row_pattern.match(line.rstrip())
+                    match = self._row_match(line.rstrip())
                     if match:
                         values = match.group(*self._row_type._fields)
+                        if len(self._row_funcs) == 1:
+                            # match.group() returns a bare string rather than
+                            # a tuple when only one group is requested
+                            values = (values,)
                         try:
                             values = [f(v) for (f, v) in zip(self._row_funcs,
                                                              values)]
                         except ValueError as exc:
                             raise IISWarning(str(exc))
                         self.count += 1
-                        yield self._row_type(*values)
+                        yield self._make_row(*values)
                     else:
                         raise IISWarning('Line contains invalid data')
             except IISWarning as exc:
@@ -542,3 +767,204 @@ class IISSource(object):
                     raise type(exc)(exc.args[0], line_number=num + 1,
                                     line=line)
                 raise  # pragma: no cover
+
+    def iter_batches(self, size=10000):
+        """
+        Yields lists of up to *size* row tuples from the file-like source
+        object.
+
+        This produces exactly the same rows (and warnings) as iterating over
+        the source, but lines are read from the source *size* at a time and
+        converted in a single tight loop, which avoids a generator step for
+        every row. This is best combined with the ``write_many`` method of
+        targets like :class:`~lars.csv.CSVTarget` and
+        :class:`~lars.sql.SQLTarget`.
+
+        :param int size: The maximum number of lines to read for each batch
+        """
+        for values in self._iter_values(size):
+            make_row = self._make_row
+            yield [make_row(*row) for row in values]
+
+    def iter_column_batches(self, size=10000):
+        """
+        Yields mappings of field names to NumPy arrays, each containing the
+        values of up to *size* rows from the file-like source object.
+
+        This requires NumPy to be installed. Fields are converted to arrays
+        according to their type; see :func:`~lars.columns.iter_column_batches`
+        for details. Addresses, dates, and times are converted straight from
+        the matched strings to the integers stored in their arrays, rather
+        than to objects. Warnings are emitted for invalid lines just as when
+        iterating over the source.
+
+        :param int size: The maximum number of lines to read for each batch
+        """
+        return columns.iter_column_batches(self, size)
+
+    def to_columns(self, size=10000):
+        """
+        Returns a mapping of field names to NumPy arrays containing the values
+        of all rows in the file-like source object.
+
+        This is equivalent to concatenating the arrays from
+        :meth:`iter_column_batches`; *size* determines the number of lines
+        that are read and converted at a time.
+
+        :param int size: The maximum number of lines to read for each batch
+        """
+        return columns.to_columns(self, size)
+
+    def iter_mmap(self, encoding='utf-8', errors='strict'):
+        """
+        Yields a row tuple for each line in the source, which must be a real
+        file (with a :meth:`fileno` method).
+
+        Instead of reading and decoding each line of the source, this method
+        memory-maps the entire file and matches a bytes version of the row
+        regex against each line in place. Only directives and the captured
+        fields are decoded (with *encoding* and *errors*). The rows and
+        warnings produced are the same as iterating over the source, but note
+        that the whole file is read (from the start) regardless of the current
+        position of the source. The *encoding* must be ASCII compatible (e.g.
+        UTF-8, or Latin-1).
+
+        :param str encoding: The encoding of the source file
+        :param str errors: The error handling scheme used for decoding errors
+        """
+        # pylint: disable=too-many-locals,too-many-branches
+        fileno = self.source.fileno()
+        size = os.fstat(fileno).st_size
+        if not size:
+            # Zero-length files can't be mapped
+            return
+        buf = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        try:
+            find = buf.find
+            match_line = funcs = fields = None
+            pos = 0
+            num = 0
+            while pos < size:
+                num += 1
+                end = find(b'\n', pos)
+                if end == -1:
+                    end = next_pos = size
+                else:
+                    next_pos = end + 1
+                # Equivalent to line.rstrip() in __iter__
+                while end > pos and buf[end - 1:end] in b' \t\r\x0b\x0c':
+                    end -= 1
+                try:
+                    if buf[pos:pos + 1] == b'#':
+                        self._process_directive(
+                            buf[pos:end].decode(encoding, errors))
+                        match_line = None
+                    else:
+                        if match_line is None:
+                            if self.version is None:
+                                raise IISVersionError(
+                                    'Missing #Version directive before data')
+                            elif not self.fields:
+                                raise IISFieldsError(
+                                    'Missing #Fields directive before data')
+                            match_line = timing.instrument(
+                                self.profile, 'match', parsers.bytes_pattern(
+                                    self._row_pattern, encoding).match)
+                            funcs = self._row_funcs
+                            fields = self._row_type._fields
+                        match = match_line(buf, pos, end)
+                        if match:
+                            values = match.group(*fields)
+                            if len(funcs) == 1:
+                                values = (values,)
+                            try:
+                                values = [
+                                    f(v.decode(encoding, errors))
+                                    for (f, v) in zip(funcs, values)
+                                    ]
+                            except ValueError as exc:
+                                # UnicodeDecodeError is a sub-class of
+                                # ValueError
+                                raise IISWarning(str(exc))
+                            self.count += 1
+                            yield self._make_row(*values)
+                        else:
+                            raise IISWarning('Line contains invalid data')
+                except IISWarning as exc:
+                    warnings.warn('Line %d: %s' % (num, str(exc)), IISWarning)
+                except IISError as exc:
+                    if not exc.line_number:
+                        raise type(exc)(
+                            exc.args[0], line_number=num,
+                            line=buf[pos:next_pos].decode(encoding, 'replace'))
+                    raise  # pragma: no cover
+                pos = next_pos
+        finally:
+            buf.close()
+
+    def _iter_values(self, size, converters=None):
+        # Yields lists of converted row values for each block of size lines
+        # read from the source. If converters is given, it is called with the
+        # source (whenever the fields are established) to obtain the
+        # conversion functions used in place of _row_funcs
+        if size < 1:
+            raise ValueError('size must be 1 or more')
+        lines = iter(self.source)
+        num = 0
+        while True:
+            block = list(islice(lines, size))
+            if not block:
+                break
+            values = self._parse_block(block, num, converters)
+            num += len(block)
+            if values:
+                yield values
+
+    def _parse_block(self, block, num, converters=None):
+        # Convert a list of lines (the first of which is line num + 1 of the
+        # source) into a list of row values. This is essentially __iter__ with
+        # the attribute lookups hoisted out of the loop; as directives can
+        # change the row pattern these are refreshed whenever one is
+        # encountered
+        result = []
+        append = result.append
+        match_line = funcs = fields = None
+        for num, line in enumerate(block, start=num + 1):
+            try:
+                if line.startswith('#'):
+                    self._process_directive(line.rstrip())
+                    match_line = None
+                    continue
+                elif match_line is None:
+                    if self.version is None:
+                        raise IISVersionError(
+                            'Missing #Version directive before data')
+                    elif not self.fields:
+                        raise IISFieldsError(
+                            'Missing #Fields directive before data')
+                    match_line = self._row_match
+                    if converters is None:
+                        funcs = self._row_funcs
+                    else:
+                        funcs = converters(self)
+                    fields = self._row_type._fields
+                match = match_line(line.rstrip())
+                if match:
+                    values = match.group(*fields)
+                    if len(funcs) == 1:
+                        values = (values,)
+                    try:
+                        values = [f(v) for (f, v) in zip(funcs, values)]
+                    except ValueError as exc:
+                        raise IISWarning(str(exc))
+                    append(values)
+                else:
+                    raise IISWarning('Line contains invalid data')
+            except IISWarning as exc:
+                warnings.warn('Line %d: %s' % (num, str(exc)), IISWarning)
+            except IISError as exc:
+                if not exc.line_number:
+                    raise type(exc)(exc.args[0], line_number=num, line=line)
+                raise  # pragma: no cover
+        self.count += len(result)
+        return result
@@ -0,0 +1,263 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+This module provides the :func:`open_log` function which opens a log file for
+reading by one of the sources (e.g. :class:`~lars.apache.ApacheSource`),
+transparently decompressing it if it has been compressed (as is typical of
+rotated log files).
+
+The compression format is determined from the first few bytes of the file
+(its "magic number") rather than its extension. The following formats are
+supported:
+
+============ ================== ==============================================
+Format       Magic bytes        Requirements
+============ ================== ==============================================
+gzip         ``1f 8b``          None
+bzip2        ``42 5a 68``       None
+xz           ``fd 37 7a 58 5a`` Python 3.3+ (or the `backports.lzma`_ package)
+zstandard    ``28 b5 2f fd``    The `zstandard`_ package
+============ ================== ==============================================
+
+By default, decompression of compressed files is performed in a background
+thread so that it overlaps with parsing in the calling thread (most
+decompressors release the GIL while working).
+
+
+Functions
+=========
+
+.. autofunction:: open_log
+
+
+Exceptions
+==========
+
+.. autoexception:: CompressionError
+
+
+Examples
+========
+
+A typical usage of this function is as follows::
+
+    from lars import io, apache
+
+    with io.open_log('/var/log/apache2/access.log.2.gz') as infile:
+        with apache.ApacheSource(infile) as source:
+            for row in source:
+                print(row)
+
+.. _backports.lzma: https://pypi.python.org/pypi/backports.lzma
+.. _zstandard: https://pypi.python.org/pypi/zstandard
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import io
+import gzip
+import bz2
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=import-error
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma  # pylint: disable=import-error
+    except ImportError:
+        lzma = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .exc import LarsError
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+class CompressionError(LarsError):
+    """
+    Raised when a compressed file cannot be opened because the module
+    required to decompress it is not installed.
+    """
+
+
+def _open_gzip(filename):
+    return gzip.GzipFile(filename, 'rb')
+
+
+def _open_bz2(filename):
+    return bz2.BZ2File(filename, 'rb')
+
+
+def _open_xz(filename):
+    if lzma is None:
+        raise CompressionError(
+            'The lzma module is required to read xz compressed file %s' %
+            filename)
+    return lzma.LZMAFile(filename, 'rb')
+
+
+def _open_zstd(filename):
+    if zstandard is None:
+        raise CompressionError(
+            'The zstandard package is required to read zstd compressed file %s'
+            % filename)
+    f = io.open(filename, 'rb')
+    try:
+        return zstandard.ZstdDecompressor().stream_reader(
+            f, closefd=True, read_across_frames=True)
+    except Exception:
+        f.close()
+        raise
+
+
+# Maps the magic number at the start of a compressed file to the function
+# which opens the file for decompression
+MAGIC = (
+    (b'\x1f\x8b', _open_gzip),
+    (b'BZh', _open_bz2),
+    (b'\xfd7zXZ\x00', _open_xz),
+    (b'\x28\xb5\x2f\xfd', _open_zstd),
+    )
+
+
+class _ThreadedReader(io.RawIOBase):
+    # A raw, read-only stream which reads blocks of data from the wrapped
+    # stream in a background thread, passing them to the reader via a bounded
+    # queue
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, stream, block_size, queue_size):
+        super(_ThreadedReader, self).__init__()
+        self._stream = stream
+        self._block_size = block_size
+        self._queue = queue.Queue(queue_size)
+        self._buffer = b''
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read_stream)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        # Put item in the queue, periodically checking whether the reader has
+        # been closed (in which case nothing will ever take it out)
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                pass
+            else:
+                return True
+        return False
+
+    def _read_stream(self):
+        try:
+            while True:
+                data = self._stream.read(self._block_size)
+                if not self._put(data) or not data:
+                    break
+        except Exception as exc:  # pylint: disable=broad-except
+            # Pass the exception to the reading thread
+            self._put(exc)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self._buffer:
+            if self._eof:
+                return 0
+            data = self._queue.get()
+            if isinstance(data, Exception):
+                self._eof = True
+                raise data
+            if not data:
+                self._eof = True
+                return 0
+            self._buffer = data
+        count = min(len(b), len(self._buffer))
+        b[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super(_ThreadedReader, self).close()
+
+
+def open_log(
+        filename, encoding='utf-8', errors='strict', threaded=True,
+        buffer_size=1024 * 1024, queue_size=8):
+    """
+    Opens the log file *filename* for reading, returning a text-mode
+    file-like object suitable for passing to a source.
+
+    If the file is compressed with any of the formats listed above, the
+    returned object will yield the decompressed content. If *threaded* is
+    True (the default), decompression will be performed by a background
+    thread which reads ahead up to *queue_size* blocks of *buffer_size* bytes.
+    Otherwise, or if the file isn't compressed, content will simply be read
+    in blocks of *buffer_size* bytes.
+
+    :param str filename: The name of the file to open
+    :param str encoding: The encoding of the (decompressed) file content
+    :param str errors: The error handling scheme used for decoding errors
+    :param bool threaded: If True, decompress the file in a separate thread
+    :param int buffer_size: The size of the blocks read from the file
+    :param int queue_size: The maximum number of decompressed blocks waiting
+                           to be read when *threaded* is True
+    :returns: A text-mode file-like object
+    """
+    if buffer_size < 1:
+        raise ValueError('buffer_size must be 1 or more')
+    if queue_size < 1:
+        raise ValueError('queue_size must be 1 or more')
+    with io.open(filename, 'rb') as f:
+        magic = f.read(8)
+    for prefix, opener in MAGIC:
+        if magic.startswith(prefix):
+            stream = opener(filename)
+            if threaded:
+                stream = io.BufferedReader(
+                    _ThreadedReader(stream, buffer_size, queue_size),
+                    buffer_size)
+            return io.TextIOWrapper(stream, encoding, errors)
+    return io.open(
+        filename, 'r', buffering=buffer_size, encoding=encoding,
+        errors=errors)
@@ -0,0 +1,495 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+This module provides multi-process wrappers for the sources in
+:mod:`lars.apache` and :mod:`lars.iis`. These are intended for very large,
+uncompressed log files where parsing in a single process (which is limited to
+a single core) is the bottleneck.
+
+Each source splits the named file into byte ranges (aligned on line endings)
+and parses each range in a separate worker process with the same log format
+and options as the equivalent single-process source. Rows are yielded
+in the order they appear in the file unless the caller indicates that order
+doesn't matter, in which case rows from each range are yielded as soon as the
+range has been parsed.
+
+The *intern*, *url_cache*, and *compact* options of the single-process
+sources are passed to the source in each worker. The *profile* option is not
+supported (each worker would record its own timings) and :exc:`ValueError` is
+raised if it is set.
+
+
+Classes
+=======
+
+.. autoclass:: ParallelApacheSource(filename, log_format=COMMON, fields=None, workers=None, ordered=True, chunk_size=8388608, encoding='utf-8', errors='strict', intern=None, url_cache=False, compact=False)
+    :members:
+
+    .. attribute:: count
+
+        Returns the number of rows successfully read from the source
+
+    .. attribute:: filename
+
+        The name of the file that the source reads rows from
+
+    .. attribute:: log_format
+
+        The Apache LogFormat string that the class will use to decode rows
+
+    .. attribute:: projection
+
+        The sequence of field names that rows will be restricted to, or None if
+        rows include every field in :attr:`log_format`
+
+.. autoclass:: ParallelIISSource(filename, fields=None, timestamp=False, workers=None, ordered=True, chunk_size=8388608, encoding='utf-8', errors='strict', intern=None, url_cache=False, compact=False)
+    :members:
+
+    .. attribute:: count
+
+        Returns the number of rows successfully read from the source
+
+    .. attribute:: filename
+
+        The name of the file that the source reads rows from
+
+    .. attribute:: fields
+
+        A sequence of fields names found in the ``#Fields`` directive in the
+        file header
+
+    .. attribute:: projection
+
+        The sequence of field names that rows will be restricted to, or None if
+        rows include every field in the ``#Fields`` directive
+
+
+Examples
+========
+
+Parallel sources are used in much the same way as their single-process
+equivalents, except that they are given the name of a file rather than a
+file-like object::
+
+    import io
+    from lars import apache, parallel, csv
+
+    with parallel.ParallelApacheSource(
+            '/var/log/apache2/access.log', apache.COMBINED) as source:
+        with io.open('access.csv', 'wb') as outfile:
+            with csv.CSVTarget(outfile) as target:
+                for row in source:
+                    target.write(row)
+
+.. note::
+
+    Because each byte range is decoded separately, the *encoding* of the file
+    must be one in which a newline is always represented by a single ``\\n``
+    byte (e.g. ASCII, Latin-1, or UTF-8, but not UTF-16).
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import io
+import re
+import warnings
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from . import apache, iis
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+# Both ApacheSource and IISSource report warnings in the form "Line N: message"
+# where N is the 1-based line number within whatever they were iterating over;
+# this regex splits such warnings so the line number can be corrected for the
+# offset of the chunk within the file
+_WARNING_RE = re.compile(r'^Line (?P<line>\d+): (?P<message>.*)$', re.DOTALL)
+
+
+def _check_profile(profile):
+    # Workers can't report the timings recorded by their sources, so profiling
+    # is rejected rather than silently ignored
+    if profile:
+        raise ValueError('profile is not supported by parallel sources')
+
+
+def _intern_arg(intern):
+    # Converts the intern option of a source to a picklable value
+    if intern is None or intern is True:
+        return intern
+    return tuple(intern)
+
+
+def _read_lines(filename, start, end, encoding, errors):
+    # Read the byte range [start, end) from filename and return it as a list of
+    # decoded lines, treating newlines exactly as io.open() would
+    with io.open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return list(io.TextIOWrapper(io.BytesIO(data), encoding, errors))
+
+
+def _parse_chunk(cls, args, header, filename, start, end, encoding, errors):
+    # This is the function executed by worker processes. It constructs a source
+    # of the specified class over the lines of the chunk and returns a tuple of
+    # (number of lines, rows, warnings, error). Rows are returned as plain
+    # tuples because the row types are constructed dynamically and hence can't
+    # be pickled. Warnings are returned as (line, message) tuples, and any
+    # error as a (class, message, line) tuple, with line numbers relative to
+    # the start of the chunk. Errors are not simply raised as they lose their
+    # line_number attribute when pickled
+    lines = _read_lines(filename, start, end, encoding, errors)
+    source = cls(lines, *args)
+    for line in header:
+        source._process_directive(line)  # pylint: disable=protected-access
+    rows = []
+    error = None
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        try:
+            for row in source:
+                rows.append(tuple(row))
+        except (apache.ApacheError, iis.IISError) as exc:
+            error = (type(exc), exc.args[0], exc.line_number)
+    warns = []
+    for warning in caught:
+        match = _WARNING_RE.match(str(warning.message))
+        if match:
+            warns.append((int(match.group('line')), match.group('message')))
+        else:
+            warns.append((0, str(warning.message)))  # pragma: no cover
+    return len(lines), rows, warns, error
+
+
+class ParallelSource(object):
+    """
+    Base class for multi-process sources.
+
+    This class is responsible for splitting the file into chunks, dispatching
+    those chunks to worker processes and reassembling the results. Descendents
+    must override :meth:`_source_args` to return the arguments for the
+    single-process source constructed by each worker, and :meth:`_prepare`
+    which is called at the start of iteration and must ensure the
+    :attr:`_row_type` and :attr:`_header` attributes are configured.
+
+    :param str filename: The name of the file to read rows from
+    :param int workers: The number of worker processes to use; defaults to the
+                        number of CPUs in the machine
+    :param bool ordered: If True (the default), yield rows in the order they
+                         appear in the file
+    :param int chunk_size: The approximate size in bytes of the ranges the
+                           file is split into
+    :param str encoding: The encoding of the file
+    :param str errors: The error handling scheme used for decoding errors
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    source_class = None
+    warning_class = None
+
+    def __init__(
+            self, filename, workers=None, ordered=True,
+            chunk_size=8 * 1024 * 1024, encoding='utf-8', errors='strict'):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers < 1:
+            raise ValueError('workers must be 1 or more')
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be 1 or more')
+        self.filename = filename
+        self.workers = workers
+        self.ordered = ordered
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.errors = errors
+        self.count = 0
+        self._row_type = None
+        self._header = ()
+
+    def __enter__(self):
+        logging.debug('Entering parallel context')
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        logging.debug('Exiting parallel context')
+        self.close()
+
+    def close(self):
+        """
+        Close the source; attempting to read further rows is not permitted
+        after this method is called.
+        """
+        logging.debug('Closing parallel source')
+        self.filename = None
+
+    def _prepare(self):
+        raise NotImplementedError
+
+    def _source_args(self):
+        raise NotImplementedError
+
+    def _chunks(self):
+        # Split the file into byte ranges of approximately chunk_size bytes,
+        # extending each range to the end of the line it finishes in
+        with io.open(self.filename, 'rb') as f:
+            f.seek(0, io.SEEK_END)
+            size = f.tell()
+            start = 0
+            while start < size:
+                end = start + self.chunk_size
+                if end < size:
+                    f.seek(end - 1)
+                    f.readline()
+                    end = f.tell()
+                else:
+                    end = size
+                yield start, end
+                start = end
+
+    def _results(self, executor):
+        # Submit chunks to the executor, keeping no more than twice as many in
+        # flight as there are workers (to bound memory use), and yield
+        # (start, end, result) tuples as they complete (in order if requested)
+        chunks = iter(self._chunks())
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < self.workers * 2:
+                    try:
+                        start, end = next(chunks)
+                    except StopIteration:
+                        break
+                    # The first chunk contains the header itself so there's
+                    # no need to hand it over separately
+                    future = executor.submit(
+                        _parse_chunk, self.source_class, self._source_args(),
+                        self._header if start else (), self.filename,
+                        start, end, self.encoding, self.errors)
+                    future.chunk = (start, end)
+                    pending.append(future)
+                if not pending:
+                    break
+                if self.ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    start, end = future.chunk
+                    yield start, end, future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def __iter__(self):
+        """
+        Yields a row tuple for each line in the file.
+
+        Warnings and errors raised by the worker processes are re-raised in
+        the calling process. When rows are yielded in order, the line numbers
+        reported are relative to the start of the file (exactly as with the
+        single-process sources). Otherwise, line numbers are relative to the
+        start of the chunk, and the byte range of the chunk is included in the
+        message.
+        """
+        self._prepare()
+        make_row = self._row_type._make
+        line_offset = 0
+        with ProcessPoolExecutor(self.workers) as executor:
+            for start, end, (lines, rows, warns, error) in self._results(
+                    executor):
+                if self.ordered:
+                    prefix = ''
+                    offset = line_offset
+                else:
+                    prefix = 'Bytes %d-%d: ' % (start, end)
+                    offset = 0
+                for line, message in warns:
+                    warnings.warn(self.warning_class(
+                        '%sLine %d: %s' % (prefix, line + offset, message)))
+                for row in rows:
+                    self.count += 1
+                    yield make_row(row)
+                if error is not None:
+                    exc_class, message, line = error
+                    raise exc_class(
+                        prefix + message,
+                        line_number=line + offset if line else None)
+                line_offset += lines
+
+
+class ParallelApacheSource(ParallelSource):
+    """
+    Wraps a file containing an Apache formatted log file, parsing it with
+    multiple processes.
+
+    Rows are identical to those yielded by :class:`~lars.apache.ApacheSource`
+    with the same *log_format*, *fields*, *intern*, *url_cache*, and
+    *compact* parameters (lazy rows are not supported as the expensive
+    conversions would simply be deferred to the calling process, and
+    *profile* is not supported).
+
+    :param str filename: The name of the file to read rows from
+    :param str log_format: Defaults to :data:`~lars.apache.COMMON` but can be
+                           set to any valid Apache LogFormat string
+    :param fields: An optional sequence of the field names to include in rows
+    :param int workers: The number of worker processes to use; defaults to the
+                        number of CPUs in the machine
+    :param bool ordered: If True (the default), yield rows in the order they
+                         appear in the file
+    :param int chunk_size: The approximate size in bytes of the ranges the
+                           file is split into
+    :param str encoding: The encoding of the file
+    :param str errors: The error handling scheme used for decoding errors
+    :param intern: An optional sequence of the field names to intern (or
+                   True for :attr:`~lars.apache.ApacheSource.INTERN_FIELDS`)
+    :param bool url_cache: If True, cache the construction of URL fields
+    :param bool compact: If True, use compact representations of addresses
+    :param profile: Must be False; profiling is not supported
+    """
+
+    source_class = apache.ApacheSource
+    warning_class = apache.ApacheWarning
+
+    def __init__(
+            self, filename, log_format=apache.COMMON, fields=None,
+            workers=None, ordered=True, chunk_size=8 * 1024 * 1024,
+            encoding='utf-8', errors='strict', intern=None, url_cache=False,
+            compact=False, profile=False):
+        # pylint: disable=too-many-arguments
+        _check_profile(profile)
+        super(ParallelApacheSource, self).__init__(
+            filename, workers, ordered, chunk_size, encoding, errors)
+        self.log_format = log_format
+        self.projection = tuple(fields) if fields is not None else None
+        self.intern = _intern_arg(intern)
+        self.url_cache = url_cache
+        self.compact = compact
+        # Construct a source in this process too; this validates the format,
+        # fields, and options up front and gives us the row type
+        source = apache.ApacheSource(
+            None, log_format, self.projection, intern=self.intern,
+            url_cache=url_cache, compact=compact)
+        self._row_type = source._row_type  # pylint: disable=protected-access
+
+    def _prepare(self):
+        pass
+
+    def _source_args(self):
+        return (
+            self.log_format, self.projection, False, self.intern,
+            self.url_cache, self.compact)
+
+
+class ParallelIISSource(ParallelSource):
+    """
+    Wraps a file containing a IIS formatted log file, parsing it with multiple
+    processes.
+
+    The directives at the start of the file (which must include ``#Version``
+    and ``#Fields``) are read by the calling process at the start of
+    iteration, and handed to each worker so that every chunk is parsed with
+    the same fields. Rows are identical to those yielded by
+    :class:`~lars.iis.IISSource` with the same *fields*, *timestamp*,
+    *intern*, *url_cache*, and *compact* parameters (*profile* is not
+    supported).
+
+    :param str filename: The name of the file to read rows from
+    :param fields: An optional sequence of the field names to include in rows
+    :param bool timestamp: If True, combine the date and time fields into a
+                           single timestamp field
+    :param int workers: The number of worker processes to use; defaults to the
+                        number of CPUs in the machine
+    :param bool ordered: If True (the default), yield rows in the order they
+                         appear in the file
+    :param int chunk_size: The approximate size in bytes of the ranges the
+                           file is split into
+    :param str encoding: The encoding of the file
+    :param str errors: The error handling scheme used for decoding errors
+    :param intern: An optional sequence of the field names to intern (or
+                   True for :attr:`~lars.iis.IISSource.INTERN_FIELDS`)
+    :param bool url_cache: If True, cache the construction of URL fields
+    :param bool compact: If True, use compact representations of addresses
+    :param profile: Must be False; profiling is not supported
+    """
+
+    source_class = iis.IISSource
+    warning_class = iis.IISWarning
+
+    def __init__(
+            self, filename, fields=None, timestamp=False, workers=None,
+            ordered=True, chunk_size=8 * 1024 * 1024, encoding='utf-8',
+            errors='strict', intern=None, url_cache=False, compact=False,
+            profile=False):
+        # pylint: disable=too-many-arguments
+        _check_profile(profile)
+        super(ParallelIISSource, self).__init__(
+            filename, workers, ordered, chunk_size, encoding, errors)
+        self.projection = tuple(fields) if fields is not None else None
+        self.timestamp = timestamp
+        self.intern = _intern_arg(intern)
+        self.url_cache = url_cache
+        self.compact = compact
+        self.fields = []
+
+    def _prepare(self):
+        # Read the directives at the start of the file; these are processed
+        # by a local IISSource (to validate them and obtain the row type) and
+        # passed to the workers for every chunk but the first
+        header = []
+        source = iis.IISSource(None, *self._source_args())
+        with io.open(self.filename, 'rb') as f:
+            while True:
+                line = f.readline().decode(self.encoding, self.errors)
+                if not line.startswith('#'):
+                    break
+                header.append(line.rstrip())
+                try:
+                    source._process_directive(header[-1])  # pylint: disable=protected-access
+                except iis.IISError as exc:
+                    raise type(exc)(
+                        exc.args[0], line_number=len(header), line=line)
+        if source.version is None:
+            raise iis.IISVersionError('Missing #Version directive before data')
+        if not source.fields:
+            raise iis.IISFieldsError('Missing #Fields directive before data')
+        self.fields = source.fields
+        self._header = tuple(header)
+        self._row_type = source._row_type  # pylint: disable=protected-access
+
+    def _source_args(self):
+        return (
+            self.projection, self.timestamp, self.intern, self.url_cache,
+            self.compact)
@@ -35,6 +35,8 @@ from __future__ import (
     division,
     )
 
+import re
+
 from lars import datatypes as dt
 
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
@@ -76,6 +78,9 @@ INTEGER = r'(?P<%(name)s>-|\d+)'
 FIXED = r'(?P<%(name)s>-|\d+(\.\d*)?)'
 DATE_ISO = r'(?P<%(name)s>-|\d{4}-\d{2}-\d{2})'
 TIME_ISO = r'(?P<%(name)s>-|\d{2}:\d{2}:\d{2})'
+DATETIME_ISO = (
+    r'(?P<%(name)s>-\s+-|\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})'
+)
 
 # The reason for the empty "-" production appearing on the right is due to an
 # issue with disjuncts in Perl-style regex implementations, see
@@ -108,6 +113,93 @@ ADDRESS_PORT = (
 )
 
 
+# This regex matches the named group that opens every pattern above (after
+# substitution of the field name); see non_capturing below
+
+_NAMED_GROUP = re.compile(r'^\(\?P<[^>]+>')
+
+
+def non_capturing(pattern):
+    """
+    Convert a field pattern into its non-capturing equivalent.
+
+    Given one of the patterns above (after the field name has been substituted
+    into it), this function returns an equivalent pattern in which the outer
+    named group is replaced by a non-capturing group. This is used by sources
+    to match fields which the caller has not asked for without the overhead
+    of capturing (and subsequently converting) them.
+
+    :param str pattern: The field pattern to convert
+    :returns: The pattern with its outer group made non-capturing
+    """
+    result, count = _NAMED_GROUP.subn('(?:', pattern, count=1)
+    if not count:
+        raise ValueError('Pattern %s does not begin with a named group' %
+                         pattern)
+    return result
+
+
+def bytes_pattern(pattern, encoding='utf-8'):
+    """
+    Convert a compiled row regex into its bytes equivalent.
+
+    This is used by the memory-mapped parsing methods of the sources, which
+    match the bytes of each line directly rather than decoding whole lines
+    first. The *encoding* must be ASCII compatible (e.g. UTF-8 or Latin-1) as
+    the regex syntax is encoded with it. A leading ``^`` anchor is removed as
+    the resulting pattern is intended for use with ``match(buf, pos,
+    endpos)`` (which is implicitly anchored at *pos*, whereas ``^`` only
+    matches at the start of the buffer).
+
+    :param pattern: The compiled :class:`str` regex to convert
+    :param str encoding: The encoding of the data the regex will match
+    :returns: The equivalent compiled bytes regex
+    """
+    source = pattern.pattern
+    if source.startswith('^'):
+        source = source[1:]
+    return re.compile(source.encode(encoding), pattern.flags & ~re.UNICODE)
+
+
+def interned(parser, size=1000):
+    """
+    Wrap a parsing function so that repeated values share one result.
+
+    The returned function keeps a dictionary (of at most *size* entries)
+    mapping strings to the results of *parser*. When a string is parsed again
+    the existing result is returned instead of constructing a new (but equal)
+    object, which is both quicker and reduces the memory used by rows that
+    are retained. This is only useful for fields with few distinct values
+    (e.g. the HTTP method or status), and is only safe for parsers that
+    return values which are never modified, as a change to one shared value
+    is seen by every row holding it. Note that the address and hostname
+    parsers in this module return objects with writable attributes (such as
+    :attr:`~lars.datatypes.IPv4Port.port`). When the dictionary is full it is
+    simply cleared.
+
+    :param parser: The parsing function to wrap
+    :param int size: The maximum number of distinct values to retain
+    :returns: The wrapped parsing function
+    """
+    if size < 1:
+        raise ValueError('size must be 1 or more')
+    cache = {}
+
+    def parse(s):
+        # pylint: disable=missing-docstring
+        try:
+            return cache[s]
+        except KeyError:
+            pass
+        result = parser(s)
+        if len(cache) >= size:
+            cache.clear()
+        cache[s] = result
+        return result
+
+    return parse
+
+
 def request_parse(s):
     """
     Parse an HTTP request line in a log file.
@@ -140,6 +232,20 @@ def url_parse(s):
     return dt.url(s) if s not in ('-', '') else None
 
 
+def cached_url_parse(s):
+    """
+    Parse a URL string in a log file, caching the result.
+
+    This is equivalent to :func:`url_parse` but uses
+    :func:`~lars.datatypes.cached_url` to construct the result. Sources use
+    this in place of :func:`url_parse` when their *url_cache* option is set.
+
+    :param str s: The string containing the URI to parse
+    :returns: A :class:`~lars.datatypes.Url` tuple representing the URL
+    """
+    return dt.cached_url(s) if s not in ('-', '') else None
+
+
 def path_parse(s):
     """
     Parse a POSIX-style (slash separated) path string in a log file.
@@ -200,6 +306,75 @@ def time_parse(s, format='%H:%M:%S'):
     return dt.time(s, format) if s != '-' else None
 
 
+def date_iso_parse(s):
+    """
+    Parse an ISO formatted (YYYY-MM-DD) date string in a log file.
+
+    This is equivalent to :func:`date_parse` with the default format, but is
+    considerably faster as it doesn't use the generic strptime(3) machinery.
+
+    :param str s: The string containing the date to parse
+    :returns: A :class:`~lars.datatypes.Date` object representing the date
+    """
+    if s == '-':
+        return None
+    digits = s[0:4] + s[5:7] + s[8:10]
+    if len(s) != 10 or s[4] != '-' or s[7] != '-' or not digits.isdigit():
+        raise ValueError('Invalid ISO date %s' % s)
+    return dt.Date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+
+def time_iso_parse(s):
+    """
+    Parse an ISO formatted (HH:MM:SS) time string in a log file.
+
+    This is equivalent to :func:`time_parse` with the default format, but is
+    considerably faster as it doesn't use the generic strptime(3) machinery.
+
+    :param str s: The string containing the time to parse
+    :returns: A :class:`~lars.datatypes.Time` object representing the time
+    """
+    if s == '-':
+        return None
+    digits = s[0:2] + s[3:5] + s[6:8]
+    if len(s) != 8 or s[2] != ':' or s[5] != ':' or not digits.isdigit():
+        raise ValueError('Invalid ISO time %s' % s)
+    return dt.Time(int(s[0:2]), int(s[3:5]), int(s[6:8]))
+
+
+def datetime_iso_parse(s):
+    """
+    Parse an ISO formatted (YYYY-MM-DD HH:MM:SS) timestamp string in a log
+    file. The date and time portions may be separated by any amount of
+    whitespace.
+
+    :param str s: The string containing the timestamp to parse
+    :returns: A :class:`~lars.datatypes.DateTime` object representing the
+              timestamp
+    """
+    # pylint: disable=redefined-outer-name
+    if len(s) == 19 and s[10] == ' ':
+        date, time = s[:10], s[11:]
+    else:
+        try:
+            date, time = s.split()
+        except ValueError:
+            raise ValueError('Invalid ISO timestamp %s' % s)
+        if date == time == '-':
+            return None
+    digits = (
+        date[0:4] + date[5:7] + date[8:10] +
+        time[0:2] + time[3:5] + time[6:8])
+    if (
+            len(date) != 10 or date[4] != '-' or date[7] != '-' or
+            len(time) != 8 or time[2] != ':' or time[5] != ':' or
+            not digits.isdigit()):
+        raise ValueError('Invalid ISO timestamp %s' % s)
+    return dt.DateTime(
+        int(date[0:4]), int(date[5:7]), int(date[8:10]),
+        int(time[0:2]), int(time[3:5]), int(time[6:8]))
+
+
 def hostname_parse(s):
     """
     Parse a DNS name in a log format.
@@ -218,3 +393,35 @@ def address_parse(s):
     :returns: A :class:`~lars.datatypes.IPv4Address` value
     """
     return dt.address(s) if s != '-' else None
+
+
+def compact_address_parse(s):
+    """
+    Parse an IPv4 or IPv6 address (and optional port) in a log file,
+    returning a compact representation.
+
+    This is equivalent to :func:`address_parse` but uses
+    :func:`~lars.datatypes.compact_address` to construct the result. Sources
+    use this in place of :func:`address_parse` when their *compact* option is
+    set.
+
+    :param str s: The string containing the address to parse
+    :returns: A :class:`~lars.datatypes.CompactIPv4Address` value
+    """
+    return dt.compact_address(s) if s != '-' else None
+
+
+def compact_hostname_parse(s):
+    """
+    Parse a DNS name in a log format, returning a compact representation of
+    any address.
+
+    This is equivalent to :func:`hostname_parse` but uses
+    :func:`~lars.datatypes.compact_hostname` to construct the result. Sources
+    use this in place of :func:`hostname_parse` when their *compact* option
+    is set.
+
+    :param str s: The string containing the DNS name to parse
+    :returns: A :class:`~lars.datatypes.Hostname` value
+    """
+    return dt.compact_hostname(s) if s != '-' else None
@@ -134,7 +134,7 @@ try:
 except ImportError:
     import ipaddr as ipaddress
 
-from . import datatypes
+from . import datatypes, timing
 from .exc import LarsError, LarsWarning
 
 str = type('')  # pylint: disable=redefined-builtin,invalid-name
@@ -277,6 +277,11 @@ class SQLTarget(object):
     table before attempting ``CREATE TABLE``. If *ignore_drop_errors* is
     True (which it is by default) then any errors encountered during the drop
     operation (e.g. if the table does not exist) will be ignored.
+
+    If *profile* is True (or a :class:`~lars.timing.Profile` instance), the
+    time spent executing ``INSERT`` and ``COMMIT`` statements is recorded in
+    the :attr:`profile` attribute, and a summary is logged when the target is
+    closed; see :mod:`lars.timing` for details.
     """
     # pylint: disable=too-many-instance-attributes
 
@@ -286,7 +291,8 @@ class SQLTarget(object):
             str_type='VARCHAR(1000)', int_type='INTEGER', fixed_type='DOUBLE',
             bool_type='SMALLINT', date_type='DATE', time_type='TIME',
             datetime_type='TIMESTAMP', ip_type='VARCHAR(53)',
-            hostname_type='VARCHAR(255)', path_type='VARCHAR(260)'):
+            hostname_type='VARCHAR(255)', path_type='VARCHAR(260)',
+            profile=False):
         # pylint: disable=too-many-arguments,too-many-locals
         if not hasattr(db_module, 'paramstyle'):
             raise NameError('The database module has no "paramstyle" global')
@@ -328,15 +334,24 @@ class SQLTarget(object):
             datatypes.IPv6Address: ip_type,
             datatypes.IPv4Port:    ip_type,
             datatypes.IPv6Port:    ip_type,
+            datatypes.CompactIPv4Address: ip_type,
+            datatypes.CompactIPv6Address: ip_type,
+            datatypes.CompactIPv4Port: ip_type,
+            datatypes.CompactIPv6Port: ip_type,
             datatypes.Hostname:    hostname_type,
             datatypes.Path:        path_type,
             }
+        self.profile = timing.make_profile(profile)
         self.count = 0
         self._buffer = []
         self._first_row = None
         self._row_casts = None
         self._cursor = None
         self._statement = None
+        self._execute = None
+        self._executemany = None
+        self._commit = timing.instrument(
+            self.profile, 'commit', self.connection.commit)
 
     def __enter__(self):
         logging.debug('Entering SQL context')
@@ -381,7 +396,7 @@ class SQLTarget(object):
 
     def _insert_buffer(self):
         try:
-            self._cursor.execute(self._statement, [
+            self._execute(self._statement, [
                 value
                 for params in self._buffer
                 for value in params
@@ -456,47 +471,62 @@ class SQLTarget(object):
             for value in row
         ]
 
-    def write(self, row):
-        """
-        Write *row* (a tuple of values) to the table specified in the
-        constructor. If this is the first row written, and *create_table* was
-        set to ``True`` in the constructor, this operation will also attempt to
-        create the table (optionally dropping any existing table, again
-        depending on constructor values).
-        """
+    def _prepare(self, row):
+        # Called with the first row written to configure the cursor, INSERT
+        # statement, and casts, and optionally to drop and create the table
+        logging.debug('First row')
+        self._first_row = row
+        self.count = 0
+        logging.debug('Constructing cursor')
+        self._cursor = self.connection.cursor()
+        self._execute = timing.instrument(
+            self.profile, 'insert', self._cursor.execute)
+        self._executemany = timing.instrument(
+            self.profile, 'insert', self._cursor.executemany)
+        logging.debug('Constructing INSERT statement')
+        self._statement = self._generate_statement(row, self.insert)
+        logging.debug(
+            self._statement[:120] +
+            ('...' if len(self._statement) > 120 else '')
+        )
+        logging.debug('Constructing row casts')
+        self._row_casts = self._generate_row_casts(row)
+        if self.drop_table:
+            try:
+                self._drop_table()
+            except self.db_module.Error as exc:
+                if not self.ignore_drop_errors:
+                    raise SQLError(str(exc))
+                logging.debug('While dropping table %s occurred', str(exc))
+        if self.create_table:
+            self._create_table(row)
+
+    def _cast_row(self, row):
+        # Checks *row* against the first row written (or prepares the target
+        # if this is the first row), and returns the list of its values cast
+        # for insertion
         if self._first_row:
             if len(row) != len(self._first_row):
                 raise TypeError('Rows must have the same number of elements')
         else:
-            logging.debug('First row')
-            self._first_row = row
-            self.count = 0
-            logging.debug('Constructing cursor')
-            self._cursor = self.connection.cursor()
-            logging.debug('Constructing INSERT statement')
-            self._statement = self._generate_statement(row, self.insert)
-            logging.debug(
-                self._statement[:120] +
-                ('...' if len(self._statement) > 120 else '')
-            )
-            logging.debug('Constructing row casts')
-            self._row_casts = self._generate_row_casts(row)
-            if self.drop_table:
-                try:
-                    self._drop_table()
-                except self.db_module.Error as exc:
-                    if not self.ignore_drop_errors:
-                        raise SQLError(str(exc))
-                    logging.debug('While dropping table %s occurred', str(exc))
-            if self.create_table:
-                self._create_table(row)
+            self._prepare(row)
         # XXX What about paramstyles pyformat and named? Eurgh...
-        self._buffer.append([
+        return [
             None if value is None else
             cast(value) if cast is not None else
             value
             for (cast, value) in zip(self._row_casts, row)
-        ])
+        ]
+
+    def write(self, row):
+        """
+        Write *row* (a tuple of values) to the table specified in the
+        constructor. If this is the first row written, and *create_table* was
+        set to ``True`` in the constructor, this operation will also attempt to
+        create the table (optionally dropping any existing table, again
+        depending on constructor values).
+        """
+        self._buffer.append(self._cast_row(row))
         if len(self._buffer) >= self.insert:
             try:
                 self._insert_buffer()
@@ -508,7 +538,50 @@ class SQLTarget(object):
                 raise SQLError(str(exc))
             if (self.count % self.commit) == 0:
                 logging.debug('COMMIT')
-                self.connection.commit()
+                self._commit()
+
+    def write_many(self, rows):
+        """
+        Write each of the tuples in the sequence *rows* to the table specified
+        in the constructor. This is equivalent to calling :meth:`write` for
+        each row (including the creation of the table with the first row),
+        but is considerably faster as the rows are passed to the database with
+        the cursor's ``executemany`` method. Rows are still inserted *insert*
+        at a time, and committed every *commit* rows.
+
+        Note that if an error occurs, the :exc:`SQLError` raised will not
+        indicate which row caused it.
+        """
+        for row in rows:
+            self._buffer.append(self._cast_row(row))
+        while len(self._buffer) >= self.insert:
+            # Insert as many whole statements as possible, but don't cross a
+            # commit boundary in a single call. Note that count is always a
+            # multiple of insert here, and commit is too
+            count = min(
+                len(self._buffer) // self.insert * self.insert,
+                self.commit - (self.count % self.commit))
+            batch = self._buffer[:count]
+            # As in _insert_buffer, rows are removed from the buffer even if
+            # an error occurs
+            del self._buffer[:count]
+            if self.insert > 1:
+                batch = [
+                    [
+                        value
+                        for params in batch[i:i + self.insert]
+                        for value in params
+                    ]
+                    for i in range(0, count, self.insert)
+                ]
+            try:
+                self._executemany(self._statement, batch)
+            except self.db_module.Error as exc:
+                raise SQLError(str(exc))
+            self.count += count
+            if (self.count % self.commit) == 0:
+                logging.debug('COMMIT')
+                self._commit()
 
     def close(self):
         """
@@ -529,11 +602,15 @@ class SQLTarget(object):
         logging.debug('Closing cursor')
         self._cursor.close()
         self._cursor = None
+        self._execute = None
+        self._executemany = None
         self._first_row = None
         self._row_casts = None
         self._statement = None
         logging.debug('COMMIT')
-        self.connection.commit()
+        self._commit()
+        if self.profile is not None:
+            logging.info('SQL target profile:\n%s', self.profile.summary())
 
 
 class OracleTarget(SQLTarget):
@@ -554,12 +631,14 @@ class OracleTarget(SQLTarget):
             str_type='VARCHAR2(1000)', int_type='NUMBER(10)',
             fixed_type='NUMBER', bool_type='NUMBER(1)', date_type='DATE',
             time_type='DATE', datetime_type='DATE', ip_type='VARCHAR2(53)',
-            hostname_type='VARCHAR2(255)', path_type='VARCHAR2(260)'):
+            hostname_type='VARCHAR2(255)', path_type='VARCHAR2(260)',
+            profile=False):
         # pylint: disable=too-many-arguments,too-many-locals
         super(OracleTarget, self).__init__(
             db_module, connection, table, insert, commit, create_table,
             drop_table, ignore_drop_errors, str_type, bool_type, date_type,
-            time_type, datetime_type, ip_type, hostname_type, path_type
+            time_type, datetime_type, ip_type, hostname_type, path_type,
+            profile=profile
         )
 
     def _generate_statement(self, row, count=1):
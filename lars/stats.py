@@ -0,0 +1,243 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+This module provides a registry of the caches used by lars, so that their
+effectiveness can be measured (e.g. to size them appropriately for a
+production workload). Each cache in lars registers itself under a dotted name
+when its module is imported:
+
+======================= =======================================================
+Name                    Cache
+======================= =======================================================
+``apache.compile``      Compiled LogFormat strings of
+                        :class:`~lars.apache.ApacheSource`
+``apache.time``         Parsed ``%t`` timestamps
+``apache.time_format``  Parsed ``%{format}t`` timestamps
+``datatypes.address``   :func:`~lars.datatypes.cached_address`
+``datatypes.hostname``  :func:`~lars.datatypes.cached_hostname`
+``datatypes.url``       :func:`~lars.datatypes.cached_url`
+``dns.from_address``    :func:`~lars.dns.from_address`
+``dns.to_address``      :func:`~lars.dns.to_address`
+``geoip.query``         GeoIP database query results
+``geoip.store``         The persistent GeoIP cache (when configured)
+``iis.compile``         Compiled ``#Fields`` directives of
+                        :class:`~lars.iis.IISSource`
+``strptime.regex``      Compiled strptime format regexes
+======================= =======================================================
+
+The :func:`snapshot` function returns the statistics of every registered
+cache, and the :func:`reset` function resets them (without discarding the
+content of the caches). Statistics a cache does not record are reported as
+None; for example, the strptime regex cache (which is usually the one in
+Python's own :mod:`_strptime` module) only reports its size.
+
+Applications can register their own caches with :func:`register`.
+
+
+Functions
+=========
+
+.. autofunction:: snapshot
+
+.. autofunction:: reset
+
+.. autofunction:: register
+
+.. autofunction:: unregister
+
+
+Classes
+=======
+
+.. autoclass:: CacheStats
+
+.. autoclass:: Counters
+    :members:
+
+
+Examples
+========
+
+To report the hit rate of every active cache after processing a log::
+
+    from lars import apache, stats
+
+    stats.reset()
+    with apache.ApacheSource(infile) as source:
+        for row in source:
+            pass
+    for name, cache in stats.snapshot().items():
+        if cache.hits is not None and cache.hits + cache.misses:
+            print('%s: %.1f%%' % (
+                name, 100 * cache.hits / (cache.hits + cache.misses)))
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import time
+from collections import namedtuple, OrderedDict
+from threading import Lock
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+
+class CacheStats(namedtuple('CacheStats', (
+        'hits', 'misses', 'evictions', 'currsize', 'maxsize', 'miss_time'))):
+    """
+    Represents the statistics of a cache.
+
+    .. attribute:: hits
+
+        The number of lookups which found a result in the cache
+
+    .. attribute:: misses
+
+        The number of lookups which did not find a result in the cache
+
+    .. attribute:: evictions
+
+        The number of entries discarded to make room for others
+
+    .. attribute:: currsize
+
+        The number of entries currently in the cache
+
+    .. attribute:: maxsize
+
+        The maximum number of entries in the cache (None if unbounded)
+
+    .. attribute:: miss_time
+
+        The total number of seconds spent calculating results which were not
+        found in the cache
+    """
+    __slots__ = ()
+
+
+class Counters(object):
+    """
+    Holds the counters of a cache. Caches increment the attributes of an
+    instance of this class directly (without any locking, so counts are
+    approximate when a cache is used by several threads at once).
+
+    .. attribute:: hits
+    .. attribute:: misses
+    .. attribute:: evictions
+    .. attribute:: miss_time
+
+        See the attributes of the same names in :class:`CacheStats`
+    """
+    __slots__ = ('hits', 'misses', 'evictions', 'miss_time')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Resets all counters to zero.
+        """
+        self.hits = self.misses = self.evictions = 0
+        self.miss_time = 0.0
+
+    def stats(self, currsize, maxsize):
+        """
+        Returns a :class:`CacheStats` tuple of the counters, and the
+        specified *currsize* and *maxsize*.
+        """
+        return CacheStats(
+            self.hits, self.misses, self.evictions, currsize, maxsize,
+            self.miss_time)
+
+
+_REGISTRY = {}
+_REGISTRY_LOCK = Lock()
+
+
+def register(name, stats, reset):
+    """
+    Registers a cache under *name*, replacing any cache previously registered
+    under that name.
+
+    The *stats* callable must return a :class:`CacheStats` tuple of the
+    cache's current statistics, or None if the cache is not currently in use
+    (in which case it is omitted from :func:`snapshot`). The *reset* callable
+    must reset the cache's statistics, but should not discard its content.
+
+    :param str name: The name of the cache
+    :param stats: A callable returning the statistics of the cache
+    :param reset: A callable resetting the statistics of the cache
+    """
+    with _REGISTRY_LOCK:
+        _REGISTRY[name] = (stats, reset)
+
+
+def unregister(name):
+    """
+    Removes the cache registered under *name*. Raises :exc:`KeyError` if no
+    cache is registered under *name*.
+
+    :param str name: The name of the cache
+    """
+    with _REGISTRY_LOCK:
+        del _REGISTRY[name]
+
+
+def snapshot():
+    """
+    Returns an :class:`~collections.OrderedDict` mapping the names of all
+    registered caches (in sorted order) to :class:`CacheStats` tuples of their
+    current statistics.
+    """
+    with _REGISTRY_LOCK:
+        registry = sorted(_REGISTRY.items())
+    result = OrderedDict()
+    for name, (stats, _) in registry:
+        cache_stats = stats()
+        if cache_stats is not None:
+            result[name] = cache_stats
+    return result
+
+
+def reset():
+    """
+    Resets the statistics of all registered caches. The content of the caches
+    is not affected.
+    """
+    with _REGISTRY_LOCK:
+        registry = list(_REGISTRY.values())
+    for _, reset_stats in registry:
+        reset_stats()
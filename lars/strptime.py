@@ -69,6 +69,10 @@ from __future__ import (
     division,
     )
 
+import sys
+
+from .stats import CacheStats, register
+
 try:
     from _strptime import TimeRE, _strptime_datetime
 except ImportError:
@@ -561,3 +565,17 @@ except ImportError:
 
         return cls(*args)
 
+
+def _regex_cache_stats():
+    # The regex cache belongs to whichever module implements strptime (usually
+    # Python's own _strptime module) and only its size can be observed
+    module = sys.modules[_strptime_datetime.__module__]
+    cache = getattr(module, '_regex_cache', None)
+    if cache is None:
+        return None
+    return CacheStats(
+        None, None, None, len(cache), getattr(module, '_CACHE_MAX_SIZE', None),
+        None)
+
+
+register('strptime.regex', _regex_cache_stats, lambda: None)
@@ -0,0 +1,290 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+This module provides the :class:`Profile` class which records the time spent
+in each stage of processing a log. Sources (:class:`~lars.apache.ApacheSource`
+and :class:`~lars.iis.IISSource`) and targets (:class:`~lars.csv.CSVTarget`
+and :class:`~lars.sql.SQLTarget`) accept a *profile* parameter; when this is
+True (or a :class:`Profile` instance) they record the following stages:
+
+================= ===========================================================
+Stage             Time spent
+================= ===========================================================
+``match``         Matching the row regex against each line (sources)
+``parse.<field>`` Converting the named field with its parser (sources)
+``row``           Constructing each row tuple (sources)
+``write``         Writing rows (:class:`~lars.csv.CSVTarget`)
+``insert``        Inserting rows (:class:`~lars.sql.SQLTarget`)
+``commit``        Committing transactions (:class:`~lars.sql.SQLTarget`)
+================= ===========================================================
+
+The profile is available as the ``profile`` attribute of the source or target
+(which is None when profiling is disabled), and a summary table of it is
+logged (at INFO level) when the source or target is closed. A single
+:class:`Profile` may be passed to several sources and targets to accumulate
+the times of an entire job. Other stages (like transformations performed by
+the script itself) can be timed with :meth:`Profile.time`.
+
+Profiling is opt-in as timing every field of every row is expensive; expect
+processing to be several times slower when it is enabled. Measuring CPU time
+in particular is relatively costly, and can be disabled with the *cpu*
+parameter of :class:`Profile`. When profiling is disabled, no timing code is
+executed at all.
+
+
+Classes
+=======
+
+.. autoclass:: Profile
+    :members:
+
+.. autoclass:: StageTime
+
+
+Examples
+========
+
+To determine whether parsing or writing dominates the time taken to convert
+an Apache log to CSV::
+
+    import io
+    import logging
+    from lars import apache, csv, timing
+
+    logging.basicConfig(level=logging.INFO)
+    profile = timing.Profile()
+    with io.open('/var/log/apache2/access.log', 'r') as infile:
+        with io.open('access.csv', 'wb') as outfile:
+            with apache.ApacheSource(infile, profile=profile) as source:
+                with csv.CSVTarget(outfile, profile=profile) as target:
+                    for row in source:
+                        with profile.time('transform'):
+                            row = row._replace(remote_host=None)
+                        target.write(row)
+    print(profile.summary())
+"""
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .stats import timer
+
+str = type('')  # pylint: disable=redefined-builtin,invalid-name
+
+
+try:
+    _cpu_timer = time.process_time
+except AttributeError:
+    _cpu_timer = time.clock  # pylint: disable=no-member
+
+
+class StageTime(object):
+    """
+    Holds the cumulative times of a stage in a :class:`Profile`.
+
+    .. attribute:: calls
+
+        The number of times the stage was executed
+
+    .. attribute:: wall
+
+        The total wall-clock time spent in the stage, in seconds
+
+    .. attribute:: cpu
+
+        The total CPU time spent in the stage, in seconds (always 0.0 if the
+        profile does not measure CPU time)
+    """
+    __slots__ = ('calls', 'wall', 'cpu')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __repr__(self):
+        return 'StageTime(calls=%d, wall=%f, cpu=%f)' % (
+            self.calls, self.wall, self.cpu)
+
+
+class Profile(object):
+    """
+    Records the cumulative wall-clock and CPU time spent in named stages.
+
+    Stages are created on first use, and are reported in the order they were
+    created. If *cpu* is False, only wall-clock time is measured, which
+    reduces the overhead of profiling considerably.
+
+    :param bool cpu: If True (the default), measure CPU time in addition to
+                     wall-clock time
+    """
+
+    def __init__(self, cpu=True):
+        self.cpu = cpu
+        self.stages = OrderedDict()
+
+    def stage(self, name):
+        """
+        Returns the :class:`StageTime` of the stage *name*, creating it if
+        necessary.
+
+        :param str name: The name of the stage
+        """
+        try:
+            return self.stages[name]
+        except KeyError:
+            return self.stages.setdefault(name, StageTime())
+
+    def wrap(self, name, func):
+        """
+        Returns a function which calls *func* with its arguments, adding the
+        time taken by each call (whether it returns or raises an exception)
+        to the stage *name*.
+
+        :param str name: The name of the stage
+        :param func: The function to wrap
+        """
+        stage = self.stage(name)
+        wall_timer = timer
+
+        if self.cpu:
+            cpu_timer = _cpu_timer
+
+            def timed(*args, **kwargs):
+                # pylint: disable=missing-docstring
+                wall = wall_timer()
+                cpu = cpu_timer()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    stage.cpu += cpu_timer() - cpu
+                    stage.wall += wall_timer() - wall
+                    stage.calls += 1
+        else:
+
+            def timed(*args, **kwargs):
+                # pylint: disable=missing-docstring
+                wall = wall_timer()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    stage.wall += wall_timer() - wall
+                    stage.calls += 1
+
+        return timed
+
+    @contextmanager
+    def time(self, name):
+        """
+        Returns a context manager which adds the time spent within it to the
+        stage *name*. For example::
+
+            with profile.time('transform'):
+                row = transform(row)
+
+        :param str name: The name of the stage
+        """
+        stage = self.stage(name)
+        wall = timer()
+        cpu = _cpu_timer() if self.cpu else 0.0
+        try:
+            yield stage
+        finally:
+            if self.cpu:
+                stage.cpu += _cpu_timer() - cpu
+            stage.wall += timer() - wall
+            stage.calls += 1
+
+    def reset(self):
+        """
+        Removes all stages from the profile.
+        """
+        self.stages.clear()
+
+    def as_dict(self):
+        """
+        Returns an :class:`~collections.OrderedDict` mapping the name of each
+        stage to a dictionary with ``calls``, ``wall``, and ``cpu`` keys.
+        """
+        return OrderedDict(
+            (name, {
+                'calls': stage.calls,
+                'wall': stage.wall,
+                'cpu': stage.cpu,
+                })
+            for (name, stage) in self.stages.items()
+            )
+
+    def summary(self):
+        """
+        Returns a table (as a string) of the times of each stage, with the
+        stages in descending order of wall-clock time.
+        """
+        stages = sorted(
+            self.stages.items(), key=lambda item: item[1].wall, reverse=True)
+        total = sum(stage.wall for stage in self.stages.values())
+        width = max([len('Stage')] + [len(name) for name in self.stages])
+        lines = [
+            '%-*s %10s %10s %10s %6s' % (
+                width, 'Stage', 'Calls', 'Wall (s)', 'CPU (s)', '%'),
+            ]
+        for name, stage in stages:
+            lines.append('%-*s %10d %10.3f %10.3f %6.1f' % (
+                width, name, stage.calls, stage.wall, stage.cpu,
+                100 * stage.wall / total if total else 0.0))
+        return '\n'.join(lines)
+
+
+def instrument(profile, name, func):
+    """
+    Returns *func* wrapped to record its time in the stage *name* of
+    *profile*, or *func* itself if *profile* is None.
+    """
+    if profile is None:
+        return func
+    return profile.wrap(name, func)
+
+
+def make_profile(profile):
+    """
+    Converts the *profile* parameter of sources and targets to a
+    :class:`Profile` (or None if profiling is disabled).
+    """
+    if profile is None or profile is False:
+        return None
+    if profile is True:
+        return Profile()
+    if isinstance(profile, Profile):
+        return profile
+    raise ValueError('profile must be a bool or a Profile instance')
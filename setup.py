@@ -92,12 +92,16 @@ __keywords__ = [
     ]
 
 __requires__ = [
-    'pygeoip',   # Pure Python GeoIP library
+    # Pure Python GeoIP library; lars.geoip.build_index reads the database
+    # layout from pygeoip's internals, so stick to the tested release series
+    'pygeoip>=0.3,<0.4',
     ]
 
 __extra_requires__ = {
     'doc': ['sphinx'],
-    'test': ['pytest', 'coverage', 'mock'],
+    'columns': ['numpy'],
+    # numpy is included so the columnar output and GeoIP index are tested
+    'test': ['pytest', 'coverage', 'mock', 'numpy'],
     }
 
 __entry_points__ = {
@@ -110,6 +114,7 @@ if sys.version_info[:2] < (3, 0):
     # of Python; hilariously 2.7 is now better supported than 3.2 or 3.3...
     __requires__.append('ipaddr')
     __requires__.append('backports.csv')
+    __requires__.append('futures')
 elif sys.version_info[:2] == (3, 2):
     # The version of ipaddr on PyPI is incompatible with Python 3.2; use a
     # private fork of it instead
@@ -29,9 +29,11 @@ from __future__ import (
     division,
     )
 
+import io
+
 import pytest
 
-from lars import apache, datatypes as dt
+from lars import apache, parsers, timing, datatypes as dt
 
 
 # Make Py2 str same as Py3
@@ -157,6 +159,25 @@ def test_time_parse_common():
     with pytest.raises(ValueError):
         apache._time_parse_common('[1/Feb/2000:1:3:4 01235]')
 
+def test_time_parse_cache(monkeypatch):
+    monkeypatch.setattr(apache, '_TIME_CACHE_SIZE', 2)
+    apache._time_cache.clear()
+    apache._time_format_cache.clear()
+    value = apache._time_parse_common('[25/Dec/1998:17:45:35 +0100]')
+    assert apache._time_parse_common('[25/Dec/1998:17:45:35 +0100]') is value
+    apache._time_parse_common('[25/Dec/1998:17:45:36 +0100]')
+    assert len(apache._time_cache) == 2
+    apache._time_parse_common('[25/Dec/1998:17:45:37 +0100]')
+    assert len(apache._time_cache) == 1
+    assert apache._time_parse_common('[25/Dec/1998:17:45:35 +0100]') == value
+    with pytest.raises(ValueError):
+        apache._time_parse_common('[25/Foo/1998:17:45:35 +0100]')
+    fmt = '%Y-%m-%dT%H:%M:%S%z'
+    value = apache._time_parse_format('2000-01-01T12:34:56+0700', fmt)
+    assert apache._time_parse_format('2000-01-01T12:34:56+0700', fmt) is value
+    assert apache._time_parse_format(
+        '2000-01-01T12:34:56+0700', '%Y-%m-%dT%H:%M:%S+0700') != value
+
 def test_exceptions():
     exc = apache.ApacheError('Something went wrong!', 23)
     assert str(exc) == 'Line 23: Something went wrong!'
@@ -218,6 +239,232 @@ def test_source_combined():
         assert row
         assert count == 1
 
+def test_source_profile():
+    with apache.ApacheSource(EXAMPLE_01.splitlines(True)) as source:
+        assert source.profile is None
+        expected = list(source)
+    with apache.ApacheSource(
+            EXAMPLE_01.splitlines(True), profile=True) as source:
+        assert list(source) == expected
+        stages = source.profile.as_dict()
+    assert stages['match']['calls'] == 2
+    assert stages['row']['calls'] == 2
+    assert stages['parse.status']['calls'] == 2
+    assert stages['parse.request']['calls'] == 2
+    profile = timing.Profile(cpu=False)
+    with apache.ApacheSource(
+            EXAMPLE_01.splitlines(True), profile=profile) as source:
+        assert source.profile is profile
+        assert sum(len(batch) for batch in source.iter_batches(1)) == 2
+    assert profile.stages['match'].calls == 2
+    assert profile.stages['match'].cpu == 0.0
+    with pytest.raises(ValueError):
+        apache.ApacheSource([], profile='foo')
+
+def test_source_lazy():
+    with apache.ApacheSource(
+            EXAMPLE_02.splitlines(True), log_format=apache.COMBINED,
+            lazy=True) as source:
+        rows = list(source)
+        assert source.count == 2
+    assert rows[0].status == 200
+    assert rows[0].size == 14745
+    assert rows[1].req_Referer == dt.url('http://eprints.lse.ac.uk/33718/')
+    assert rows[1]._fields == (
+        'remote_host', 'ident', 'remote_user', 'time', 'request', 'status',
+        'size', 'req_Referer', 'req_User_Agent')
+    with apache.ApacheSource(
+            EXAMPLE_02.splitlines(True), log_format=apache.COMBINED) as source:
+        assert rows == list(source)
+
+def test_source_lazy_errors(recwarn):
+    with apache.ApacheSource(
+            INVALID_REMOTE_HOST.splitlines(True), log_format=apache.COMBINED,
+            lazy=True) as source:
+        row, = list(source)
+    assert row.status == 200
+    with pytest.raises(ValueError):
+        row.remote_host
+    with apache.ApacheSource(
+            MULTIPLE_REMOTE_HOSTS.splitlines(True), log_format=apache.COMBINED,
+            lazy=True) as source:
+        assert list(source) == []
+    assert recwarn.pop(apache.ApacheWarning)
+
+def test_source_fields():
+    with apache.ApacheSource(
+            EXAMPLE_02.splitlines(True), log_format=apache.COMBINED,
+            fields=['size', 'status', 'req_Referer']) as source:
+        rows = list(source)
+        assert source.count == 2
+    assert rows[0]._fields == ('status', 'size', 'req_Referer')
+    assert rows == [
+        (200, 14745, None),
+        (200, 43, dt.url('http://eprints.lse.ac.uk/33718/')),
+        ]
+    with apache.ApacheSource(
+            EXAMPLE_01.splitlines(True), fields=['status']) as source:
+        assert list(source) == [(200,), (302,)]
+    with apache.ApacheSource(
+            EXAMPLE_01.splitlines(True), fields=['status'],
+            lazy=True) as source:
+        assert list(source) == [(200,), (302,)]
+    with pytest.raises(ValueError):
+        apache.ApacheSource([], fields=['status', 'foo'])
+    with pytest.raises(ValueError):
+        apache.ApacheSource([], fields=[])
+
+def test_source_batches(recwarn):
+    lines = (EXAMPLE_02 * 3).splitlines(True)
+    with apache.ApacheSource(lines, log_format=apache.COMBINED) as source:
+        expected = list(source)
+    with apache.ApacheSource(lines, log_format=apache.COMBINED) as source:
+        batches = list(source.iter_batches(4))
+        assert source.count == 6
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert [row for batch in batches for row in batch] == expected
+    with apache.ApacheSource(
+            lines, log_format=apache.COMBINED, lazy=True) as source:
+        batches = list(source.iter_batches(4))
+    assert [row for batch in batches for row in batch] == expected
+    lines[4] = 'foo\n'
+    with apache.ApacheSource(lines, log_format=apache.COMBINED) as source:
+        batches = list(source.iter_batches(4))
+        assert source.count == 5
+    assert str(recwarn.pop(apache.ApacheWarning).message) == (
+        'Line 5: Line contains invalid data')
+    with apache.ApacheSource(
+            INVALID_REMOTE_HOST.splitlines(True),
+            log_format=apache.COMBINED) as source:
+        assert list(source.iter_batches()) == []
+    assert recwarn.pop(apache.ApacheWarning)
+    with pytest.raises(ValueError):
+        list(apache.ApacheSource([]).iter_batches(0))
+
+def test_source_mmap(recwarn, tmpdir):
+    lines = (EXAMPLE_02 * 3).splitlines(True)
+    with apache.ApacheSource(lines, log_format=apache.COMBINED) as source:
+        expected = list(source)
+    filename = str(tmpdir.join('access.log'))
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        with apache.ApacheSource(f, log_format=apache.COMBINED) as source:
+            assert list(source.iter_mmap()) == expected
+            assert source.count == 6
+        with apache.ApacheSource(
+                f, log_format=apache.COMBINED, lazy=True) as source:
+            assert list(source.iter_mmap()) == expected
+    lines[4] = 'foo\n'
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        # Omit the final line-terminator
+        f.write(''.join(lines).rstrip())
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        with apache.ApacheSource(f, log_format=apache.COMBINED) as source:
+            rows = list(source.iter_mmap())
+            assert source.count == 5
+    assert rows == expected[:4] + expected[5:]
+    assert str(recwarn.pop(apache.ApacheWarning).message) == (
+        'Line 5: Line contains invalid data')
+    io.open(filename, 'w').close()
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        with apache.ApacheSource(f) as source:
+            assert list(source.iter_mmap()) == []
+
+def test_source_split():
+    # The standard formats are split without the row regex; the same formats
+    # with %s instead of %>s are not, but must produce identical results
+    lines = [
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326',
+        '1.2.3.4 - frank smith [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326',
+        '1.2.3.4 - - [ 1/Oct/2000:13:55:36 -0700] "-" 400 -',
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a"b.gif HTTP/1.0" 200 2326',
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a\\x20b HTTP/1.0" 200 2326',
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 23x',
+        '1.2.3.4 - - [x] [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326',
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326 "http://x/" "Moz (a; b)"',
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326 "-" "Moz \\"q\\" x"',
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326 "a"b" "c"',
+        '1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326 "" "\x01"',
+        'www.example.com 1.2.3.4 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.1" 200 5',
+        'bad line',
+        ]
+    for log_format in (apache.COMMON, apache.COMBINED, apache.COMMON_VHOST):
+        for fields in (None, ['status', 'size']):
+            fast = apache.ApacheSource(lines, log_format, fields=fields)
+            slow = apache.ApacheSource(
+                lines, log_format.replace('%>s', '%s'), fields=fields)
+            for line in lines:
+                assert fast._row_match(line) == slow._row_match(line)
+    source = apache.ApacheSource([], apache.COMBINED, fields=['status'])
+    assert source._row_match(lines[7]) == ('200',)
+
+def test_source_intern():
+    lines = (EXAMPLE_02 * 2).splitlines(True)
+    with apache.ApacheSource(lines, apache.COMBINED) as source:
+        expected = list(source)
+    assert expected[0].request is not expected[2].request
+    with apache.ApacheSource(
+            lines, apache.COMBINED, intern=['request']) as source:
+        rows = list(source)
+    assert rows == expected
+    assert rows[0].request is rows[2].request
+    assert rows[0].req_User_Agent is not rows[2].req_User_Agent
+    with apache.ApacheSource(lines, apache.COMBINED, intern=True) as source:
+        rows = list(source)
+    assert rows == expected
+    assert rows[0].req_User_Agent is rows[2].req_User_Agent
+    with apache.ApacheSource(
+            lines, apache.COMBINED, fields=['status'], intern=True,
+            lazy=True) as source:
+        assert list(source) == [(row.status,) for row in expected]
+    with pytest.raises(ValueError):
+        apache.ApacheSource([], apache.COMMON, intern=['req_User_Agent'])
+
+def test_source_url_cache():
+    lines = (EXAMPLE_02 * 2).splitlines(True)
+    with apache.ApacheSource(lines, apache.COMBINED) as source:
+        expected = list(source)
+    half = len(expected) // 2
+    assert expected[1].req_Referer is not None
+    assert expected[1].req_Referer is not expected[half + 1].req_Referer
+    with apache.ApacheSource(
+            lines, apache.COMBINED, url_cache=True) as source:
+        rows = list(source)
+    assert rows == expected
+    assert rows[1].req_Referer is rows[half + 1].req_Referer
+
+def test_source_compact():
+    lines = [
+        '127.0.0.1 127.0.0.1:80 /foo\n',
+        '::1 foo.com /bar\n',
+        ]
+    with apache.ApacheSource(lines, '%a %h %U') as source:
+        expected = list(source)
+    assert type(expected[0].remote_host) is dt.IPv4Port
+    with apache.ApacheSource(lines, '%a %h %U', compact=True) as source:
+        rows = list(source)
+        assert source._row_funcs[0] is parsers.compact_address_parse
+        assert source._row_funcs[1] is parsers.compact_hostname_parse
+    assert rows == expected
+    assert type(rows[0].remote_host) is dt.CompactIPv4Port
+    assert rows[0].remote_host.port == 80
+    assert type(rows[1].remote_host) is dt.Hostname
+
+def test_source_format_cache():
+    source1 = apache.ApacheSource([], apache.COMBINED)
+    source2 = apache.ApacheSource([], apache.COMBINED)
+    assert source1._row_type is source2._row_type
+    assert source1._row_pattern is source2._row_pattern
+    assert source1._row_funcs is source2._row_funcs
+    source3 = apache.ApacheSource([], apache.COMBINED, fields=['status'])
+    assert source3._row_type is not source1._row_type
+    assert source3._row_type._fields == ('status',)
+    source4 = apache.ApacheSource([], apache.COMBINED, lazy=True)
+    assert source4._row_type is not source1._row_type
+    assert source4._lazy_type is not None
+    assert source1._lazy_type is None
+
 def test_source_field_names():
     with apache.ApacheSource(
             EXAMPLE_03.splitlines(True),
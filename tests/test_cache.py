@@ -29,6 +29,9 @@ from __future__ import (
     division,
     )
 
+import sys
+from threading import Thread
+
 import pytest
 
 from lars import cache
@@ -77,3 +80,442 @@ def test_lru_cache():
     assert double_lru('aa') == 'aaaa'
     assert double_lru.cache_info()[:2] == (1, 3)
 
+
+def test_lru_cache_object():
+    lru = cache.LRUCache(maxsize=3)
+    assert lru.get(1) is None
+    assert lru.get(1, 'foo') == 'foo'
+    lru.put(1, 'a')
+    lru.put(2, 'b')
+    lru.put(3, 'c')
+    assert len(lru) == 3
+    # Accessing 1 makes 2 the least recently used entry
+    assert lru.get(1) == 'a'
+    lru.put(4, 'd')
+    assert 2 not in lru
+    assert 1 in lru
+    # Replacing an entry doesn't evict anything
+    lru.put(4, 'e')
+    assert len(lru) == 3
+    assert lru.get(4) == 'e'
+    assert lru.info() == (2, 2, 3, 3)
+    lru.clear()
+    assert len(lru) == 0
+    assert lru.info() == (0, 0, 3, 0)
+    with pytest.raises(ValueError):
+        cache.LRUCache(maxsize=0)
+
+def test_cached():
+    shared = cache.LRUCache(maxsize=5)
+    calls = []
+
+    @cache.cached(shared)
+    def double(x):
+        calls.append(x)
+        return 2 * x
+
+    @cache.cached(shared, key=lambda x, y=1: x)
+    def triple(x, y=1):
+        calls.append(x)
+        return 3 * x
+
+    assert double(1) == 2
+    assert double(1) == 2
+    assert calls == [1]
+    assert double.cache is shared
+    assert double.cache_info()[:2] == (1, 1)
+    assert triple(2) == 6
+    assert triple(2, y=2) == 6
+    assert calls == [1, 2]
+    assert shared.get(2) == 6
+    double.cache_clear()
+    assert double(1) == 2
+    assert calls == [1, 2, 1]
+    assert double.__wrapped__(3) == 6
+
+def test_sharded_lru_cache_object():
+    sharded = cache.ShardedLRUCache(maxsize=16, shards=4)
+    for i in range(16):
+        sharded.put(i, i * 2)
+    assert len(sharded) == 16
+    assert all(sharded.get(i) == i * 2 for i in range(16))
+    assert sharded.info() == (16, 0, 16, 16)
+    # Small integers hash to themselves so 16 lands in the same shard as 0,
+    # 4, 8, and 12; 0 is the least recently used of those
+    sharded.put(16, 32)
+    assert 0 not in sharded
+    assert all(i in sharded for i in range(1, 17))
+    assert sharded.get(0, 'foo') == 'foo'
+    sharded.clear()
+    assert len(sharded) == 0
+    assert sharded.info() == (0, 0, 16, 0)
+    with pytest.raises(ValueError):
+        cache.ShardedLRUCache(maxsize=0)
+    with pytest.raises(ValueError):
+        cache.ShardedLRUCache(shards=0)
+
+def test_sharded_lru_cache_capacity():
+    # The capacity is exactly maxsize when it doesn't divide evenly among the
+    # shards, or when there are more shards than entries
+    for maxsize, shards in ((100, 16), (10, 16), (1, 16), (7, 2)):
+        sharded = cache.ShardedLRUCache(maxsize=maxsize, shards=shards)
+        for i in range(maxsize * 10):
+            sharded.put(i, i)
+        assert len(sharded) == maxsize
+        assert sharded.info().maxsize == maxsize
+
+def test_sharded_clock_cache_object():
+    clock = cache.ShardedLRUCache(maxsize=3, shards=1, clock=True)
+    clock.put(1, 'a')
+    clock.put(2, 'b')
+    clock.put(3, 'c')
+    # Reading 1 and 2 sets their reference bits so 3 is evicted
+    assert clock.get(1) == 'a'
+    assert clock.get(2) == 'b'
+    clock.put(4, 'd')
+    assert 3 not in clock
+    assert [clock.get(i) for i in (1, 2, 4)] == ['a', 'b', 'd']
+    # Updating an entry doesn't evict anything
+    clock.put(4, 'e')
+    assert len(clock) == 3
+    assert clock.get(4) == 'e'
+    # All entries are now referenced, so the hand sweeps the ring clearing
+    # them before evicting the first slot
+    clock.put(5, 'f')
+    assert len(clock) == 3
+    assert 1 not in clock
+    assert 5 in clock
+    assert clock.info() == (6, 0, 3, 3)
+    clock.clear()
+    assert len(clock) == 0
+    assert clock.get(1) is None
+
+def test_clock_cache_concurrent_reads():
+    # Lock-free reads can see a slot which a concurrent put has allocated but
+    # not yet filled, or which a concurrent clear has removed; both are misses
+    clock = cache._ClockCache(2)
+    clock._index[1] = 0
+    clock._entries.append(None)
+    clock._referenced.append(False)
+    assert clock.get(1, 'miss') == 'miss'
+    clock._index[2] = 1
+    clock._entries.append((2, 'b'))
+    assert clock.get(2, 'miss') == 'miss'
+
+def test_clock_cache_stress():
+    clock = cache.ShardedLRUCache(maxsize=8, shards=1, clock=True)
+    errors = []
+
+    def reader():
+        try:
+            for i in range(20000):
+                value = clock.get(i % 16)
+                assert value is None or value == (i % 16) * 2
+        except Exception as exc:
+            errors.append(exc)
+
+    def writer():
+        try:
+            for i in range(20000):
+                clock.put(i % 16, (i % 16) * 2)
+                if not i % 100:
+                    clock.clear()
+        except Exception as exc:
+            errors.append(exc)
+
+    # Switch threads as often as possible to provoke races (the switch
+    # interval can't be changed prior to Python 3.2)
+    interval = getattr(sys, 'getswitchinterval', lambda: None)()
+    if interval is not None:
+        sys.setswitchinterval(1e-6)
+    try:
+        threads = [Thread(target=reader) for _ in range(3)]
+        threads.append(Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if interval is not None:
+            sys.setswitchinterval(interval)
+    assert errors == []
+    assert len(clock) <= 8
+
+def test_sharded_lru_cache():
+    calls = []
+
+    @cache.sharded_lru_cache(maxsize=8, shards=2, clock=True)
+    def double(x):
+        calls.append(x)
+        return 2 * x
+
+    assert [double(i) for i in range(4)] == [0, 2, 4, 6]
+    assert [double(i) for i in range(4)] == [0, 2, 4, 6]
+    assert calls == [0, 1, 2, 3]
+    assert double.cache_info() == (4, 4, 8, 4)
+    double.cache_clear()
+    assert double.cache_info() == (0, 0, 8, 0)
+
+def test_ttl_cache_object():
+    now = [0.0]
+    ttl = cache.TTLCache(
+        maxsize=3, ttl=10, negative_ttl=2, timer=lambda: now[0])
+    ttl.put(1, 'a')
+    ttl.put(2, None)
+    assert ttl.get(1) == 'a'
+    assert ttl.get(2, 'foo') is None
+    assert 2 in ttl
+    # Negative entries expire first
+    now[0] = 2
+    assert 2 not in ttl
+    assert ttl.get(2, 'foo') == 'foo'
+    assert ttl.get(1) == 'a'
+    now[0] = 10
+    assert ttl.get(1, 'foo') == 'foo'
+    assert ttl.info() == (3, 2, 3, 0)
+    # Storing an entry again resets its expiry
+    ttl.put(1, 'a')
+    now[0] = 15
+    ttl.put(1, 'b')
+    now[0] = 24
+    assert ttl.get(1) == 'b'
+    # The least recently used entry is discarded when full
+    ttl.put(2, 'c')
+    ttl.put(3, 'd')
+    ttl.put(4, 'e')
+    assert len(ttl) == 3
+    assert 1 not in ttl
+    ttl.clear()
+    assert len(ttl) == 0
+    assert ttl.info() == (0, 0, 3, 0)
+    with pytest.raises(ValueError):
+        cache.TTLCache(maxsize=0)
+    with pytest.raises(ValueError):
+        cache.TTLCache(ttl=0)
+    with pytest.raises(ValueError):
+        cache.TTLCache(negative_ttl=-1)
+
+def test_ttl_cache_negative():
+    now = [0.0]
+    ttl = cache.TTLCache(
+        ttl=10, negative_ttl=1, negative=lambda key, value: key == value,
+        timer=lambda: now[0])
+    ttl.put('a', 'a')
+    ttl.put('b', None)
+    now[0] = 1
+    assert 'a' not in ttl
+    assert 'b' in ttl
+
+def test_sharded_ttl_cache():
+    now = [0.0]
+    sharded = cache.ShardedLRUCache(
+        maxsize=8, shards=2,
+        shard_factory=lambda size: cache.TTLCache(
+            size, ttl=5, timer=lambda: now[0]))
+    for i in range(8):
+        sharded.put(i, i)
+    assert len(sharded) == 8
+    assert sharded.get(3) == 3
+    now[0] = 5
+    assert sharded.get(3) is None
+    assert sharded.info() == (1, 1, 8, 7)
+
+def test_cached_replace():
+    @cache.cached(cache.LRUCache(maxsize=5))
+    def double(x):
+        return 2 * x
+
+    assert double(1) == 2
+    double.cache = cache.ShardedLRUCache(maxsize=8, shards=2)
+    assert double.cache_info() == (0, 0, 8, 0)
+    assert double(1) == 2
+    assert double(1) == 2
+    assert double.cache_info() == (1, 1, 8, 1)
+
+def test_persistent_cache(tmpdir):
+    filename = str(tmpdir.join('cache.db'))
+    persistent = cache.PersistentCache(filename, maxsize=3)
+    try:
+        persistent.put('a', 1)
+        persistent.put(('b', 2), None)
+        persistent.put('c', {'d': 3})
+        assert len(persistent) == 3
+        assert persistent.get('a') == 1
+        assert persistent.get(('b', 2), 'foo') is None
+        assert persistent.get('x', 'foo') == 'foo'
+        assert persistent.info() == (2, 1, 3, 3)
+        # c is the least recently used entry
+        persistent.put('e', 4)
+        assert len(persistent) == 3
+        assert 'c' not in persistent
+        assert 'a' in persistent
+    finally:
+        persistent.close()
+    persistent = cache.PersistentCache(filename, maxsize=3)
+    try:
+        assert len(persistent) == 3
+        assert persistent.get('a') == 1
+        assert persistent.get('e') == 4
+        persistent.clear()
+        assert len(persistent) == 0
+        assert persistent.info() == (0, 0, 3, 0)
+    finally:
+        persistent.close()
+    with pytest.raises(ValueError):
+        cache.PersistentCache(filename, table='foo; DROP TABLE bar')
+    with pytest.raises(ValueError):
+        cache.PersistentCache(filename, maxsize=0)
+    with pytest.raises(ValueError):
+        cache.PersistentCache(filename, negative_ttl=10)
+    with pytest.raises(ValueError):
+        cache.PersistentCache(filename, ttl=0)
+
+def test_persistent_cache_ttl(tmpdir):
+    now = [1000.0]
+    persistent = cache.PersistentCache(
+        str(tmpdir.join('cache.db')), ttl=10, negative_ttl=2,
+        timer=lambda: now[0])
+    try:
+        persistent.put('a', 'b')
+        persistent.put('c', None)
+        now[0] += 2
+        assert 'c' not in persistent
+        assert persistent.get('a') == 'b'
+        assert len(persistent) == 1
+        now[0] += 8
+        assert persistent.get('a', 'foo') == 'foo'
+        assert len(persistent) == 0
+    finally:
+        persistent.close()
+
+def test_persistent_cache_reads(tmpdir):
+    filename = str(tmpdir.join('cache.db'))
+    persistent = cache.PersistentCache(filename, maxsize=3)
+    try:
+        persistent.put('a', 1)
+        persistent.put('b', 2)
+        persistent.put('c', 3)
+        # Reads don't write to the database until the next change
+        changes = persistent._conn.total_changes
+        assert persistent.get('a') == 1
+        assert persistent._conn.total_changes == changes
+    finally:
+        persistent.close()
+    persistent = cache.PersistentCache(filename, maxsize=3)
+    try:
+        # The recency of a was written on close, so b is evicted
+        persistent.put('d', 4)
+        assert 'a' in persistent
+        assert 'b' not in persistent
+    finally:
+        persistent.close()
+
+def test_persistent_cache_shared(tmpdir):
+    filename = str(tmpdir.join('cache.db'))
+    first = cache.PersistentCache(filename, maxsize=3)
+    second = cache.PersistentCache(filename, maxsize=3)
+    try:
+        first.put('a', 1)
+        first.put('b', 2)
+        first.put('c', 3)
+        assert len(second) == 3
+        # The second cache sees the entries added by the first, so it evicts
+        # the least recently used of them
+        second.put('d', 4)
+        assert len(first) == len(second) == 3
+        assert second.info().currsize == 3
+        assert 'a' not in first
+        second.put('e', 5)
+        first.put('f', 6)
+        assert len(first) == 3
+        assert first.get('f') == 6
+        assert first.get('e') == 5
+        assert first.get('d') == 4
+    finally:
+        first.close()
+        second.close()
+
+def test_persistent_cache_front(tmpdir):
+    filename = str(tmpdir.join('cache.db'))
+    front = cache.LRUCache(maxsize=10)
+    persistent = cache.PersistentCache(filename, front=front)
+    other = cache.PersistentCache(filename, table='other')
+    try:
+        persistent.put('a', 1)
+        assert front.get('a') == 1
+        assert persistent.get('a') == 1
+        assert persistent.info() == (0, 0, 1000000, 1)
+        front.clear()
+        assert persistent.get('a') == 1
+        assert persistent.info() == (1, 0, 1000000, 1)
+        assert front.get('a') == 1
+        assert len(other) == 0
+        persistent.clear()
+        assert len(front) == 0
+    finally:
+        persistent.close()
+        other.close()
+
+def test_persistent_cached(tmpdir):
+    calls = []
+    filename = str(tmpdir.join('cache.db'))
+
+    for run in range(2):
+        @cache.cached(cache.PersistentCache(filename))
+        def double(x):
+            calls.append(x)
+            return 2 * x
+
+        try:
+            assert [double(i) for i in range(3)] == [0, 2, 4]
+        finally:
+            double.cache.close()
+    assert calls == [0, 1, 2]
+
+def test_lru_cache_stats():
+    @cache.lru_cache(maxsize=2)
+    def double(x):
+        return 2 * x
+
+    assert [double(i) for i in (1, 2, 1, 3)] == [2, 4, 2, 6]
+    stats = double.cache_stats()
+    assert stats[:5] == (1, 3, 1, 2, 2)
+    assert stats.miss_time >= 0.0
+    double.cache_reset_stats()
+    assert double.cache_stats() == (0, 0, 0, 2, 2, 0.0)
+    assert double(1) == 2
+    assert double.cache_info() == (1, 0, 2, 2)
+
+def test_cache_object_stats(tmpdir):
+    caches = [
+        cache.LRUCache(maxsize=2),
+        cache.ShardedLRUCache(maxsize=2, shards=1),
+        cache.ShardedLRUCache(maxsize=2, shards=1, clock=True),
+        cache.TTLCache(maxsize=2),
+        cache.PersistentCache(str(tmpdir.join('cache.db')), maxsize=2),
+        ]
+    try:
+        for c in caches:
+            c.put(1, 'a')
+            c.put(2, 'b')
+            assert c.get(1) == 'a'
+            assert c.get(3) is None
+            c.put(3, 'c')
+            assert c.stats() == (1, 1, 1, 2, 2, 0.0)
+            c.reset_stats()
+            assert c.stats() == (0, 0, 0, 2, 2, 0.0)
+            assert len(c) == 2
+    finally:
+        caches[-1].close()
+
+def test_cached_stats():
+    @cache.cached(cache.ShardedLRUCache(maxsize=4, shards=2))
+    def double(x):
+        return 2 * x
+
+    assert [double(i) for i in (1, 2, 1)] == [2, 4, 2]
+    stats = double.cache_stats()
+    assert stats[:5] == (1, 2, 0, 2, 4)
+    assert stats.miss_time > 0.0
+    double.cache_reset_stats()
+    assert double.cache_stats() == (0, 0, 0, 2, 4, 0.0)
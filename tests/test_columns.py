@@ -0,0 +1,162 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+
+import pytest
+
+from lars import apache, iis, columns, datatypes as dt
+
+np = pytest.importorskip('numpy')
+
+
+# Make Py2 str same as Py3
+str = type('')
+
+
+APACHE_EXAMPLE = """\
+64.242.88.10 64.242.88.10 - - [07/Mar/2004:16:56:39 -0800] "GET /twiki/bin/view/Sandbox/WebHome?rev=1.6 HTTP/1.1" 200 8545
+::1 lordgun.org - foo [07/Mar/2004:17:01:53 -0800] "HEAD /razor.html HTTP/1.0" 302 -
+10.0.0.1 10.0.0.1 - - [07/Mar/2004:17:02:00 -0800] "GET /razor.html HTTP/1.0" 200 2869
+"""
+
+APACHE_FORMAT = '%a ' + apache.COMMON
+
+IIS_EXAMPLE = """\
+#Version: 1.0
+#Fields: date time c-ip cs-method cs-uri-stem sc-status time-taken
+2002-05-24 20:18:01 172.224.24.114 GET /Default.htm 200 0.5
+2002-05-24 20:18:02 172.224.24.115 POST /Default.htm 404 -
+2002-05-24 20:18:03 172.224.24.114 GET /foo.htm - 1.25
+"""
+
+
+def test_apache_columns(recwarn):
+    with apache.ApacheSource(
+            APACHE_EXAMPLE.splitlines(True), APACHE_FORMAT) as source:
+        cols = source.to_columns()
+        assert source.count == 3
+    assert list(cols.keys()) == [
+        'remote_ip', 'remote_host', 'ident', 'remote_user', 'time',
+        'request', 'status', 'size']
+    assert cols['remote_ip'].dtype == np.uint32
+    assert list(cols['remote_ip']) == [
+        int(dt.address('64.242.88.10')), 0, int(dt.address('10.0.0.1'))]
+    assert recwarn.pop(columns.ColumnWarning)
+    assert cols['remote_host'].dtype == object
+    assert cols['remote_host'][1] == dt.hostname('lordgun.org')
+    assert cols['time'].dtype == np.dtype('datetime64[us]')
+    assert cols['time'][0] == np.datetime64('2004-03-08T00:56:39')
+    assert cols['request'][1] == dt.Request(
+        'HEAD', dt.url('/razor.html'), 'HTTP/1.0')
+    assert cols['status'].dtype == np.int64
+    assert list(cols['status']) == [200, 302, 200]
+    assert list(cols['size']) == [8545, -1, 2869]
+    assert list(cols['ident']) == [None, None, None]
+
+
+def test_apache_column_batches():
+    with apache.ApacheSource(
+            APACHE_EXAMPLE.splitlines(True),
+            fields=['request', 'status']) as source:
+        batches = list(source.iter_column_batches(2))
+    assert len(batches) == 2
+    assert list(batches[0]['status']) == [200, 302]
+    assert list(batches[1]['status']) == [200]
+    with apache.ApacheSource(
+            APACHE_EXAMPLE.splitlines(True), fields=['status']) as source:
+        cols = source.to_columns(size=1)
+    assert list(cols['status']) == [200, 302, 200]
+    with apache.ApacheSource([], fields=['status']) as source:
+        cols = source.to_columns()
+    assert cols['status'].dtype == np.int64
+    assert len(cols['status']) == 0
+
+
+def test_apache_categoricals():
+    lines = ['GET HTTP/1.1 200', 'HEAD HTTP/1.0 302', 'GET HTTP/1.0 200']
+    with apache.ApacheSource(lines, '%m %H %s') as source:
+        batches = list(source.iter_column_batches(2))
+    method = batches[0]['method']
+    assert isinstance(method, columns.Categorical)
+    assert method.codes.dtype == np.int32
+    assert list(method.codes) == [0, 1]
+    assert method.categories == ['GET', 'HEAD']
+    assert list(batches[1]['method'].codes) == [0]
+    assert list(batches[1]['protocol'].codes) == [1]
+    assert batches[1]['protocol'].categories == ['HTTP/1.1', 'HTTP/1.0']
+    with apache.ApacheSource(lines, '%m %H %s') as source:
+        cols = source.to_columns(size=2)
+    assert list(cols['method'].codes) == [0, 1, 0]
+    assert list(cols['method'].values()) == ['GET', 'HEAD', 'GET']
+
+
+def test_iis_columns():
+    with iis.IISSource(IIS_EXAMPLE.splitlines(True)) as source:
+        cols = source.to_columns()
+    assert cols['date'].dtype == np.dtype('datetime64[D]')
+    assert list(cols['date']) == [np.datetime64('2002-05-24')] * 3
+    assert cols['time'].dtype == np.dtype('timedelta64[us]')
+    assert cols['time'][2] == np.timedelta64(20 * 3600 + 18 * 60 + 3, 's')
+    assert cols['c_ip'].dtype == np.uint32
+    assert list(cols['cs_method'].values()) == ['GET', 'POST', 'GET']
+    assert cols['cs_uri_stem'][2] == dt.url('/foo.htm')
+    assert list(cols['sc_status']) == [200, 404, -1]
+    assert cols['time_taken'].dtype == np.float64
+    assert cols['time_taken'][0] == 0.5
+    assert np.isnan(cols['time_taken'][1])
+    with iis.IISSource([]) as source:
+        assert source.to_columns() == {}
+
+
+def test_iis_column_conversions(recwarn):
+    lines = [
+        '#Version: 1.0\n',
+        '#Fields: date time c-ip\n',
+        '2002-05-24 20:18:01 172.224.24.114\n',
+        '2002-02-31 20:18:02 172.224.24.114\n',
+        '- - [::1]\n',
+        '2002-05-24 20:18:01 [::1]\n',
+        '2002-05-25 00:00:00 10.0.0.1\n',
+        ]
+    with iis.IISSource(lines) as source:
+        batches = list(source.iter_column_batches(3))
+    assert str(recwarn.pop(iis.IISWarning).message).startswith('Line 4: ')
+    assert recwarn.pop(columns.ColumnWarning)
+    assert len(batches) == 3
+    assert list(batches[0]['date']) == [np.datetime64('2002-05-24')]
+    assert list(batches[0]['c_ip']) == [int(dt.address('172.224.24.114'))]
+    assert np.isnat(batches[1]['date'][0])
+    assert np.isnat(batches[1]['time'][0])
+    assert batches[1]['time'][1] == np.timedelta64(
+        20 * 3600 + 18 * 60 + 1, 's')
+    assert list(batches[1]['c_ip']) == [0, 0]
+    assert list(batches[2]['c_ip']) == [int(dt.address('10.0.0.1'))]
+    assert list(batches[2]['date']) == [np.datetime64('2002-05-25')]
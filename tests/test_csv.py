@@ -119,3 +119,28 @@ def test_non_unicode(rows):
     assert out[1] == b'2002-05-02 20:18:01,172.22.255.255,GET,/images/picture.jpg,0.1,302,16328'
     assert out[2] == b'2002-05-29 12:34:56,9.180.235.203,HEAD,/images/picture.jpg,0.1,202,'
 
+
+def test_write_many(rows):
+    out = io.BytesIO()
+    with csv.CSVTarget(out, header=True) as target:
+        target.write_many(rows[:2])
+        target.write_many([])
+        target.write_many(rows[2:])
+        with pytest.raises(TypeError):
+            target.write_many([('foo',)])
+    out = out.getvalue().splitlines()
+    assert len(out) - 1 == target.count == 3
+    assert out[0] == b'timestamp,client,method,url,time_taken,status,size'
+    assert out[1] == b'2002-06-24 16:40:23,172.224.24.114,POST,/Default.htm,0.67,200,7930'
+    assert out[2] == b'2002-05-02 20:18:01,172.22.255.255,GET,/images/picture.jpg,0.1,302,16328'
+    assert out[3] == b'2002-05-29 12:34:56,9.180.235.203,HEAD,/images/picture.jpg,0.1,202,'
+
+def test_profile(rows):
+    out = io.BytesIO()
+    with csv.CSVTarget(out, profile=True) as target:
+        profile = target.profile
+        target.write(rows[0])
+        target.write_many(rows[1:])
+    assert profile.stages['write'].calls == 2
+    with csv.CSVTarget(io.BytesIO()) as target:
+        assert target.profile is None
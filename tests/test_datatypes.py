@@ -32,6 +32,7 @@ from __future__ import (
 import sys
 import os
 import shutil
+import pickle
 import sqlite3
 from datetime import datetime, date, time
 try:
@@ -127,6 +128,34 @@ def test_url():
     assert u.hostname == dt.hostname('localhost')
     assert u.hostname.address == dt.address('127.0.0.1')
 
+def test_cached_address():
+    dt.cached_address.cache_clear()
+    addr = dt.cached_address('[::1]:80')
+    assert addr == dt.address('[::1]:80')
+    assert addr.port == 80
+    assert dt.cached_address('[::1]:80') is addr
+    assert dt.cached_address.cache_info().hits == 1
+    with pytest.raises(ValueError):
+        dt.cached_address('foo')
+
+def test_cached_hostname():
+    dt.cached_hostname.cache_clear()
+    host = dt.cached_hostname('foo.com')
+    assert host == dt.hostname('foo.com')
+    assert dt.cached_hostname('foo.com') is host
+    assert isinstance(dt.cached_hostname('1.2.3.4'), dt.IPv4Address)
+    assert dt.cached_hostname.cache_info().misses == 2
+
+def test_cached_url():
+    dt.cached_url.cache_clear()
+    url = dt.cached_url('http://foo/bar?baz=quux')
+    assert url == dt.url('http://foo/bar?baz=quux')
+    assert dt.cached_url('http://foo/bar?baz=quux') is url
+    info = dt.cached_url.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.currsize == 1
+
 def test_url_query():
     url = dt.url('http://foo/bar?baz=quux&x=1&y=')
     assert 'baz' in url.query
@@ -158,6 +187,36 @@ def test_row():
     assert NewRow(1, 2, 3).bar == 2
     assert NewRow(1, 2, 3).baz == 3
 
+def test_lazy_row():
+    calls = []
+    def parse(s):
+        calls.append(s)
+        return int(s)
+    NewRow = dt.lazy_row(('foo', 'bar', 'baz'), (parse, parse, str))
+    assert NewRow._fields == ('foo', 'bar', 'baz')
+    row = NewRow('1', '2', 'x')
+    assert calls == []
+    assert row.foo == 1
+    assert row.foo == 1
+    assert calls == ['1']
+    assert row[-1] == 'x'
+    assert row == (1, 2, 'x')
+    assert calls == ['1', '2']
+    assert len(row) == 3
+    assert row[:2] == (1, 2)
+    assert row._asdict() == {'foo': 1, 'bar': 2, 'baz': 'x'}
+    assert repr(row) == "Row(foo=1, bar=2, baz='x')"
+    with pytest.raises(IndexError):
+        row[3]
+    with pytest.raises(TypeError):
+        NewRow('1', '2')
+    with pytest.raises(ValueError):
+        NewRow('a', '2', 'x').foo
+    with pytest.raises(ValueError):
+        dt.lazy_row(('foo', 'bar'), (int,))
+    with pytest.raises(ValueError):
+        dt.lazy_row(('foo', 'foo'), (int, int))
+
 def test_datetime():
     assert dt.datetime('2000-01-01 12:34:56') == datetime(2000, 1, 1, 12, 34, 56)
     assert dt.datetime('1986-02-28 00:00:00') == datetime(1986, 2, 28)
@@ -192,6 +251,9 @@ def test_hostname():
     assert dt.hostname('foo') == dt.Hostname('foo')
     assert dt.hostname(b'foo.bar') == dt.Hostname('foo.bar')
     assert dt.hostname('localhost') == dt.Hostname('localhost')
+    assert type(dt.hostname('host1.2.3.4')) is dt.Hostname
+    assert type(dt.hostname('1.2.3.4')) is dt.IPv4Address
+    assert type(dt.hostname('::1')) is dt.IPv6Address
     assert dt.hostname('f'*63 + '.o') == dt.Hostname('f'*63 + '.o')
     assert dt.hostname('f'*63 + '.oo') == dt.Hostname('f'*63 + '.oo')
     with pytest.raises(ValueError):
@@ -224,6 +286,12 @@ def test_network_ipv6():
 def test_address_ipv4():
     assert dt.address('127.0.0.1') == dt.IPv4Address('127.0.0.1')
     assert dt.address(b'127.0.0.1:80') == dt.IPv4Port('127.0.0.1:80')
+    assert type(dt.address('127.0.0.1')) is dt.IPv4Address
+    assert type(dt.address('127.0.0.1:80')) is dt.IPv4Port
+    with pytest.raises(ValueError):
+        dt.address('127.0.0.1.1')
+    with pytest.raises(ValueError):
+        dt.address('[127.0.0.1]:80')
     with pytest.raises(ValueError):
         dt.address('abc')
     with pytest.raises(ValueError):
@@ -233,6 +301,9 @@ def test_address_ipv4():
 
 def test_address_ipv6():
     assert dt.address('::1') == dt.IPv6Address('::1')
+    assert type(dt.address('::1')) is dt.IPv6Address
+    assert type(dt.address('[::1]:80')) is dt.IPv6Port
+    assert type(dt.address('::ffff:1.2.3.4')) is dt.IPv6Address
     assert dt.address('[::1]') == dt.IPv6Port('::1')
     assert dt.address('[::1]:80') == dt.IPv6Port('[::1]:80')
     assert dt.address('2001:0db8:85a3:0000:0000:8a2e:0370:7334') == dt.IPv6Address('2001:db8:85a3::8a2e:370:7334')
@@ -247,6 +318,105 @@ def test_address_port_manipulation():
     addr.port = None
     assert str(addr) == '127.0.0.1'
 
+def test_address_port_pickle():
+    for s in ('127.0.0.1:80', '127.0.0.1', '[::1]:80', '::1'):
+        addr = dt.address(s)
+        copy = pickle.loads(pickle.dumps(addr))
+        assert copy == addr
+        assert type(copy) == type(addr)
+        assert str(copy) == s
+
+def test_address_attributes():
+    # The public types permit arbitrary attributes, but the compact types
+    # have no instance dict (which makes them smaller)
+    for s in ('127.0.0.1', '127.0.0.1:80', '::1', '[::1]:80'):
+        addr = dt.address(s)
+        addr.foo = 1
+        assert addr.foo == 1
+    host = dt.hostname('foo.com')
+    host.foo = 1
+    assert host.foo == 1
+    for s in ('127.0.0.1', '127.0.0.1:80', '::1', '[::1]:80'):
+        addr = dt.compact_address(s)
+        assert not hasattr(addr, '__dict__')
+        assert sys.getsizeof(addr) < sys.getsizeof(dt.address(s))
+        with pytest.raises(AttributeError):
+            addr.foo = 1
+
+def test_compact_address():
+    assert type(dt.compact_address('127.0.0.1')) is dt.CompactIPv4Address
+    assert type(dt.compact_address(b'127.0.0.1:80')) is dt.CompactIPv4Port
+    assert type(dt.compact_address('::1')) is dt.CompactIPv6Address
+    assert type(dt.compact_address('[::1]:80')) is dt.CompactIPv6Port
+    for s in (
+            '0.0.0.0:0', '127.0.0.1:80', '255.255.255.255:65535', '10.0.0.1',
+            '[::1]:80', '[ffff::ffff]:65535', '::1'):
+        addr = dt.compact_address(s)
+        assert addr == dt.address(s)
+        assert hash(addr) == hash(dt.address(s))
+        assert int(addr) == int(dt.address(s))
+        assert (
+            getattr(addr, 'port', None) ==
+            getattr(dt.address(s), 'port', None))
+        assert str(addr) == s
+    assert dt.compact_address('127.0.0.1:80') < dt.address('127.0.0.2')
+    assert dt.compact_address('192.168.0.1:80') in dt.network('192.168.0.0/16')
+    with pytest.raises(ValueError):
+        dt.compact_address('127.0.0.1:100000')
+    with pytest.raises(ValueError):
+        dt.compact_address('256.0.0.1:80')
+
+def test_compact_hostname():
+    assert type(dt.hostname('127.0.0.1:80')) is dt.IPv4Port
+    assert type(dt.compact_hostname('127.0.0.1:80')) is dt.CompactIPv4Port
+    assert dt.compact_hostname(b'127.0.0.1:80').port == 80
+    assert type(dt.compact_hostname('127.0.0.1')) is dt.CompactIPv4Address
+    assert type(dt.compact_hostname('::1')) is dt.CompactIPv6Address
+    assert dt.compact_hostname('foo.com') == dt.Hostname('foo.com')
+    with pytest.raises(ValueError):
+        dt.hostname('foo.com:80')
+    with pytest.raises(ValueError):
+        dt.compact_hostname('127.0.0.1:100000')
+
+def test_compact_address_port_manipulation():
+    addr = dt.compact_address('127.0.0.1:80')
+    addr.port = 8080
+    assert str(addr) == '127.0.0.1:8080'
+    assert addr == dt.address('127.0.0.1')
+    addr.port = None
+    assert addr.port is None
+    assert str(addr) == '127.0.0.1'
+    addr.port = 0
+    assert str(addr) == '127.0.0.1:0'
+    with pytest.raises(ValueError):
+        addr.port = 65536
+    assert dt.CompactIPv4Port('127.0.0.1').port is None
+    addr = dt.compact_address('[::1]:80')
+    addr.port = 8080
+    assert str(addr) == '[::1]:8080'
+    assert addr == dt.address('::1')
+    addr.port = None
+    assert str(addr) == '::1'
+
+def test_compact_address_pickle():
+    for s in ('127.0.0.1:80', '127.0.0.1', '[::1]:80', '::1'):
+        addr = dt.compact_address(s)
+        copy = pickle.loads(pickle.dumps(addr))
+        assert copy == addr
+        assert type(copy) == type(addr)
+        assert str(copy) == s
+
+def test_compact_address_geoip_countries():
+    with mock.patch('lars.geoip._GEOIP_IPV4_GEO') as mock_db:
+        mock_db.country_code_by_addr.return_value = 'GB'
+        assert dt.compact_address('1.2.3.4:80').country == 'GB'
+        mock_db.country_code_by_addr.assert_called_with('1.2.3.4')
+        assert dt.address('1.2.3.4:80').country == 'GB'
+        mock_db.country_code_by_addr.assert_called_with('1.2.3.4')
+        assert dt.address('1.2.3.4:80').compressed == '1.2.3.4:80'
+        assert dt.compact_address('1.2.3.4:80').compressed == '1.2.3.4:80'
+        assert dt.compact_address('1.2.3.4').country == 'GB'
+
 def test_address_geoip_countries():
     with mock.patch('lars.geoip._GEOIP_IPV4_GEO') as mock_db:
         mock_db.country_code_by_addr.return_value = 'AA'
@@ -256,7 +426,9 @@ def test_address_geoip_countries():
         assert dt.address('::1').country == 'BB'
 
 def test_address_geoip_cities():
-    with mock.patch('lars.geoip._GEOIP_IPV4_GEO') as mock_db:
+    # Disable the query cache as the results of the same queries change
+    with mock.patch('lars.geoip._GEOIP_CACHE_SIZE', 0), \
+            mock.patch('lars.geoip._GEOIP_IPV4_GEO') as mock_db:
         mock_db.region_by_addr.return_value = {'region_name': 'AA'}
         assert dt.address('127.0.0.1').region == 'AA'
         mock_db.record_by_addr.return_value = {'city': 'Timbuktu'}
@@ -266,7 +438,8 @@ def test_address_geoip_cities():
         mock_db.record_by_addr.return_value = None
         assert dt.address('127.0.0.1').city is None
         assert dt.address('127.0.0.1').coords is None
-    with mock.patch('lars.geoip._GEOIP_IPV6_GEO') as mock_db:
+    with mock.patch('lars.geoip._GEOIP_CACHE_SIZE', 0), \
+            mock.patch('lars.geoip._GEOIP_IPV6_GEO') as mock_db:
         mock_db.region_by_addr.return_value = {'region_name': 'BB'}
         assert dt.address('::1').region == 'BB'
         mock_db.record_by_addr.return_value = {'city': 'Transylvania'}
@@ -315,6 +488,12 @@ def test_address():
         assert dt.address('0.0.0.0').hostname is None
         from_address.return_value = '::'
         assert dt.address('::').hostname is None
+        # The lookup excludes the port of the port types
+        from_address.return_value = 'localhost'
+        assert dt.address('127.0.0.1:80').hostname == dt.Hostname('localhost')
+        from_address.assert_called_with('127.0.0.1')
+        assert dt.address('[::1]:80').hostname == dt.Hostname('localhost')
+        from_address.assert_called_with('::1')
 
 def test_sqlite_adapters():
     pp = sqlite3.PrepareProtocol
@@ -30,11 +30,13 @@ from __future__ import (
     )
 
 import socket
+import threading
+from collections import namedtuple
 
 import pytest
 import mock
 
-from lars import dns
+from lars import dns, cache, datatypes as dt
 
 
 def test_from_address():
@@ -60,3 +62,190 @@ def test_to_address():
             ]
         assert dns.to_address('dualstack-localhost') == '127.0.0.1'
 
+def stub_getnameinfo(sockaddr, flags):
+    # A stub resolver which "resolves" addresses in 10.0.0.0/8 only
+    if sockaddr[0].startswith('10.'):
+        return ('host-%s.example.com' % sockaddr[0].replace('.', '-'), '0')
+    return (sockaddr[0], '0')
+
+def test_resolve_many():
+    dns.from_address.cache_clear()
+    with mock.patch('tests.test_dns.dns.socket.getnameinfo') as getnameinfo:
+        getnameinfo.side_effect = stub_getnameinfo
+        result = dns.resolve_many([
+            '10.0.0.1', dt.address('10.0.0.2:80'), None, '10.0.0.1',
+            dt.address('192.168.0.1'), dt.address('::1'),
+            ])
+        assert result == {
+            '10.0.0.1': 'host-10-0-0-1.example.com',
+            '10.0.0.2': 'host-10-0-0-2.example.com',
+            '192.168.0.1': '192.168.0.1',
+            '::1': '::1',
+            }
+        assert getnameinfo.call_count == 4
+        # Results are cached
+        assert dns.from_address('10.0.0.1') == 'host-10-0-0-1.example.com'
+        assert getnameinfo.call_count == 4
+    with pytest.raises(ValueError):
+        dns.resolve_many([], workers=0)
+
+def test_resolve_many_concurrent():
+    dns.from_address.cache_clear()
+    # Each lookup waits for all the others to start; if they weren't run
+    # concurrently the barrier would break
+    barrier = threading.Barrier(5, timeout=5)
+    def getnameinfo(sockaddr, flags):
+        barrier.wait()
+        return stub_getnameinfo(sockaddr, flags)
+    with mock.patch('tests.test_dns.dns.socket.getnameinfo', getnameinfo):
+        addresses = ['10.0.0.%d' % i for i in range(5)]
+        result = dns.resolve_many(addresses, workers=5)
+        assert sorted(result) == addresses
+
+def test_resolve_many_timeout():
+    dns.from_address.cache_clear()
+    release = threading.Event()
+    def getnameinfo(sockaddr, flags):
+        if sockaddr[0] == '10.0.0.2':
+            release.wait(5)
+        return stub_getnameinfo(sockaddr, flags)
+    with mock.patch('tests.test_dns.dns.socket.getnameinfo', getnameinfo):
+        try:
+            result = dns.resolve_many(
+                ['10.0.0.1', '10.0.0.2'], workers=2, timeout=0.1)
+            assert result == {'10.0.0.1': 'host-10-0-0-1.example.com'}
+        finally:
+            release.set()
+
+def test_resolve_many_errors():
+    dns.from_address.cache_clear()
+    def getnameinfo(sockaddr, flags):
+        if sockaddr[0] == '10.0.0.2':
+            raise socket.gaierror('lookup failed')
+        return stub_getnameinfo(sockaddr, flags)
+    with mock.patch('tests.test_dns.dns.socket.getnameinfo', getnameinfo):
+        result = dns.resolve_many(['10.0.0.1', '10.0.0.2'])
+        assert result == {'10.0.0.1': 'host-10-0-0-1.example.com'}
+
+def test_prefetch():
+    dns.from_address.cache_clear()
+    Row = namedtuple('Row', ('remote_ip', 'remote_host', 'remote_user'))
+    rows = [
+        Row(dt.address('10.0.0.%d' % (i % 3)), dt.hostname('foo.com'), 'bob')
+        for i in range(10)
+        ] + [Row(None, None, None)]
+    with mock.patch('tests.test_dns.dns.socket.getnameinfo') as getnameinfo:
+        getnameinfo.side_effect = stub_getnameinfo
+        result = []
+        for row in dns.prefetch(iter(rows), lookahead=4):
+            # By the time the row arrives its lookup must have been performed
+            if row.remote_ip is not None:
+                calls = getnameinfo.call_count
+                assert row.remote_ip.hostname == 'host-%s.example.com' % (
+                    str(row.remote_ip).replace('.', '-'))
+                assert getnameinfo.call_count == calls
+            result.append(row)
+        assert result == rows
+        assert getnameinfo.call_count == 3
+    with mock.patch('tests.test_dns.dns.socket.getnameinfo') as getnameinfo:
+        getnameinfo.side_effect = stub_getnameinfo
+        assert list(dns.prefetch(rows, fields=['remote_host'])) == rows
+        assert getnameinfo.call_count == 0
+    # Addresses which leave the cache (e.g. by eviction or expiry) while
+    # prefetching are looked up again
+    def clearing_rows():
+        yield rows[0]
+        yield rows[1]
+        dns.from_address.cache_clear()
+        yield rows[3]
+    dns.from_address.cache_clear()
+    with mock.patch('tests.test_dns.dns.socket.getnameinfo') as getnameinfo:
+        getnameinfo.side_effect = stub_getnameinfo
+        assert list(dns.prefetch(clearing_rows(), lookahead=1)) == [
+            rows[0], rows[1], rows[3]]
+        assert getnameinfo.call_count == 3
+    with pytest.raises(ValueError):
+        list(dns.prefetch(rows, workers=0))
+    with pytest.raises(ValueError):
+        list(dns.prefetch(rows, lookahead=0))
+
+
+def test_init_caches():
+    try:
+        dns.init_caches(maxsize=100, shards=4, clock=True)
+        assert isinstance(dns.FROM_ADDRESS_CACHE, cache.ShardedLRUCache)
+        assert dns.from_address.cache is dns.FROM_ADDRESS_CACHE
+        assert dns.to_address.cache is dns.TO_ADDRESS_CACHE
+        with mock.patch('tests.test_dns.dns.socket.getnameinfo') as getnameinfo:
+            getnameinfo.side_effect = stub_getnameinfo
+            assert dns.from_address('10.0.0.1') == 'host-10-0-0-1.example.com'
+            assert dns.from_address('10.0.0.1') == 'host-10-0-0-1.example.com'
+            assert getnameinfo.call_count == 1
+        assert dns.from_address.cache_info() == (1, 1, 100, 1)
+    finally:
+        dns.init_caches()
+    assert isinstance(dns.FROM_ADDRESS_CACHE, cache.LRUCache)
+    assert dns.from_address.cache_info() == (0, 0, 10000, 0)
+
+
+def test_init_caches_ttl():
+    now = [0.0]
+    try:
+        with mock.patch('lars.cache._monotonic', lambda: now[0]):
+            dns.init_caches(maxsize=100, ttl=60, negative_ttl=5)
+        assert isinstance(dns.FROM_ADDRESS_CACHE, cache.TTLCache)
+        assert dns.to_address.cache is dns.TO_ADDRESS_CACHE
+        with mock.patch('tests.test_dns.dns.socket.getnameinfo') as getnameinfo:
+            getnameinfo.side_effect = [
+                ('host.example.com', 0), ('10.0.0.2', 0),
+                ('10.0.0.2', 0), ('host.example.com', 0)]
+            assert dns.from_address('10.0.0.1') == 'host.example.com'
+            assert dns.from_address('10.0.0.2') == '10.0.0.2'
+            now[0] = 5
+            # The negative result has expired; the positive one hasn't
+            assert dns.from_address('10.0.0.1') == 'host.example.com'
+            assert dns.from_address('10.0.0.2') == '10.0.0.2'
+            assert getnameinfo.call_count == 3
+            now[0] = 60
+            assert dns.from_address('10.0.0.1') == 'host.example.com'
+            assert getnameinfo.call_count == 4
+        with mock.patch('lars.cache._monotonic', lambda: now[0]):
+            dns.init_caches(maxsize=100, shards=4, ttl=60)
+        assert isinstance(dns.TO_ADDRESS_CACHE, cache.ShardedLRUCache)
+        with mock.patch('tests.test_dns.dns.socket.getaddrinfo') as getaddrinfo:
+            getaddrinfo.side_effect = socket.gaierror
+            assert dns.to_address('nowhere.example.com') is None
+            assert dns.to_address('nowhere.example.com') is None
+            assert getaddrinfo.call_count == 1
+            now[0] = 120
+            assert dns.to_address('nowhere.example.com') is None
+            assert getaddrinfo.call_count == 2
+        with pytest.raises(ValueError):
+            dns.init_caches(negative_ttl=5)
+    finally:
+        dns.init_caches()
+
+
+def test_init_caches_file(tmpdir):
+    filename = str(tmpdir.join('dns.db'))
+    try:
+        dns.init_caches(filename=filename)
+        assert isinstance(dns.FROM_ADDRESS_CACHE, cache.PersistentCache)
+        assert isinstance(dns.FROM_ADDRESS_CACHE.front, cache.LRUCache)
+        with mock.patch('tests.test_dns.dns.socket.getnameinfo') as getnameinfo, \
+                mock.patch('tests.test_dns.dns.socket.getaddrinfo') as getaddrinfo:
+            getnameinfo.side_effect = stub_getnameinfo
+            getaddrinfo.side_effect = socket.gaierror
+            assert dns.from_address('10.0.0.1') == 'host-10-0-0-1.example.com'
+            assert dns.to_address('nowhere.example.com') is None
+            # A new process (simulated by re-initializing the caches) reads
+            # the results of the prior one
+            dns.init_caches(maxsize=10, shards=2, filename=filename)
+            assert dns.from_address('10.0.0.1') == 'host-10-0-0-1.example.com'
+            assert dns.to_address(
+                'nowhere.example.com', socket.AF_UNSPEC) is None
+            assert getnameinfo.call_count == 1
+            assert getaddrinfo.call_count == 1
+            assert dns.FROM_ADDRESS_CACHE.info().hits == 1
+    finally:
+        dns.init_caches()
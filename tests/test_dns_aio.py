@@ -0,0 +1,161 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import sys
+import socket
+import threading
+
+import pytest
+import mock
+
+if sys.version_info < (3, 5):
+    pytest.skip(
+        'lars.dns.aio requires Python 3.5 or later', allow_module_level=True)
+
+import asyncio
+
+from lars import dns, datatypes as dt
+from lars.dns import aio
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def stub_getnameinfo(sockaddr, flags):
+    # A stub resolver which "resolves" addresses in 10.0.0.0/8 only
+    if sockaddr[0].startswith('10.'):
+        return ('host-%s.example.com' % sockaddr[0].replace('.', '-'), '0')
+    return (sockaddr[0], '0')
+
+def test_from_address():
+    dns.from_address.cache_clear()
+    with mock.patch('socket.getnameinfo') as getnameinfo:
+        getnameinfo.side_effect = stub_getnameinfo
+        assert run(aio.from_address('10.0.0.1')) == 'host-10-0-0-1.example.com'
+        getnameinfo.assert_called_once_with(('10.0.0.1', 0), 0)
+        assert run(aio.from_address('::1')) == '::1'
+        getnameinfo.assert_called_with(('::1', 0, 0, 0), 0)
+        # The cache is shared with the synchronous functions
+        assert run(aio.from_address('10.0.0.1')) == 'host-10-0-0-1.example.com'
+        assert dns.from_address('10.0.0.1') == 'host-10-0-0-1.example.com'
+        assert dt.address('10.0.0.1').hostname == 'host-10-0-0-1.example.com'
+        assert getnameinfo.call_count == 2
+        assert dns.from_address('10.0.0.2') == 'host-10-0-0-2.example.com'
+        assert run(aio.from_address('10.0.0.2')) == 'host-10-0-0-2.example.com'
+        assert getnameinfo.call_count == 3
+
+def test_to_address():
+    dns.to_address.cache_clear()
+    with mock.patch('socket.getaddrinfo') as getaddrinfo:
+        getaddrinfo.return_value = [
+            (socket.AF_INET6, 0, 0, 0, ('::1', 0, 0, 0)),
+            (socket.AF_INET, 0, 0, 0, ('127.0.0.1', 0)),
+            ]
+        assert run(aio.to_address('localhost')) == '127.0.0.1'
+        assert dns.to_address('localhost') == '127.0.0.1'
+        assert getaddrinfo.call_count == 1
+        # Negative lookups are cached too
+        getaddrinfo.side_effect = socket.gaierror('not found')
+        assert run(aio.to_address('foo.invalid')) is None
+        assert dns.to_address('foo.invalid') is None
+        assert getaddrinfo.call_count == 2
+
+def test_from_address_shared():
+    # Concurrent lookups of the same address share a single query
+    dns.from_address.cache_clear()
+    with mock.patch('socket.getnameinfo') as getnameinfo:
+        getnameinfo.side_effect = stub_getnameinfo
+        async def lookups():
+            return await asyncio.gather(
+                *(aio.from_address('10.0.0.1') for i in range(5)))
+        assert run(lookups()) == ['host-10-0-0-1.example.com'] * 5
+        assert getnameinfo.call_count == 1
+        assert not any(aio._DEFAULT_RESOLVER._pending.values())
+
+def test_persistent_cache(tmpdir):
+    # The persistent caches are accessed outside the event loop's thread
+    filename = str(tmpdir.join('dns.db'))
+    threads = set()
+    try:
+        dns.init_caches(filename=filename)
+        get = dns.FROM_ADDRESS_CACHE.get
+        def spy_get(*args):
+            threads.add(threading.current_thread())
+            return get(*args)
+        with mock.patch('socket.getnameinfo') as getnameinfo, \
+                mock.patch.object(dns.FROM_ADDRESS_CACHE, 'get', spy_get):
+            getnameinfo.side_effect = stub_getnameinfo
+            assert run(aio.from_address('10.0.0.1')) == 'host-10-0-0-1.example.com'
+            assert run(aio.from_address('10.0.0.1')) == 'host-10-0-0-1.example.com'
+            assert getnameinfo.call_count == 1
+        assert threads and threading.current_thread() not in threads
+    finally:
+        dns.init_caches()
+
+def test_resolver_limit():
+    dns.from_address.cache_clear()
+    lock = threading.Lock()
+    # Lookups must proceed in pairs; with a limit of 1 the barrier would
+    # break, and with a limit above 2 active would exceed 2
+    barrier = threading.Barrier(2, timeout=5)
+    state = {'active': 0, 'peak': 0}
+    def getnameinfo(sockaddr, flags):
+        with lock:
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+        barrier.wait()
+        with lock:
+            state['active'] -= 1
+        return stub_getnameinfo(sockaddr, flags)
+    with mock.patch('socket.getnameinfo', getnameinfo):
+        resolver = aio.Resolver(limit=2)
+        addresses = ['10.0.0.%d' % i for i in range(6)]
+        result = run(resolver.resolve_many(addresses + [None, '10.0.0.1']))
+        assert sorted(result) == addresses
+        assert state['peak'] == 2
+    with pytest.raises(ValueError):
+        aio.Resolver(limit=0)
+
+def test_resolve_many_errors():
+    dns.from_address.cache_clear()
+    def getnameinfo(sockaddr, flags):
+        if sockaddr[0] == '10.0.0.2':
+            raise socket.gaierror('lookup failed')
+        return stub_getnameinfo(sockaddr, flags)
+    with mock.patch('socket.getnameinfo', getnameinfo):
+        result = run(aio.resolve_many(
+            [dt.address('10.0.0.1:80'), '10.0.0.2', 42]))
+        assert result == {'10.0.0.1': 'host-10-0-0-1.example.com'}
@@ -40,6 +40,10 @@ except ImportError:
 import pygeoip
 import pytest
 import mock
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 from lars import geoip
 
@@ -142,3 +146,153 @@ def test_org():
         geoip.org_by_addr(IPv6Address('::1'))
         assert mock_db.org_by_addr.called_with('::1')
 
+def make_country_db(filename):
+    # Builds a tiny country database with 0.0.0.0/2 in the US, 64.0.0.0/2 in
+    # GB (as two adjacent /3 ranges), and nothing in 128.0.0.0/1
+    begin = pygeoip.const.COUNTRY_BEGIN
+    us = begin + pygeoip.const.COUNTRY_CODES.index('US')
+    gb = begin + pygeoip.const.COUNTRY_CODES.index('GB')
+    def node(left, right):
+        return bytes(bytearray(
+            [left & 0xff, (left >> 8) & 0xff, left >> 16,
+             right & 0xff, (right >> 8) & 0xff, right >> 16]))
+    with open(filename, 'wb') as f:
+        f.write(node(1, begin) + node(us, 2) + node(gb, gb) + b'\0' * 100)
+
+@pytest.fixture
+def country_db(tmpdir):
+    filename = str(tmpdir.join('country.dat'))
+    make_country_db(filename)
+    with mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_GEO',
+                    pygeoip.GeoIP(filename, pygeoip.MEMORY_CACHE)), \
+            mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_INDEX', None):
+        yield
+
+@pytest.mark.skipif(np is None, reason='NumPy is not installed')
+def test_build_index(country_db):
+    index = geoip.build_index()
+    assert geoip._GEOIP_IPV4_INDEX is index
+    assert len(index) == 2
+    assert index.starts.tolist() == [0, 0x40000000]
+    assert index.ends.tolist() == [0x3fffffff, 0x7fffffff]
+    assert index.find([1, 0x50000000, 0x80000000]).tolist() == [0, 1, -1]
+    assert index.lookup(IPv4Address('1.2.3.4')) == 'US'
+    assert index.lookup(IPv4Address('127.255.255.255')) == 'GB'
+    assert index.lookup(IPv4Address('200.1.1.1')) is None
+    assert geoip.country_code_by_addr(IPv4Address('70.1.1.1')) == 'GB'
+
+@pytest.mark.skipif(np is None, reason='NumPy is not installed')
+def test_build_index_errors(country_db):
+    with mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_GEO', None):
+        with pytest.raises(ValueError):
+            geoip.build_index()
+    with mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_GEO._databaseType',
+                    pygeoip.const.ORG_EDITION):
+        with pytest.raises(ValueError):
+            geoip.build_index()
+    with mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_GEO._memory', ''):
+        with mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_GEO._fp') as fp:
+            fp.read.return_value = b'\0' * 8
+            with pytest.raises(ValueError):
+                geoip.build_index()
+
+@pytest.mark.skipif(np is None, reason='NumPy is not installed')
+def test_lookup_many(country_db):
+    addresses = [
+        IPv4Address('1.2.3.4'), IPv4Address('70.1.1.1'), None,
+        IPv4Address('200.1.1.1'), IPv4Address('1.2.3.5'),
+        ]
+    with mock.patch('tests.test_geoip.geoip._GEOIP_IPV6_GEO') as mock_db:
+        mock_db.country_code_by_addr.return_value = 'FR'
+        expected = ['US', 'GB', None, None, 'US', 'FR']
+        assert geoip.lookup_many(addresses + [IPv6Address('::1')]).tolist() == expected
+        geoip.build_index()
+        assert geoip.lookup_many(addresses + [IPv6Address('::1')]).tolist() == expected
+    ints = np.array([1, 0x50000000, 0x80000000], dtype=np.uint32)
+    assert geoip.lookup_many(ints).tolist() == ['US', 'GB', None]
+    with pytest.raises(ValueError):
+        geoip.lookup_many(ints, 'foo')
+
+
+def test_query_cache():
+    with mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_GEO') as mock_db:
+        mock_db._databaseType = pygeoip.const.CITY_EDITION_REV1
+        mock_db.record_by_addr.return_value = {
+            'country_code': 'GB', 'region_code': 'H9', 'city': 'London',
+            'longitude': -0.1, 'latitude': 51.5}
+        address = IPv4Address('81.2.69.160')
+        assert geoip.country_code_by_addr(address) == 'GB'
+        assert geoip.region_by_addr(address) is None
+        assert geoip.city_by_addr(address) == 'London'
+        assert geoip.coords_by_addr(address) == (-0.1, 51.5)
+        assert mock_db.record_by_addr.call_count == 1
+        mock_db.record_by_addr.assert_called_once_with('81.2.69.160')
+        assert not mock_db.country_code_by_addr.called
+        assert not mock_db.region_by_addr.called
+    with mock.patch('tests.test_geoip.geoip._GEOIP_IPV4_ORG') as mock_db:
+        mock_db.org_by_addr.return_value = None
+        assert geoip.org_by_addr(IPv4Address('81.2.69.160')) is None
+        assert geoip.org_by_addr(IPv4Address('81.2.69.160')) is None
+        assert mock_db.org_by_addr.call_count == 1
+
+def test_query_persistent_cache(tmpdir):
+    filename = str(tmpdir.join('country.dat'))
+    cache_filename = str(tmpdir.join('cache.db'))
+    make_country_db(filename)
+    with mock.patch.multiple(
+            'tests.test_geoip.geoip', _GEOIP_IPV4_GEO=None,
+            _GEOIP_IPV4_INDEX=None, _GEOIP_CACHE_SIZE=10000,
+            _GEOIP_STORE=None):
+        try:
+            geoip.init_databases(filename, cache_filename=cache_filename)
+            assert geoip.country_code_by_addr(IPv4Address('1.2.3.4')) == 'US'
+            assert not geoip.country_code_by_addr(IPv4Address('129.0.0.1'))
+            assert len(geoip._GEOIP_STORE) == 2
+            # Results are read from the persistent cache after
+            # re-initialization (which empties the in-memory cache)
+            geoip.init_databases(filename, cache_filename=cache_filename)
+            with mock.patch.object(
+                    geoip._GEOIP_IPV4_GEO, 'country_code_by_addr') as query:
+                assert geoip.country_code_by_addr(
+                    IPv4Address('1.2.3.4')) == 'US'
+                assert not geoip.country_code_by_addr(
+                    IPv4Address('129.0.0.1'))
+                assert query.call_count == 0
+            assert geoip._GEOIP_STORE.info().hits == 2
+            # Results of a modified database are not used
+            stat = os.stat(filename)
+            os.utime(filename, (stat.st_atime, stat.st_mtime + 10))
+            geoip.init_databases(filename, cache_filename=cache_filename)
+            with mock.patch.object(
+                    geoip._GEOIP_IPV4_GEO, 'country_code_by_addr') as query:
+                query.return_value = 'GB'
+                assert geoip.country_code_by_addr(
+                    IPv4Address('1.2.3.4')) == 'GB'
+            geoip.init_databases(filename)
+            assert geoip._GEOIP_STORE is None
+            # Replaced databases are forgotten
+            assert list(geoip._GEOIP_FILENAMES) == [geoip._GEOIP_IPV4_GEO]
+            assert set(geoip._GEOIP_STORE_KEYS) <= {geoip._GEOIP_IPV4_GEO}
+        finally:
+            if geoip._GEOIP_STORE is not None:
+                geoip._GEOIP_STORE.close()
+
+def test_query_cache_size():
+    with mock.patch('tests.test_geoip.geoip.pygeoip.GeoIP') as mock_class, \
+            mock.patch.multiple(
+                'tests.test_geoip.geoip', _GEOIP_IPV4_GEO=None,
+                _GEOIP_IPV4_INDEX=None, _GEOIP_CACHE_SIZE=10000):
+        mock_db = mock_class.return_value
+        mock_db.country_code_by_addr.return_value = 'GB'
+        geoip.init_databases('geo.dat', cache_size=1)
+        assert geoip.country_code_by_addr(IPv4Address('81.2.69.160')) == 'GB'
+        assert geoip.country_code_by_addr(IPv4Address('81.2.69.160')) == 'GB'
+        assert mock_db.country_code_by_addr.call_count == 1
+        assert geoip.country_code_by_addr(IPv4Address('81.2.69.161')) == 'GB'
+        assert len(geoip._GEOIP_CACHE) == 1
+        geoip.init_databases('geo.dat', cache_size=0)
+        assert not geoip._GEOIP_CACHE
+        assert geoip.country_code_by_addr(IPv4Address('81.2.69.160')) == 'GB'
+        assert not geoip._GEOIP_CACHE
+        with pytest.raises(ValueError):
+            geoip.init_databases('geo.dat', cache_size=-1)
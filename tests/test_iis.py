@@ -29,9 +29,11 @@ from __future__ import (
     division,
     )
 
+import io
+
 import pytest
 
-from lars import iis, datatypes as dt
+from lars import iis, timing, datatypes as dt
 
 
 # Make Py2 str same as Py3
@@ -230,6 +232,185 @@ def test_source_normal():
         assert row
         assert count + 1 == source.count
 
+def test_source_datetime_format():
+    # Subclasses may override the format of timestamps in directives
+    class DayFirstSource(iis.IISSource):
+        DATETIME_FORMAT = '%Y-%d-%m %H:%M:%S'
+    with DayFirstSource([
+            '#Version: 1.0\n',
+            '#Date: 2002-24-05 20:18:01\n',
+            '#Fields: date time\n',
+            ]) as source:
+        assert list(source) == []
+        assert source.date == dt.DateTime(2002, 5, 24, 20, 18, 1)
+
+def test_source_fields():
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True),
+            fields=['sc-status', 'c_ip', 'time-taken']) as source:
+        rows = list(source)
+        assert source.count == 1
+        assert len(source.fields) == 15
+    assert rows[0]._fields == ('c_ip', 'sc_status', 'time_taken')
+    assert str(rows[0].c_ip) == '172.224.24.114'
+    assert rows[0].sc_status == 200
+    assert rows[0].time_taken == 31.0
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True), fields=['cs_bytes']) as source:
+        assert list(source) == [(248,)]
+    with pytest.raises(iis.IISFieldsError):
+        with iis.IISSource(
+                INTERNET_EXAMPLE.splitlines(True), fields=['foo']) as source:
+            for row in source:
+                pass
+
+def test_source_profile():
+    with iis.IISSource(INTERNET_EXAMPLE.splitlines(True)) as source:
+        assert source.profile is None
+        expected = list(source)
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True), profile=True) as source:
+        assert list(source) == expected
+        stages = source.profile.as_dict()
+    assert stages['match']['calls'] == 1
+    assert stages['row']['calls'] == 1
+    assert stages['parse.sc_status']['calls'] == 1
+    profile = timing.Profile()
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True), profile=profile) as source:
+        assert list(source.iter_batches()) == [expected]
+    assert profile.stages['row'].calls == 1
+    with pytest.raises(ValueError):
+        iis.IISSource([], profile='foo')
+
+def test_source_batches(recwarn):
+    lines = INTERNET_EXAMPLE.splitlines(True)
+    lines += lines[-1:] * 4
+    with iis.IISSource(lines) as source:
+        expected = list(source)
+    with iis.IISSource(lines) as source:
+        batches = list(source.iter_batches(3))
+        assert source.count == 5
+        assert source.software == 'Microsoft Internet Information Services 6.0'
+    assert [len(batch) for batch in batches] == [1, 3, 1]
+    assert [row for batch in batches for row in batch] == expected
+    with iis.IISSource(BAD_DATA_EXAMPLE_01.splitlines(True)) as source:
+        assert list(source.iter_batches()) == []
+    assert str(recwarn.pop(iis.IISWarning).message).startswith('Line 4: ')
+    with iis.IISSource(MISSING_FIELDS.splitlines(True)) as source:
+        with pytest.raises(iis.IISFieldsError) as exc:
+            list(source.iter_batches())
+        assert exc.value.line_number == 4
+    with pytest.raises(ValueError):
+        list(iis.IISSource([]).iter_batches(0))
+
+def test_source_mmap(recwarn, tmpdir):
+    lines = INTERNET_EXAMPLE.splitlines(True)
+    lines += lines[-1:] * 4
+    with iis.IISSource(lines) as source:
+        expected = list(source)
+    filename = str(tmpdir.join('ex.log'))
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        with iis.IISSource(f) as source:
+            assert list(source.iter_mmap()) == expected
+            assert source.count == 5
+            assert source.software == 'Microsoft Internet Information Services 6.0'
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(BAD_DATA_EXAMPLE_01)
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        with iis.IISSource(f) as source:
+            assert list(source.iter_mmap()) == []
+    assert str(recwarn.pop(iis.IISWarning).message).startswith('Line 4: ')
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(MISSING_FIELDS)
+    with io.open(filename, 'r', encoding='utf-8') as f:
+        with iis.IISSource(f) as source:
+            with pytest.raises(iis.IISFieldsError) as exc:
+                list(source.iter_mmap())
+            assert exc.value.line_number == 4
+
+def test_source_intern():
+    lines = INTERNET_EXAMPLE.splitlines(True)
+    lines += lines[-1:]
+    with iis.IISSource(lines) as source:
+        expected = list(source)
+    assert expected[0].cs_User_Agent is not expected[1].cs_User_Agent
+    with iis.IISSource(lines, intern=True) as source:
+        rows = list(source)
+    assert rows == expected
+    assert rows[0].cs_User_Agent is rows[1].cs_User_Agent
+    assert rows[0].cs_uri_stem is not rows[1].cs_uri_stem
+    # Addresses have writable attributes so they aren't interned by default
+    assert rows[0].s_ip is not rows[1].s_ip
+    with iis.IISSource(lines, intern=['cs-uri-stem']) as source:
+        rows = list(source)
+    assert rows == expected
+    assert rows[0].cs_uri_stem is rows[1].cs_uri_stem
+    with iis.IISSource(lines, intern=['foo']) as source:
+        with pytest.raises(iis.IISFieldsError):
+            list(source)
+
+def test_source_url_cache():
+    lines = INTERNET_EXAMPLE.splitlines(True)
+    lines += lines[-1:]
+    with iis.IISSource(lines) as source:
+        expected = list(source)
+    with iis.IISSource(lines, url_cache=True) as source:
+        rows = list(source)
+    assert rows == expected
+    assert rows[0].cs_uri_stem is rows[1].cs_uri_stem
+
+def test_source_compact():
+    lines = INTERNET_EXAMPLE.splitlines(True)
+    lines[-1] = lines[-1].replace('172.224.24.114', '172.224.24.114:1234')
+    with iis.IISSource(lines) as source:
+        expected = list(source)
+    with iis.IISSource(lines, compact=True) as source:
+        rows = list(source)
+    assert rows == expected
+    assert isinstance(rows[0].c_ip, dt.CompactIPv4Port)
+    assert rows[0].c_ip.port == 1234
+
+def test_source_timestamp():
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True), timestamp=True) as source:
+        row, = list(source)
+        assert source.fields[:3] == ['date', 'time', 'c-ip']
+    assert row._fields[:2] == ('timestamp', 'c_ip')
+    assert row.timestamp == dt.DateTime(2002, 5, 24, 20, 18, 1)
+    assert row.c_ip == dt.address('172.224.24.114')
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True), fields=['timestamp', 'sc-status'],
+            timestamp=True) as source:
+        assert list(source) == [(dt.DateTime(2002, 5, 24, 20, 18, 1), 200)]
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True), fields=['date'],
+            timestamp=True) as source:
+        with pytest.raises(iis.IISFieldsError):
+            list(source)
+    with iis.IISSource(
+            BAD_DATA_EXAMPLE_01.replace('time c-ip', 'c-ip time').splitlines(True),
+            timestamp=True) as source:
+        with pytest.raises(iis.IISFieldsError):
+            list(source)
+
+def test_source_fields_cache():
+    with iis.IISSource(INTERNET_EXAMPLE.splitlines(True)) as source1:
+        rows1 = list(source1)
+    with iis.IISSource(INTERNET_EXAMPLE.splitlines(True)) as source2:
+        rows2 = list(source2)
+    assert rows1 == rows2
+    assert source1._row_type is source2._row_type
+    assert source1._row_pattern is source2._row_pattern
+    assert source1.fields == source2.fields
+    assert source1.fields is not source2.fields
+    with iis.IISSource(
+            INTERNET_EXAMPLE.splitlines(True), timestamp=True) as source3:
+        list(source3)
+    assert source3._row_type is not source1._row_type
+
 def test_source_invalid_headers():
     with pytest.raises(iis.IISVersionError):
         with iis.IISSource(BAD_VERSION.splitlines(True)) as source:
@@ -0,0 +1,116 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+
+import io as _io
+import gzip
+import bz2
+
+import pytest
+
+from lars import io, apache
+
+
+# Make Py2 str same as Py3
+str = type('')
+
+
+CONTENT = ''.join(
+    '192.168.0.%d - - [07/Mar/2004:16:56:39 -0800] "GET /page/%d.html HTTP/1.1" 200 %d\n' % (i % 256, i, i)
+    for i in range(1000))
+
+
+def write_compressed(tmpdir, opener, name):
+    filename = str(tmpdir.join(name))
+    f = opener(filename, 'wb')
+    try:
+        f.write(CONTENT.encode('utf-8'))
+    finally:
+        f.close()
+    return filename
+
+
+@pytest.fixture(params=['gzip', 'bz2', 'xz', 'zstd'])
+def compressed(request, tmpdir):
+    if request.param == 'gzip':
+        return write_compressed(tmpdir, gzip.GzipFile, 'access.log.1.gz')
+    elif request.param == 'bz2':
+        return write_compressed(tmpdir, bz2.BZ2File, 'access.log.1.bz2')
+    elif request.param == 'xz':
+        lzma = pytest.importorskip('lzma')
+        return write_compressed(tmpdir, lzma.LZMAFile, 'access.log.1.xz')
+    else:
+        zstandard = pytest.importorskip('zstandard')
+        filename = str(tmpdir.join('access.log.1.zst'))
+        with _io.open(filename, 'wb') as f:
+            f.write(zstandard.ZstdCompressor().compress(
+                CONTENT.encode('utf-8')))
+        return filename
+
+
+@pytest.mark.parametrize('threaded', [True, False])
+def test_open_compressed(compressed, threaded):
+    with io.open_log(compressed, threaded=threaded, buffer_size=4096) as f:
+        assert f.read() == CONTENT
+    with io.open_log(compressed, threaded=threaded, buffer_size=4096) as f:
+        with apache.ApacheSource(f) as source:
+            rows = list(source)
+    assert len(rows) == 1000
+    assert rows[-1].size == 999
+
+
+def test_open_uncompressed(tmpdir):
+    filename = str(tmpdir.join('access.log'))
+    with _io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(CONTENT)
+    with io.open_log(filename) as f:
+        assert f.read() == CONTENT
+
+
+def test_open_early_close(compressed):
+    # Closing before the background thread has finished must not hang
+    f = io.open_log(compressed, buffer_size=16, queue_size=1)
+    assert f.readline() == CONTENT.splitlines(True)[0]
+    f.close()
+    assert f.closed
+
+
+def test_open_errors(tmpdir):
+    with pytest.raises(ValueError):
+        io.open_log('foo.log', buffer_size=0)
+    with pytest.raises(ValueError):
+        io.open_log('foo.log', queue_size=0)
+    filename = str(tmpdir.join('access.log.gz'))
+    with _io.open(filename, 'wb') as f:
+        f.write(b'\x1f\x8bgarbage')
+    with io.open_log(filename) as f:
+        with pytest.raises(Exception):
+            f.read()
@@ -0,0 +1,196 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import io
+import warnings
+
+import pytest
+
+from lars import apache, iis, parallel, datatypes as dt
+
+
+# Make Py2 str same as Py3
+str = type('')
+
+
+APACHE_LINE = '192.168.%d.%d - - [07/Mar/2004:16:%02d:39 -0800] "GET /page/%d.html HTTP/1.1" 200 %d\n'
+
+IIS_HEADER = """\
+#Software: Microsoft Internet Information Services 6.0
+#Version: 1.0
+#Date: 2002-05-24 20:18:01
+#Fields: date time c-ip cs-method cs-uri-stem sc-status sc-bytes
+"""
+
+IIS_LINE = '2002-05-24 20:%02d:01 172.224.%d.%d GET /page/%d.html 200 %d\n'
+
+
+def apache_log(count):
+    return ''.join(
+        APACHE_LINE % (i // 256, i % 256, i % 60, i, i)
+        for i in range(count))
+
+
+def iis_log(count):
+    return IIS_HEADER + ''.join(
+        IIS_LINE % (i % 60, i // 256, i % 256, i, i)
+        for i in range(count))
+
+
+def write_log(tmpdir, content):
+    filename = str(tmpdir.join('test.log'))
+    with io.open(filename, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return filename
+
+
+def test_parallel_apache(tmpdir):
+    content = apache_log(200)
+    filename = write_log(tmpdir, content)
+    expected = list(apache.ApacheSource(content.splitlines(True)))
+    with parallel.ParallelApacheSource(
+            filename, workers=2, chunk_size=500) as source:
+        rows = list(source)
+        assert rows == expected
+        assert source.count == 200
+        assert rows[0]._fields == expected[0]._fields
+    with parallel.ParallelApacheSource(
+            filename, workers=2, ordered=False, chunk_size=500) as source:
+        rows = list(source)
+        assert sorted(rows, key=lambda row: row.size) == expected
+    with parallel.ParallelApacheSource(
+            filename, fields=['status', 'size'], workers=2,
+            chunk_size=1000) as source:
+        rows = list(source)
+        assert rows == [(200, i) for i in range(200)]
+        assert rows[0]._fields == ('status', 'size')
+
+
+def test_parallel_apache_options(tmpdir):
+    content = apache_log(200)
+    filename = write_log(tmpdir, content)
+    expected = list(apache.ApacheSource(content.splitlines(True)))
+    with parallel.ParallelApacheSource(
+            filename, workers=2, chunk_size=500, intern=True, url_cache=True,
+            compact=True) as source:
+        rows = list(source)
+        assert rows == expected
+        assert type(rows[0].remote_host) is dt.CompactIPv4Address
+    with pytest.raises(ValueError):
+        parallel.ParallelApacheSource(filename, profile=True)
+    with pytest.raises(ValueError):
+        parallel.ParallelApacheSource(filename, intern=['req_User_Agent'])
+
+
+def test_parallel_apache_errors(tmpdir):
+    with pytest.raises(ValueError):
+        parallel.ParallelApacheSource('foo.log', workers=0)
+    with pytest.raises(ValueError):
+        parallel.ParallelApacheSource('foo.log', chunk_size=0)
+    with pytest.raises(ValueError):
+        parallel.ParallelApacheSource('foo.log', fields=['foo'])
+
+
+def test_parallel_apache_warnings(tmpdir):
+    lines = apache_log(100).splitlines(True)
+    lines[74] = 'foo\n'
+    filename = write_log(tmpdir, ''.join(lines))
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        with parallel.ParallelApacheSource(
+                filename, workers=2, chunk_size=500) as source:
+            rows = list(source)
+    assert len(rows) == 99
+    assert len(caught) == 1
+    assert issubclass(caught[0].category, apache.ApacheWarning)
+    assert str(caught[0].message) == 'Line 75: Line contains invalid data'
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        with parallel.ParallelApacheSource(
+                filename, workers=2, ordered=False, chunk_size=500) as source:
+            rows = list(source)
+    assert len(rows) == 99
+    assert len(caught) == 1
+    assert str(caught[0].message).startswith('Bytes ')
+
+
+def test_parallel_iis(tmpdir):
+    content = iis_log(200)
+    filename = write_log(tmpdir, content)
+    expected = list(iis.IISSource(content.splitlines(True)))
+    with parallel.ParallelIISSource(
+            filename, workers=2, chunk_size=500) as source:
+        rows = list(source)
+        assert rows == expected
+        assert source.count == 200
+        assert source.fields == [
+            'date', 'time', 'c-ip', 'cs-method', 'cs-uri-stem', 'sc-status',
+            'sc-bytes']
+    with parallel.ParallelIISSource(
+            filename, fields=['sc-bytes'], workers=2, ordered=False,
+            chunk_size=500) as source:
+        rows = list(source)
+        assert sorted(rows) == [(i,) for i in range(200)]
+    with parallel.ParallelIISSource(
+            filename, timestamp=True, workers=2, chunk_size=500) as source:
+        rows = list(source)
+        assert rows == list(iis.IISSource(
+            content.splitlines(True), timestamp=True))
+        assert rows[0]._fields[0] == 'timestamp'
+
+
+def test_parallel_iis_options(tmpdir):
+    content = iis_log(200)
+    filename = write_log(tmpdir, content)
+    expected = list(iis.IISSource(content.splitlines(True)))
+    with parallel.ParallelIISSource(
+            filename, workers=2, chunk_size=500, intern=['cs-method'],
+            url_cache=True, compact=True) as source:
+        rows = list(source)
+        assert rows == expected
+        assert type(rows[0].c_ip) is dt.CompactIPv4Address
+    with pytest.raises(ValueError):
+        parallel.ParallelIISSource(filename, profile=True)
+
+
+def test_parallel_iis_errors(tmpdir):
+    filename = write_log(tmpdir, iis_log(10).replace('#Version: 1.0\n', ''))
+    with parallel.ParallelIISSource(filename, workers=1) as source:
+        with pytest.raises(iis.IISVersionError):
+            list(source)
+    lines = iis_log(100).splitlines(True)
+    lines[80] = '#Foo: Bar\n'
+    filename = write_log(tmpdir, ''.join(lines))
+    with parallel.ParallelIISSource(
+            filename, workers=2, chunk_size=500) as source:
+        with pytest.raises(iis.IISDirectiveError) as exc:
+            list(source)
+        assert exc.value.line_number == 81
@@ -29,6 +29,7 @@ from __future__ import (
     division,
     )
 
+import re
 from datetime import datetime, date, time
 
 import pytest
@@ -40,6 +41,20 @@ from lars import parsers, datatypes
 str = type('')
 
 
+def test_cached_url_parse():
+    assert parsers.cached_url_parse('-') is None
+    assert parsers.cached_url_parse('') is None
+    url = parsers.cached_url_parse('//foo/bar')
+    assert url == datatypes.Url('', 'foo', '/bar', '', '', '')
+    assert parsers.cached_url_parse('//foo/bar') is url
+
+def test_compact_address_parse():
+    assert parsers.compact_address_parse('-') is None
+    addr = parsers.compact_address_parse('127.0.0.1:80')
+    assert isinstance(addr, datatypes.CompactIPv4Port)
+    assert str(addr) == '127.0.0.1:80'
+    assert str(parsers.compact_address_parse('[::1]:80')) == '[::1]:80'
+
 def test_url_parse():
     assert parsers.url_parse('-') is None
     assert parsers.url_parse('foo') == datatypes.Url('', '', 'foo', '', '', '')
@@ -98,6 +113,45 @@ def test_time_parse():
     with pytest.raises(ValueError):
         parsers.time_parse('abc')
 
+def test_date_iso_parse():
+    assert parsers.date_iso_parse('-') is None
+    assert parsers.date_iso_parse('2000-01-01') == date(2000, 1, 1)
+    assert parsers.date_iso_parse('1986-02-28') == date(1986, 2, 28)
+    with pytest.raises(ValueError):
+        parsers.date_iso_parse('1 Jan 2001')
+    with pytest.raises(ValueError):
+        parsers.date_iso_parse('2000-01-32')
+    with pytest.raises(ValueError):
+        parsers.date_iso_parse('2000- 1-01')
+    with pytest.raises(ValueError):
+        parsers.date_iso_parse('abc')
+
+def test_time_iso_parse():
+    assert parsers.time_iso_parse('-') is None
+    assert parsers.time_iso_parse('12:34:56') == time(12, 34, 56)
+    assert parsers.time_iso_parse('00:00:00') == time(0, 0, 0)
+    with pytest.raises(ValueError):
+        parsers.time_iso_parse('1:30:00 PM')
+    with pytest.raises(ValueError):
+        parsers.time_iso_parse('25:00:30')
+    with pytest.raises(ValueError):
+        parsers.time_iso_parse('+1:00:30')
+    with pytest.raises(ValueError):
+        parsers.time_iso_parse('abc')
+
+def test_datetime_iso_parse():
+    assert parsers.datetime_iso_parse('- -') is None
+    assert parsers.datetime_iso_parse('2000-01-01 12:34:56') == datetime(2000, 1, 1, 12, 34, 56)
+    assert parsers.datetime_iso_parse('2000-01-01\t 12:34:56') == datetime(2000, 1, 1, 12, 34, 56)
+    with pytest.raises(ValueError):
+        parsers.datetime_iso_parse('2000-01-01')
+    with pytest.raises(ValueError):
+        parsers.datetime_iso_parse('2000-01-01 -')
+    with pytest.raises(ValueError):
+        parsers.datetime_iso_parse('2000-02-30 00:00:00')
+    with pytest.raises(ValueError):
+        parsers.datetime_iso_parse('2000-01-01 24:00:00')
+
 def test_hostname_parse():
     assert parsers.hostname_parse('-') is None
     assert parsers.hostname_parse('foo') == 'foo'
@@ -138,3 +192,30 @@ def test_address_parse():
     with pytest.raises(ValueError):
         parsers.address_parse('[::1]:100000')
 
+
+def test_non_capturing():
+    assert parsers.non_capturing(parsers.INTEGER % {'name': 'foo'}) == r'(?:-|\d+)'
+    assert parsers.non_capturing(parsers.URL % {'name': 'foo'}).startswith('(?:([^:/')
+    with pytest.raises(ValueError):
+        parsers.non_capturing(r'(\d+)')
+
+def test_interned():
+    parse = parsers.interned(parsers.request_parse, size=2)
+    value = parse('GET / HTTP/1.1')
+    assert value == datatypes.request('GET / HTTP/1.1')
+    assert parse('GET / HTTP/1.1') is value
+    parse('GET /foo HTTP/1.1')
+    parse('GET /bar HTTP/1.1')
+    assert parse('GET / HTTP/1.1') is not value
+    assert parse('GET / HTTP/1.1') == value
+    with pytest.raises(ValueError):
+        parse('foo')
+    with pytest.raises(ValueError):
+        parsers.interned(parsers.request_parse, size=0)
+
+def test_bytes_pattern():
+    pattern = parsers.bytes_pattern(re.compile(r'^(?P<foo>\d+) (?P<bar>\S+)$'))
+    assert pattern.pattern == br'(?P<foo>\d+) (?P<bar>\S+)$'
+    match = pattern.match(b'xx 12 abc\n', 3, 9)
+    assert match.group('foo', 'bar') == (b'12', b'abc')
+    assert not pattern.match(b'xx 12 abc\n', 0, 9)
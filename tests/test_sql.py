@@ -287,3 +287,54 @@ def test_target_null_on_create(db, rows_null_first, recwarn):
         target.write(rows_null_first[0])
         target.write(rows_null_first[1])
     assert recwarn.pop(sql.SQLWarning)
+
+def test_target_write_many(db, rows):
+    with sql.SQLTarget(sqlite3, db, table='foo', create_table=True) as target:
+        target.write_many(rows)
+        assert target.count == 3
+        with pytest.raises(TypeError):
+            target.write_many([('foo',)])
+    cursor = db.cursor()
+    cursor.execute('SELECT COUNT(*) FROM foo')
+    assert cursor.fetchall()[0][0] == 3
+    cursor.execute("SELECT * FROM foo WHERE method = ?", (rows[1].method,))
+    data = cursor.fetchall()[0]
+    assert data[0] == rows[1].timestamp
+    assert data[1] == str(rows[1].client)
+    assert data[3] == str(rows[1].url)
+    assert data[6] == rows[1].size
+
+def test_target_write_many_multi_row_insert(db, rows):
+    if sqlite3.sqlite_version_info >= (3, 7, 11):
+        cursor = db.cursor()
+        with sql.SQLTarget(
+                sqlite3, db, 'foo', create_table=True, insert=2,
+                commit=4) as target:
+            target.write_many(rows * 3)
+            # 9 rows; 8 inserted in pairs, 1 left in the buffer
+            assert target.count == 8
+            cursor.execute('SELECT COUNT(*) FROM foo')
+            assert cursor.fetchall()[0][0] == 8
+            target.write(rows[0])
+            assert target.count == 10
+        cursor.execute('SELECT COUNT(*) FROM foo')
+        assert cursor.fetchall()[0][0] == 10
+        cursor.execute('DROP TABLE foo')
+        with pytest.raises(sql.SQLError):
+            with sql.SQLTarget(
+                    sqlite3, db, 'foo', create_table=False,
+                    insert=2) as target:
+                target.write_many(rows)
+
+def test_target_profile(db, rows):
+    with sql.SQLTarget(
+            sqlite3, db, 'foo', create_table=True, commit=2,
+            profile=True) as target:
+        profile = target.profile
+        target.write(rows[0])
+        target.write(rows[1])
+        target.write_many(rows[2:])
+    assert profile.stages['insert'].calls == 3
+    # One commit after the second row, and another on close
+    assert profile.stages['commit'].calls == 2
+    assert sql.SQLTarget(sqlite3, db, 'bar').profile is None
@@ -0,0 +1,93 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import pytest
+
+# The modules are imported for the caches they register
+from lars import stats, apache, iis, dns, geoip, datatypes as dt
+
+
+def test_counters():
+    counters = stats.Counters()
+    counters.hits += 2
+    counters.misses += 1
+    counters.evictions += 1
+    counters.miss_time += 0.5
+    assert counters.stats(3, 10) == (2, 1, 1, 3, 10, 0.5)
+    counters.reset()
+    assert counters.stats(3, 10) == (0, 0, 0, 3, 10, 0.0)
+
+def test_register():
+    counters = stats.Counters()
+    stats.register(
+        'test.cache', lambda: counters.stats(0, 5), counters.reset)
+    stats.register('test.inactive', lambda: None, lambda: None)
+    try:
+        counters.hits += 1
+        snapshot = stats.snapshot()
+        assert snapshot['test.cache'] == (1, 0, 0, 0, 5, 0.0)
+        assert 'test.inactive' not in snapshot
+        stats.reset()
+        assert stats.snapshot()['test.cache'] == (0, 0, 0, 0, 5, 0.0)
+    finally:
+        stats.unregister('test.cache')
+        stats.unregister('test.inactive')
+    assert 'test.cache' not in stats.snapshot()
+    with pytest.raises(KeyError):
+        stats.unregister('test.cache')
+
+def test_builtin_caches():
+    snapshot = stats.snapshot()
+    assert list(snapshot) == sorted(snapshot)
+    for name in (
+            'apache.compile', 'apache.time', 'apache.time_format',
+            'datatypes.address', 'datatypes.hostname', 'datatypes.url',
+            'dns.from_address', 'dns.to_address', 'geoip.query',
+            'iis.compile', 'strptime.regex'):
+        assert name in snapshot
+    assert snapshot['strptime.regex'].hits is None
+
+def test_builtin_cache_counts():
+    stats.reset()
+    dt.cached_url('http://example.com/')
+    dt.cached_url('http://example.com/')
+    apache._time_parse_common('[01/Jan/2017:00:00:00 +0000]')
+    apache._time_parse_common('[01/Jan/2017:00:00:00 +0000]')
+    snapshot = stats.snapshot()
+    assert snapshot['datatypes.url'].hits == 1
+    assert snapshot['apache.time'].hits >= 1
+    assert snapshot['apache.time'].hits + snapshot['apache.time'].misses == 2
+    stats.reset()
+    snapshot = stats.snapshot()
+    assert snapshot['datatypes.url'][:3] == (0, 0, 0)
+    assert snapshot['apache.time'][:3] == (0, 0, 0)
+    assert snapshot['datatypes.url'].currsize > 0
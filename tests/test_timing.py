@@ -0,0 +1,107 @@
+# vim: set et sw=4 sts=4 fileencoding=utf-8:
+#
+# Copyright (c) 2013-2017 Dave Jones <dave@waveform.org.uk>
+# Copyright (c) 2013 Mime Consulting Ltd. <info@mimeconsulting.co.uk>
+# All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import (
+    unicode_literals,
+    absolute_import,
+    print_function,
+    division,
+    )
+
+import pytest
+
+from lars import timing
+
+
+def test_profile_wrap():
+    profile = timing.Profile()
+    func = profile.wrap('add', lambda a, b: a + b)
+    assert func(1, 2) == 3
+    assert func(3, b=4) == 7
+    stage = profile.stages['add']
+    assert stage.calls == 2
+    assert stage.wall >= 0.0
+    assert stage.cpu >= 0.0
+
+def test_profile_wrap_exception():
+    profile = timing.Profile(cpu=False)
+    def fail():
+        raise ValueError('foo')
+    func = profile.wrap('fail', fail)
+    with pytest.raises(ValueError):
+        func()
+    assert profile.stages['fail'].calls == 1
+    assert profile.stages['fail'].cpu == 0.0
+
+def test_profile_time():
+    profile = timing.Profile()
+    with profile.time('foo') as stage:
+        pass
+    with pytest.raises(ValueError):
+        with profile.time('foo'):
+            raise ValueError('bar')
+    assert stage is profile.stages['foo']
+    assert stage.calls == 2
+    assert repr(stage).startswith('StageTime(calls=2, ')
+
+def test_profile_as_dict():
+    profile = timing.Profile()
+    with profile.time('foo'):
+        pass
+    profile.stage('bar')
+    result = profile.as_dict()
+    assert list(result) == ['foo', 'bar']
+    assert result['foo']['calls'] == 1
+    assert result['bar'] == {'calls': 0, 'wall': 0.0, 'cpu': 0.0}
+    profile.reset()
+    assert profile.as_dict() == {}
+
+def test_profile_summary():
+    profile = timing.Profile()
+    assert profile.summary().split() == [
+        'Stage', 'Calls', 'Wall', '(s)', 'CPU', '(s)', '%']
+    profile.stage('quick').wall = 1.0
+    profile.stage('slow').wall = 3.0
+    lines = profile.summary().splitlines()
+    assert len(lines) == 3
+    assert lines[1].split()[0] == 'slow'
+    assert lines[1].split()[-1] == '75.0'
+    assert lines[2].split()[0] == 'quick'
+
+def test_instrument():
+    func = lambda: 1
+    assert timing.instrument(None, 'foo', func) is func
+    profile = timing.Profile()
+    assert timing.instrument(profile, 'foo', func)() == 1
+    assert profile.stages['foo'].calls == 1
+
+def test_make_profile():
+    assert timing.make_profile(None) is None
+    assert timing.make_profile(False) is None
+    assert isinstance(timing.make_profile(True), timing.Profile)
+    profile = timing.Profile()
+    assert timing.make_profile(profile) is profile
+    with pytest.raises(ValueError):
+        timing.make_profile('foo')